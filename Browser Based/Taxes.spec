@@ -4,7 +4,7 @@ a = Analysis(
     pathex=['.'],
     binaries=[],
     datas=[('static', 'static')],
-    hiddenimports=['routes', 'template_manager', 'data_manager'],
+    hiddenimports=['routes', 'template_manager', 'data_manager', 'store_base', 'json_store', 'sqlite_store', 'shard_store', 'offset_index', 'binary_format', 'document_model', 'file_lock', 'archive_store', 'snapshot_store', 'bulk_import', 'document_export', 'year_stats', 'search_index', 'document_linker', 'response_cache', 'query_index'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -0,0 +1,104 @@
+import gzip
+import json
+import os
+import threading
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def _compress(raw, suffix):
+    if suffix == '.zst':
+        return zstandard.ZstdCompressor(level=19).compress(raw)
+    return gzip.compress(raw, compresslevel=9)
+
+
+def _decompress(blob, suffix):
+    if suffix == '.zst':
+        if zstandard is None:
+            raise RuntimeError("Reading a .zst archive needs the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return gzip.decompress(blob)
+
+
+class YearArchive:
+    """Read-only cold storage for closed tax years, one compressed file per year
+
+    Archived years are written as compact JSON compressed with zstd when the
+    zstandard package is installed and gzip otherwise; either kind can be
+    read back. A year is only decompressed when it is asked for.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        self.reads = 0
+        self.bytes_read = 0
+        self.bytes_decompressed = 0
+
+    def _path(self, year):
+        """Return the existing archive file for year, or None"""
+        for suffix in ('.zst', '.gz'):
+            path = self.directory / f"{int(year)}.json{suffix}"
+            if path.exists():
+                return path
+        return None
+
+    def years(self):
+        """Return the archived tax years as strings"""
+        if not self.directory.exists():
+            return []
+        years = {name.split('.', 1)[0] for name in os.listdir(self.directory)
+                 if name.endswith(('.json.gz', '.json.zst'))}
+        return sorted(years, key=int)
+
+    def __contains__(self, year):
+        return self._path(year) is not None
+
+    def load_year(self, year):
+        """Decompress and return an archived year's documents (None if not archived)"""
+        path = self._path(year)
+        if path is None:
+            return None
+        blob = path.read_bytes()
+        raw = _decompress(blob, path.suffix)
+        with self._lock:
+            self.reads += 1
+            self.bytes_read += len(blob)
+            self.bytes_decompressed += len(raw)
+        return json.loads(raw)
+
+    def write_year(self, year, documents):
+        """Compress documents into the archive file for year"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        suffix = '.zst' if zstandard is not None else '.gz'
+        path = self.directory / f"{int(year)}.json{suffix}"
+        raw = json.dumps(documents, separators=(',', ':')).encode('utf-8')
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(_compress(raw, suffix))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        # An older archive in the other format would shadow or outlive this one
+        for other in ('.zst', '.gz'):
+            stale = self.directory / f"{int(year)}.json{other}"
+            if other != suffix and stale.exists():
+                os.remove(stale)
+        return path
+
+    def remove_year(self, year):
+        path = self._path(year)
+        while path is not None:
+            os.remove(path)
+            path = self._path(year)
+
+    def stats(self):
+        """Return archive read counters"""
+        with self._lock:
+            return {"years": len(self.years()), "reads": self.reads,
+                    "bytes_read": self.bytes_read,
+                    "bytes_decompressed": self.bytes_decompressed}
@@ -1,41 +1,1181 @@
+import atexit
+import contextvars
+import heapq
+import itertools
 import json
 import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
 
+from archive_store import YearArchive
+from binary_format import BinaryStore
+from bulk_import import MAX_REPORTED_ERRORS, detect_format, normalize_row, read_rows
+from document_linker import DocumentLinker
+from document_model import (UPCOMING_DAYS, Document, check_document_fields, new_document_id,
+                            normalize_document, parse_date)
+from file_lock import FileLock
+from json_store import JsonStore, file_signature, write_json_atomic
+from shard_store import ShardStore
+from query_index import SORT_KEYS, YearIndex, decode_cursor, encode_cursor
+from snapshot_store import SnapshotStore
+from search_index import SearchIndex
+from year_stats import YearStats
+from sqlite_store import SQLiteStore
+
 # Get user's Documents folder and create our app directory
 USER_DOCS = Path.home() / "Documents" / "Tax Doc Helper"
 if not USER_DOCS.exists():
     USER_DOCS.mkdir(parents=True)
 
-# Constants
-DATA_FILE = USER_DOCS / 'tax_documents_data.json'
+# Every profile other than the default one keeps its data in its own folder here
+PROFILES_DIR = USER_DOCS / 'profiles'
+DEFAULT_PROFILE = "Default"
+PROFILE_NAME_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9 _.-]{0,63}")
+# Profiles whose stores (and caches) stay open at once
+MAX_OPEN_PROFILES = 16
+
+STORAGE_BACKENDS = ("json", "sqlite", "sharded", "binary")
+STATUS_FILTERS = ("all", "needed", "completed")
+# Most documents query_documents() returns in one page
+MAX_PAGE_SIZE = 1000
+BATCH_OPERATIONS = ("add", "put", "update", "toggle", "delete")
+# Most operations apply_batch() takes at once
+MAX_BATCH_OPERATIONS = 10000
+DEFAULT_STORAGE_SETTINGS = {"backend": "json"}
+
+_profiles_lock = threading.Lock()
+_open_profiles = OrderedDict()
+_profile_evictions = 0
+_active_profile = DEFAULT_PROFILE
+# The profile selected with using_profile() in the current thread, if any
+_current_profile = contextvars.ContextVar("current_profile", default=None)
+_conflict_lock = threading.Lock()
+_conflicts = 0
+
+
+class VersionConflict(Exception):
+    """A write was based on a data version that is no longer current"""
+
+    def __init__(self, year, expected_version, current_version):
+        self.year = year
+        self.expected_version = expected_version
+        self.current_version = current_version
+        what = f"Tax year {year}" if year is not None else "The data"
+        super().__init__(f"{what} changed since it was read "
+                         f"(version {expected_version}, now {current_version})")
+
+
+class ArchivedYearError(ValueError):
+    """A write was attempted to an archived (read-only) tax year"""
+
+    def __init__(self, year):
+        self.year = year
+        super().__init__(f"Tax year {year} is archived and read-only, unarchive it to make changes")
+
+
+class ProfileNotFound(LookupError):
+    """There is no profile with the given name"""
+
+    def __init__(self, name):
+        self.name = name
+        super().__init__(f"No profile named {name!r}")
+
+
+class BatchError(ValueError):
+    """An operation of a batch is invalid or can't be applied, so none of them were
+
+    index is the position of the failing operation (None when the batch as
+    a whole is invalid) and results has an entry per operation saying which
+    one failed and that the rest weren't applied.
+    """
+
+    def __init__(self, index, message, count):
+        self.index = index
+        self.results = [{"status": "error", "error": message} if i == index else {"status": "not_applied"}
+                        for i in range(count)]
+        super().__init__(message if index is None else f"Operation {index + 1}: {message}")
+
+
+class Profile:
+    """The files and open storage engine of one profile's documents"""
+
+    def __init__(self, name, directory):
+        self.name = name
+        self.directory = directory
+        self.data_file = directory / 'tax_documents_data.json'
+        self.journal_file = directory / 'tax_documents_data.journal'
+        self.sqlite_file = directory / 'tax_documents.db'
+        self.shard_dir = directory / 'years'
+        self.binary_file = directory / 'tax_documents_data.tdb'
+        self.storage_settings_file = directory / 'storage_settings.json'
+        self.version_file = directory / 'data_version.json'
+        # Each year's documents linked to last year's, see get_previous_year_links()
+        self.links_file = directory / 'document_links.json'
+        # Held around every write, by this and any other process using the profile
+        self.lock = FileLock(directory / 'tax_documents.lock')
+        self.archive = YearArchive(directory / 'archive')
+        self.snapshots = SnapshotStore(directory / 'snapshots')
+        self.store = None
+        self.versions_cache = (None, None)
+        # year -> (data version, parsed Document models)
+        self.models_cache = {}
+        # year -> (data version, YearStats)
+        self.stats_cache = {}
+        # year -> (data version, YearIndex)
+        self.query_cache = {}
+        self.search_index = SearchIndex()
+        self.links_cache = (None, {})
+        self.users = 0
+        self._store_lock = threading.Lock()
+
+    def get_store(self):
+        with self._store_lock:
+            if self.store is None:
+                self.store = create_store(load_storage_settings(self)["backend"], self)
+            return self.store
+
+    def close_store(self):
+        with self._store_lock:
+            store, self.store = self.store, None
+        if store is not None:
+            store.close()
+
+
+def _profile_directory(name):
+    if name == DEFAULT_PROFILE:
+        return USER_DOCS
+    if not PROFILE_NAME_PATTERN.fullmatch(name):
+        raise ValueError(f"Invalid profile name {name!r}, use letters, digits, spaces, '.', '_' or '-'")
+    return PROFILES_DIR / name
+
+def list_profiles():
+    """Return the names of all profiles, the default profile first"""
+    names = []
+    if PROFILES_DIR.exists():
+        names = sorted(entry.name for entry in PROFILES_DIR.iterdir()
+                       if entry.is_dir() and PROFILE_NAME_PATTERN.fullmatch(entry.name))
+    return [DEFAULT_PROFILE] + names
+
+def create_profile(name):
+    """Create a new, empty profile and return its name"""
+    directory = _profile_directory(name)
+    directory.mkdir(parents=True, exist_ok=True)
+    return name
+
+def _open_profile(name, use=False):
+    """Return the open Profile for name, opening it if needed
+
+    At most MAX_OPEN_PROFILES stay open; the least recently used profile
+    that isn't in use has its store closed to make room.
+    """
+    global _profile_evictions
+    evicted = []
+    with _profiles_lock:
+        profile = _open_profiles.get(name)
+        if profile is None:
+            try:
+                directory = _profile_directory(name)
+            except ValueError:
+                # No profile can have a name that create_profile() refuses
+                raise ProfileNotFound(name) from None
+            if not directory.exists():
+                raise ProfileNotFound(name)
+            profile = _open_profiles[name] = Profile(name, directory)
+        _open_profiles.move_to_end(name)
+        if use:
+            profile.users += 1
+        for candidate in list(_open_profiles.values()):
+            if len(_open_profiles) <= MAX_OPEN_PROFILES:
+                break
+            if candidate.users == 0 and candidate.name not in (name, _active_profile):
+                del _open_profiles[candidate.name]
+                evicted.append(candidate)
+        _profile_evictions += len(evicted)
+    # Closed outside the lock, closing can wait for a background compaction
+    for candidate in evicted:
+        candidate.close_store()
+    return profile
+
+def _profile():
+    """Return the profile the data functions below work on"""
+    return _current_profile.get() or _open_profile(_active_profile)
+
+@contextmanager
+def using_profile(name=None):
+    """Make the data functions in this thread work on profile name (None: the active one)"""
+    profile = _open_profile(name or _active_profile, use=True)
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+        with _profiles_lock:
+            profile.users -= 1
+
+def set_active_profile(name):
+    """Select the profile used when no using_profile() block says otherwise"""
+    global _active_profile
+    _open_profile(name)
+    _active_profile = name
+
+def get_active_profile():
+    """Return the name of the profile the data functions are working on"""
+    return _profile().name
+
+def get_profile_stats():
+    """Return how many profiles are open and how many have been closed to make room"""
+    with _profiles_lock:
+        return {"open": len(_open_profiles), "max_open": MAX_OPEN_PROFILES,
+                "evictions": _profile_evictions}
+
+def load_storage_settings(profile=None):
+    """Load storage settings from file or return the defaults"""
+    settings = DEFAULT_STORAGE_SETTINGS.copy()
+    settings_file = (profile or _profile()).storage_settings_file
+    if os.path.exists(settings_file):
+        try:
+            with open(settings_file, 'r', encoding='utf-8') as f:
+                settings.update(json.load(f))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error loading storage settings: {e}")
+    if settings["backend"] not in STORAGE_BACKENDS:
+        print(f"Unknown storage backend {settings['backend']!r}, using json")
+        settings["backend"] = "json"
+    return settings
+
+def save_storage_settings(settings):
+    """Save storage settings and reopen the store with them"""
+    with open(_profile().storage_settings_file, 'w', encoding='utf-8') as f:
+        json.dump(settings, f, indent=2)
+    close_store()
+
+def create_store(backend, profile=None):
+    """Create a storage engine for one of STORAGE_BACKENDS"""
+    profile = profile or _profile()
+    if backend == "sqlite":
+        return SQLiteStore(profile.sqlite_file)
+    if backend == "sharded":
+        return ShardStore(profile.shard_dir, profile.data_file, profile.journal_file)
+    if backend == "binary":
+        return BinaryStore(profile.binary_file)
+    return JsonStore(profile.data_file, profile.journal_file, lock=profile.lock)
+
+def get_store():
+    """Return the storage engine selected in the storage settings"""
+    return _profile().get_store()
+
+def close_store():
+    """Flush and close the open storage engine"""
+    _profile().close_store()
+
+def close_all_stores():
+    """Flush and close the storage engines of every open profile"""
+    with _profiles_lock:
+        profiles = list(_open_profiles.values())
+    for profile in profiles:
+        profile.close_store()
+
+atexit.register(close_all_stores)
+
+def _read_versions():
+    """Return the version file's contents, cached while the file is unchanged
+
+    "version" goes up by one on every write. Each year records the version
+    of the last write that touched it; years without an entry were last
+    written at "base" (a write to every year, like save_all_data).
+    """
+    profile = _profile()
+    signature = file_signature(profile.version_file)
+    cached_signature, versions = profile.versions_cache
+    if signature is not None and signature == cached_signature:
+        return versions
+    versions = {"version": 0, "base": 0, "years": {}}
+    if signature is not None:
+        try:
+            with open(profile.version_file, 'r', encoding='utf-8') as f:
+                versions.update(json.load(f))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error loading data version: {e}")
+    profile.versions_cache = (signature, versions)
+    return versions
+
+def _version_of(versions, year):
+    if year is None:
+        return versions["version"]
+    return versions["years"].get(str(year), versions["base"])
+
+def get_data_version(year=None):
+    """Return the current version of a tax year, or of all data if year is None
+
+    Versions only ever increase. Pass the version you read as expected_version
+    to a write to have it fail with VersionConflict if someone wrote since.
+    """
+    return _version_of(_read_versions(), year)
+
+@contextmanager
+def _writing(year=None, expected_version=None, archived_ok=False):
+    """Hold the data lock for a write to one year (None: every year)
+
+    Raises VersionConflict before anything is written if expected_version is
+    given and is not the current version, and ArchivedYearError if the year
+    is archived. Bumps the version if the write completes and stores the new
+    version under "version" in the yielded dict.
+
+    The write keeps the year's statistics and search index current by
+    putting the year's new documents under "documents" in the yielded dict,
+    or the (old, new) states of the one document it changed under "changed"
+    (None for a document added or removed); otherwise the year is recounted
+    and reindexed when next needed. A write that turns out to change nothing
+    sets "unchanged" in the yielded dict and keeps the current version.
+
+    The lock is the profile's, not the year's: every year shares one
+    version counter in one version file, so writes to different years (even
+    to separate shards) run one at a time, across processes too. Writes are
+    short next to the time between them in this app, so that is traded for
+    versions that are simple to compare and snapshot.
+    """
+    global _conflicts
+    profile = _profile()
+    with profile.lock:
+        if year is not None and not archived_ok and year in profile.archive:
+            raise ArchivedYearError(year)
+        versions = _read_versions()
+        current = _version_of(versions, year)
+        if expected_version is not None and int(expected_version) != current:
+            with _conflict_lock:
+                _conflicts += 1
+            raise VersionConflict(year, expected_version, current)
+        written = {}
+        yield written
+        if written.get("unchanged"):
+            return
+        # Re-read, the lock is reentrant and a write nested in this one moved the version on
+        versions = _read_versions()
+        current = _version_of(versions, year)
+        version = versions["version"] + 1
+        if year is None:
+            new_versions = {"version": version, "base": version, "years": {}}
+        else:
+            new_versions = dict(versions, version=version,
+                                years=dict(versions["years"], **{str(year): version}))
+        write_json_atomic(profile.version_file, new_versions)
+        written["version"] = version
+        _advance_derived(profile, year, current, version, written)
+
+@contextmanager
+def _writing_years(years, expected_versions=None):
+    """Hold the data lock for one write to several tax years
+
+    Like _writing(), except that every year in years gets the new version,
+    expected_versions maps a year to the version the write was based on, and
+    the yielded dict has a dict per year (as a string) to put "documents" or
+    "changed" in. The new version is stored under "version" in each.
+    """
+    global _conflicts
+    profile = _profile()
+    years = sorted({str(year) for year in years}, key=int)
+    with profile.lock:
+        for year in years:
+            if year in profile.archive:
+                raise ArchivedYearError(year)
+        versions = _read_versions()
+        current = {year: _version_of(versions, year) for year in years}
+        for year, expected_version in (expected_versions or {}).items():
+            if expected_version is not None and str(year) in current and int(expected_version) != current[str(year)]:
+                with _conflict_lock:
+                    _conflicts += 1
+                raise VersionConflict(year, expected_version, current[str(year)])
+        written = {year: {} for year in years}
+        yield written
+        versions = _read_versions()
+        current = {year: _version_of(versions, year) for year in years}
+        version = versions["version"] + 1
+        write_json_atomic(profile.version_file, dict(
+            versions, version=version, years=dict(versions["years"], **{year: version for year in years})))
+        for year in years:
+            written[year]["version"] = version
+            _advance_derived(profile, year, current[year], version, written[year])
+
+def _advance_derived(profile, year, previous_version, version, written):
+    """Carry a year's statistics and search index over a write that took it to version"""
+    index = profile.search_index
+    if year is None:
+        profile.stats_cache.clear()
+        profile.query_cache.clear()
+        index.clear()
+        return
+    documents = written.get("documents")
+    changed = written.get("changed")
+    cached = profile.stats_cache.pop(str(year), None)
+    if documents is not None:
+        profile.stats_cache[str(year)] = (version, YearStats(documents))
+    elif changed and cached is not None and cached[0] == previous_version:
+        cached[1].apply(*changed)
+        profile.stats_cache[str(year)] = (version, cached[1])
+    # Sorting a whole year is left to the next query that needs it
+    cached = profile.query_cache.pop(str(year), None)
+    if documents is None and changed and cached is not None and cached[0] == previous_version:
+        cached[1].apply(*changed)
+        profile.query_cache[str(year)] = (version, cached[1])
+    # The index is only built once something is searched for
+    if str(year) not in index.versions:
+        return
+    if documents is not None:
+        index.replace_year(year, documents)
+    elif changed and index.versions[str(year)] == previous_version:
+        index.apply(year, *changed)
+    else:
+        index.remove_year(year)
+        return
+    index.versions[str(year)] = version
+
+def get_write_stats():
+    """Return data lock wait times and the number of version conflicts"""
+    with _conflict_lock:
+        conflicts = _conflicts
+    return {"lock": _profile().lock.get_stats(), "conflicts": conflicts,
+            "version": get_data_version()}
 
 def load_all_data():
-    """Load all document data from file"""
-    if os.path.exists(DATA_FILE):
+    """Load all document data from storage, including archived years"""
+    data = get_store().load_all()
+    archived = _profile().archive.years()
+    if not archived:
+        return data
+    data = dict(data)
+    for year in archived:
+        data[year] = _profile().archive.load_year(year)
+    return dict(sorted(data.items(), key=lambda item: int(item[0])))
+
+def iter_years(first_year=None, last_year=None, status="all"):
+    """Yield (year, documents) for each tax year in order, reading one year at a time
+
+    Archived years are included. first_year and last_year limit the range
+    (both inclusive), and status "needed" or "completed" keeps only those
+    documents. The profile is the one current when this is called, even if
+    the generator is consumed later (e.g. by a streamed HTTP response).
+    """
+    if status not in STATUS_FILTERS:
+        raise ValueError(f"Unknown status {status!r}, use one of {', '.join(STATUS_FILTERS)}")
+    name = _profile().name
+
+    def generate():
+        # Counted as a user so the profile's store isn't closed mid-export
+        profile = _open_profile(name, use=True)
         try:
-            with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            print(f"Error decoding {DATA_FILE}, returning empty data")
-    return {}
+            archived = profile.archive.years()
+            years = sorted({int(year) for year in profile.get_store().list_years()}
+                           | {int(year) for year in archived})
+            for year in years:
+                if (first_year is not None and year < first_year) or (last_year is not None and year > last_year):
+                    continue
+                documents = profile.archive.load_year(year)
+                if documents is None:
+                    documents = profile.get_store().load_year(year)
+                documents = [normalize_document(doc) for doc in documents]
+                if status != "all":
+                    wanted = status == "completed"
+                    documents = [doc for doc in documents if bool(doc.get("completed")) == wanted]
+                yield str(year), documents
+        finally:
+            with _profiles_lock:
+                profile.users -= 1
+    return generate()
+
+def save_all_data(data, expected_version=None):
+    """Save all document data to storage
+
+    Archived years are left out of data's primary store copy and stay archived.
+    """
+    archived = set(_profile().archive.years())
+    with _writing(None, expected_version):
+        get_store().save_all({year: documents for year, documents in data.items()
+                              if str(year) not in archived})
+
+def _prepare(document):
+    """Return document normalized and with an id, assigning one if it has none"""
+    document = normalize_document(document)
+    if not document.get("id"):
+        document = dict(document)
+        document["id"] = new_document_id()
+    return document
 
-def save_all_data(data):
-    """Save all document data to file"""
-    with open(DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2)
+def _load_year_with_ids(year):
+    """Load a tax year, giving documents saved before ids existed an id
+
+    Missing or duplicated ids are assigned once and written back, so every
+    document keeps the same id from then on. Archived years are read from
+    the archive, which always has ids.
+    """
+    documents = _profile().archive.load_year(year)
+    if documents is not None:
+        return documents
+    documents = get_store().load_year(year)
+    if _has_unique_ids(documents):
+        return documents
+    with _writing(year) as written:
+        documents = get_store().load_year(year)
+        _assign_ids(documents)
+        get_store().save_year(year, documents)
+        written["documents"] = documents
+    return documents
+
+def _has_unique_ids(documents):
+    ids = {doc.get("id") for doc in documents}
+    return len(ids) == len(documents) and None not in ids and "" not in ids
+
+def _assign_ids(documents):
+    """Give each document of a loaded year without a unique id a new one, in place
+
+    For writes that load a year themselves; loading it through
+    _load_year_with_ids() there would write the ids in a second, nested write.
+    """
+    seen = set()
+    for i, doc in enumerate(documents):
+        doc_id = doc.get("id")
+        if not doc_id or doc_id in seen:
+            documents[i] = doc = dict(doc, id=new_document_id())
+        seen.add(doc["id"])
+    return documents
 
 def get_documents_for_year(year):
     """Get documents for a specific tax year"""
-    all_data = load_all_data()
-    year_str = str(year)
-    if year_str in all_data:
-        return all_data[year_str]
-    return []
-
-def save_documents_for_year(year, documents):
-    """Save documents for a specific tax year"""
-    all_data = load_all_data()
-    all_data[str(year)] = documents
-    save_all_data(all_data)
-    return True
\ No newline at end of file
+    return [normalize_document(doc) for doc in _load_year_with_ids(year)]
+
+def get_document_models_for_year(year):
+    """Get documents for a specific tax year as Document objects
+
+    Dates are parsed once per data version of the year; while the year is
+    unchanged, later calls return copies of the already parsed models.
+    """
+    profile = _profile()
+    # Read the version first, so it is never newer than the documents
+    version = get_data_version(year)
+    cached = profile.models_cache.get(str(year))
+    if cached is None or cached[0] != version:
+        cached = (version, [Document.from_dict(doc) for doc in _load_year_with_ids(year)])
+        profile.models_cache[str(year)] = cached
+    return [model.copy() for model in cached[1]]
+
+def save_documents_for_year(year, documents, expected_version=None):
+    """Save documents for a specific tax year
+
+    Raises VersionConflict if expected_version is given and the year has
+    been written since that version was read.
+    """
+    documents = [_prepare(doc) for doc in documents]
+    with _writing(year, expected_version) as written:
+        get_store().save_year(year, documents)
+        written["documents"] = documents
+    return True
+
+def get_document(year, doc_id):
+    """Get a single document by id, or None if the tax year has no such document"""
+    if year in _profile().archive:
+        document = next((doc for doc in _profile().archive.load_year(year) if doc.get("id") == doc_id), None)
+    else:
+        document = get_store().get_document(year, doc_id)
+    return normalize_document(document) if document is not None else None
+
+def add_document(year, document, expected_version=None):
+    """Append a single document to a tax year and return it with its id"""
+    document = _prepare(document)
+    with _writing(year, expected_version) as written:
+        get_store().insert_document(year, document)
+        written["changed"] = (None, document)
+    return document
+
+def update_document(year, doc_id, document, expected_version=None):
+    """Replace the document with the given id, raising KeyError if there is none"""
+    document = dict(normalize_document(document), id=doc_id)
+    with _writing(year, expected_version) as written:
+        old = get_store().get_document(year, doc_id)
+        if old is None:
+            raise KeyError(doc_id)
+        get_store().update_document(year, doc_id, document)
+        written["changed"] = (old, document)
+    return document
+
+def patch_document(year, doc_id, changes, expected_version=None):
+    """Change some fields of the document with the given id and return it
+
+    Fields not in changes keep their stored values and the id can't be
+    changed. Raises KeyError if the year has no such document.
+    """
+    changes = {key: value for key, value in normalize_document(changes).items() if key != "id"}
+    with _writing(year, expected_version) as written:
+        old = get_store().get_document(year, doc_id)
+        if old is None:
+            raise KeyError(doc_id)
+        document = dict(normalize_document(old), **changes)
+        get_store().update_document(year, doc_id, document)
+        written["changed"] = (old, document)
+    return document
+
+def toggle_document(year, doc_id, expected_version=None):
+    """Flip a document's completed status and return the updated document"""
+    with _writing(year, expected_version) as written:
+        old = get_document(year, doc_id)
+        if old is None:
+            raise KeyError(doc_id)
+        model = Document.from_dict(old)
+        model.mark_completed(not model.completed)
+        document = model.to_dict()
+        get_store().update_document(year, doc_id, document)
+        written["changed"] = (old, document)
+    return document
+
+def delete_document(year, doc_id, expected_version=None):
+    """Delete the document with the given id, raising KeyError if there is none"""
+    with _writing(year, expected_version) as written:
+        old = get_store().get_document(year, doc_id)
+        if old is None:
+            raise KeyError(doc_id)
+        get_store().delete_document(year, doc_id)
+        written["changed"] = (old, None)
+    return True
+
+def apply_document_changes(year, changes, expected_version=None):
+    """Apply a batch of document changes to a tax year with a single write
+
+    changes is a list of ("put", document) and ("delete", doc_id) in the
+    order they were made. A put replaces the document with the same id, or
+    appends it if the year has none; deleting an id that isn't there is a
+    no-op. Returns the year's new data version.
+    """
+    operations = []
+    for op, value in changes:
+        if op == "put":
+            operations.append({"op": "put", "year": year, "document": _prepare(value)})
+        elif op == "delete":
+            operations.append({"op": "delete", "year": year, "id": value, "missing_ok": True})
+        else:
+            raise ValueError(f"Unknown document change {op!r}")
+    return apply_batch(operations, {year: expected_version})["versions"][str(year)]
+
+def _check_operation(operation):
+    """Return an operation of apply_batch() with its year as a string, raises ValueError if malformed"""
+    if not isinstance(operation, dict):
+        raise ValueError("an operation must be an object")
+    op = operation.get("op")
+    if op not in BATCH_OPERATIONS:
+        raise ValueError(f"op must be one of {', '.join(BATCH_OPERATIONS)}")
+    try:
+        year = str(int(operation.get("year")))
+    except (TypeError, ValueError):
+        raise ValueError("year must be a tax year") from None
+    if op in ("add", "put"):
+        document = operation.get("document")
+        if not isinstance(document, dict):
+            raise ValueError("document must be an object")
+        check_document_fields(document)
+        if op == "put" and not document.get("id"):
+            raise ValueError("a put document needs an id")
+    else:
+        if not isinstance(operation.get("id"), str) or not operation["id"]:
+            raise ValueError("id must be a document id")
+        if op == "update":
+            if not isinstance(operation.get("changes"), dict):
+                raise ValueError("changes must be an object of fields to change")
+            check_document_fields(operation["changes"], partial=True)
+        if op == "toggle" and not isinstance(operation.get("completed", False), bool):
+            raise ValueError("completed must be true or false")
+    return dict(operation, year=year)
+
+def apply_batch(operations, expected_versions=None):
+    """Apply a list of document operations, across any tax years, all or none
+
+    Each operation is a dict with "op" and "year":
+      {"op": "add", "document": {...}}             add a document (given a new id)
+      {"op": "put", "document": {... "id"}}        add or replace a whole document
+      {"op": "update", "id": ..., "changes": {}}   change some fields of a document
+      {"op": "toggle", "id": ...}                  flip completed, or set it with "completed"
+      {"op": "delete", "id": ...}                  delete a document ("missing_ok": true
+                                                   if it may already be gone)
+    Operations run in order, so later ones see the effect of earlier ones.
+    The changed years are written together in one durable write where the
+    storage engine allows it (all but the sharded one) and share a new data
+    version. expected_versions maps years to the version they were read at.
+
+    Returns {"results": [...], "versions": {year: version}}, a result per
+    operation with its status, year, id and (but for deletes) the document.
+    Raises BatchError (nothing written) if any operation is invalid or
+    names a missing document, or expected_versions holds something other
+    than versions, VersionConflict and ArchivedYearError as other
+    writes do.
+    """
+    operations = list(operations)
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise BatchError(MAX_BATCH_OPERATIONS, f"a batch takes at most {MAX_BATCH_OPERATIONS} operations",
+                         len(operations))
+    try:
+        expected_versions = {year: None if version is None else int(version)
+                             for year, version in (expected_versions or {}).items()}
+    except (TypeError, ValueError):
+        raise BatchError(None, "expected_versions must map years to data versions", len(operations)) from None
+    checked = []
+    for index, operation in enumerate(operations):
+        try:
+            checked.append(_check_operation(operation))
+        except ValueError as e:
+            raise BatchError(index, str(e), len(operations)) from None
+    if not checked:
+        return {"results": [], "versions": {}}
+    results = []
+    with _writing_years({operation["year"] for operation in checked}, expected_versions) as written:
+        years = {}
+        for index, operation in enumerate(checked):
+            year = operation["year"]
+            if year not in years:
+                # Documents saved before ids existed get one with this write
+                documents = _assign_ids(get_store().load_year(year))
+                years[year] = (documents, {doc["id"]: i for i, doc in enumerate(documents)})
+            documents, positions = years[year]
+            op = operation["op"]
+            doc_id = operation.get("id") or operation.get("document", {}).get("id")
+            position = positions.get(doc_id)
+            if op in ("update", "toggle") or (op == "delete" and not operation.get("missing_ok")):
+                if position is None:
+                    raise BatchError(index, f"no document {doc_id!r} in tax year {year}", len(checked))
+            if op == "add" and position is not None:
+                raise BatchError(index, f"tax year {year} already has a document {doc_id!r}", len(checked))
+            document = None
+            if op in ("add", "put"):
+                document = _prepare(dict(operation["document"]))
+            elif op == "update":
+                changes = {key: value for key, value in normalize_document(operation["changes"]).items()
+                           if key != "id"}
+                document = dict(normalize_document(documents[position]), **changes)
+            elif op == "toggle":
+                model = Document.from_dict(normalize_document(documents[position]))
+                model.mark_completed(operation.get("completed", not model.completed))
+                document = model.to_dict()
+            if document is None:
+                if position is not None:
+                    positions.pop(doc_id)
+                    # Filtered out below so the other positions stay valid
+                    documents[position] = None
+            elif position is None:
+                positions[document["id"]] = len(documents)
+                documents.append(document)
+            else:
+                documents[position] = document
+            result = {"status": "ok", "op": op, "year": year, "id": document["id"] if document else doc_id}
+            if document is not None:
+                result["document"] = document
+            results.append(result)
+        saved = {year: [doc for doc in documents if doc is not None] for year, (documents, _) in years.items()}
+        get_store().save_years(saved)
+        for year, documents in saved.items():
+            written[year]["documents"] = documents
+    return {"results": results, "versions": {year: changes["version"] for year, changes in written.items()}}
+
+def get_year_stats(year, upcoming_days=UPCOMING_DAYS, today=None):
+    """Return the document counts of a tax year: total, completed, needed,
+    overdue and due within upcoming_days
+
+    The counts are kept current by every write made through this module,
+    so only a year changed by another process (or read for the first time)
+    is counted from its documents.
+    """
+    profile = _profile()
+    version = get_data_version(year)
+    cached = profile.stats_cache.get(str(year))
+    if cached is None or cached[0] != version:
+        documents = profile.archive.load_year(year)
+        if documents is None:
+            documents = get_store().load_year(year)
+        cached = profile.stats_cache[str(year)] = (version, YearStats(documents))
+    return dict(cached[1].summary(today, upcoming_days), year=str(year))
+
+def get_all_stats(upcoming_days=UPCOMING_DAYS, today=None):
+    """Return get_year_stats() for every tax year, archived years included, plus totals"""
+    years = sorted(set(get_store().list_years()) | set(_profile().archive.years()), key=int)
+    stats = [get_year_stats(year, upcoming_days, today) for year in years]
+    totals = {key: sum(year_stats[key] for year_stats in stats)
+              for key in ("total", "completed", "needed", "overdue", "due_soon")}
+    return {"years": stats, "totals": dict(totals, due_soon_days=upcoming_days)}
+
+def _year_index(year):
+    profile = _profile()
+    version = get_data_version(year)
+    cached = profile.query_cache.get(str(year))
+    if cached is None or cached[0] != version:
+        cached = profile.query_cache[str(year)] = (version, YearIndex(_load_year_with_ids(year)))
+    return cached[1]
+
+def query_documents(years=None, status="all", due_before=None, sort="expectedDate", limit=100, cursor=None):
+    """Return one page of documents from some tax years, filtered and sorted
+
+    years defaults to every year, archived years included. status is one of
+    STATUS_FILTERS, due_before (YYYY-MM-DD) keeps documents expected before
+    that day and sort is one of SORT_KEYS; ties are broken by year, then id.
+    limit, from 1 to MAX_PAGE_SIZE, may be given as a string of digits.
+    Returns {"documents": [...], "next_cursor": ...}, each document with
+    its "year"; pass next_cursor back for the following page (it is None on
+    the last page). Pages are read from indexes kept per year, so a page
+    costs about limit documents however large the years are. Raises
+    ValueError for invalid arguments.
+    """
+    if status not in STATUS_FILTERS:
+        raise ValueError(f"status must be one of {', '.join(STATUS_FILTERS)}")
+    if sort not in SORT_KEYS:
+        raise ValueError(f"sort must be one of {', '.join(SORT_KEYS)}")
+    if due_before is not None:
+        date = parse_date(due_before)
+        if date is None:
+            raise ValueError("due_before must be a date (YYYY-MM-DD)")
+        due_before = date.isoformat()
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        limit = None
+    if limit is None or not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be a whole number from 1 to {MAX_PAGE_SIZE}")
+    after = decode_cursor(cursor, sort) if cursor else None
+    if years is None:
+        years = set(get_store().list_years()) | set(_profile().archive.years())
+    statuses = {"all": (False, True), "needed": (False,), "completed": (True,)}[status]
+    # Each year and status gives its next limit + 1 documents, the merge the first of them
+    pages = [_year_index(year).page(year, sort, completed, limit + 1, after, due_before)
+             for year in years for completed in statuses]
+    entries = list(itertools.islice(heapq.merge(*pages, key=lambda entry: entry[:3]), limit + 1))
+    documents = [dict(doc, year=str(year)) for _, year, _, doc in entries[:limit]]
+    next_cursor = None
+    if len(entries) > limit:
+        value, year, doc_id, _ = entries[limit - 1]
+        next_cursor = encode_cursor(sort, value, year, doc_id)
+    return {"documents": documents, "next_cursor": next_cursor}
+
+def search_documents(query, limit=50):
+    """Search document names and websites in every tax year, archived years included
+
+    Words match whole tokens, prefixes or close misspellings, and every word
+    must match. Returns up to limit result dicts (year, id, name, website,
+    completed, score), best match and newest year first. Only years changed
+    since the index last saw them are (re)indexed first.
+    """
+    profile = _profile()
+    index = profile.search_index
+    versions = _read_versions()
+    archived = profile.archive.years()
+    years = set(get_store().list_years()) | set(archived)
+    for year in set(index.versions) - years:
+        index.remove_year(year)
+    for year in years:
+        version = _version_of(versions, year)
+        if index.versions.get(year) != version:
+            documents = profile.archive.load_year(year) if year in archived else get_store().load_year(year)
+            index.replace_year(year, documents)
+            index.versions[year] = version
+    return index.search(query, limit)
+
+def _read_links():
+    profile = _profile()
+    signature = file_signature(profile.links_file)
+    cached_signature, links = profile.links_cache
+    if signature is not None and signature == cached_signature:
+        return links
+    links = {}
+    if signature is not None:
+        try:
+            with open(profile.links_file, 'r', encoding='utf-8') as f:
+                links = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error loading document links: {e}")
+    profile.links_cache = (signature, links)
+    return links
+
+def get_previous_year_links(year):
+    """Return {document id: link} pairing a tax year's documents with last year's
+
+    Each link has the id, name and date (actual, else expected) of the
+    previous year's document and the similarity score of the two names, so
+    documents renamed between years ("W-2 Acme", "W2 - Acme Corp") are still
+    paired. Links are saved with the data versions of both years and only
+    worked out again once either year changes.
+    """
+    profile = _profile()
+    previous_year = int(year) - 1
+    versions = _read_versions()
+    key = [_version_of(versions, previous_year), _version_of(versions, year)]
+    saved = _read_links().get(str(year))
+    if saved is not None and saved.get("versions") == key:
+        return saved["links"]
+    current = _load_year_with_ids(year)
+    previous = _load_year_with_ids(previous_year)
+    linker = DocumentLinker(previous)
+    links = {}
+    for doc_id, (score, known) in linker.link(current).items():
+        links[doc_id] = {"id": known.get("id"), "name": known.get("name", ""),
+                         "date": known.get("actualDate") or known.get("expectedDate", ""),
+                         "score": round(score, 3)}
+    versions = _read_versions()
+    # Loading may have given old documents ids, and someone may have written since
+    if key == [_version_of(versions, previous_year), _version_of(versions, year)]:
+        with profile.lock:
+            all_links = dict(_read_links())
+            all_links[str(year)] = {"versions": key, "links": links}
+            write_json_atomic(profile.links_file, all_links)
+    return links
+
+def get_cache_stats():
+    """Return the data cache hit and miss counters, archive read counters and search index size"""
+    return dict(get_store().cache_stats(), archive=_profile().archive.stats(),
+                search=_profile().search_index.stats())
+
+def list_archived_years():
+    """Return the archived tax years as strings"""
+    return _profile().archive.years()
+
+def archive_year(year):
+    """Move a tax year out of the primary store into the compressed archive
+
+    Returns a status message. The archived year stays readable but can't be
+    changed until it is unarchived.
+    """
+    if year in _profile().archive:
+        return f"Tax year {year} is already archived"
+    with _writing(year) as written:
+        documents = _assign_ids(get_store().load_year(year))
+        if not documents and str(year) not in get_store().list_years():
+            written["unchanged"] = True
+            return f"No documents found for tax year {year}"
+        path = _profile().archive.write_year(year, documents)
+        written["documents"] = documents
+        # Archive first, so a crash here leaves the year in both places
+        # (the archive wins on reads) rather than in neither
+        get_store().delete_year(year)
+    return f"Archived {len(documents)} documents for tax year {year} to {path}"
+
+def unarchive_year(year):
+    """Move an archived tax year back into the primary store, returns a status message"""
+    with _writing(year, archived_ok=True) as written:
+        documents = _profile().archive.load_year(year)
+        if documents is None:
+            written["unchanged"] = True
+            return f"Tax year {year} is not archived"
+        get_store().save_year(year, documents)
+        written["documents"] = documents
+        _profile().archive.remove_year(year)
+    return f"Restored {len(documents)} documents for tax year {year} from the archive"
+
+def create_snapshot(label=None, full=False):
+    """Take a snapshot of every tax year, archived years included, and return its manifest
+
+    A year whose data version hasn't changed since the newest snapshot
+    reuses that snapshot's blob without being read; full=True reads and
+    hashes every year (use it after editing the data files by hand).
+    """
+    profile = _profile()
+    with profile.lock:
+        versions = _read_versions()
+        previous = None if full else profile.snapshots.latest()
+        archived = profile.archive.years()
+        years = {}
+        year_versions = {}
+        for year in sorted(set(get_store().list_years()) | set(archived), key=int):
+            version = year_versions[year] = _version_of(versions, year)
+            if (previous and previous["versions"].get(year) == version and year in previous["years"]
+                    and profile.snapshots.has_year(previous["years"][year])):
+                years[year] = previous["years"][year]
+                continue
+            if year in archived:
+                documents = profile.archive.load_year(year)
+            else:
+                documents = get_store().load_year(year)
+            years[year] = profile.snapshots.put_year(documents)
+        return profile.snapshots.write_snapshot(years, archived, year_versions, label)
+
+def list_snapshots():
+    """Return the manifests of all snapshots, oldest first"""
+    snapshots = _profile().snapshots
+    return [snapshots.load_snapshot(snapshot_id) for snapshot_id in snapshots.list_snapshots()]
+
+def restore_snapshot(snapshot_id, expected_version=None):
+    """Put every tax year back the way it was in a snapshot, returns a status message
+
+    The current data is snapshotted first, so a restore can be undone.
+    Raises KeyError if there is no such snapshot.
+    """
+    profile = _profile()
+    manifest = profile.snapshots.load_snapshot(snapshot_id)
+    data = {year: profile.snapshots.load_year(digest) for year, digest in manifest["years"].items()}
+    archived = set(manifest["archived"])
+    with profile.lock:
+        backup = create_snapshot(label=f"Before restoring {snapshot_id}")
+        with _writing(None, expected_version):
+            get_store().save_all({year: documents for year, documents in data.items()
+                                  if year not in archived})
+            for year in profile.archive.years():
+                if year not in archived:
+                    profile.archive.remove_year(year)
+            for year in archived:
+                profile.archive.write_year(year, data[year])
+    count = sum(len(documents) for documents in data.values())
+    return (f"Restored {count} documents in {len(data)} tax years from snapshot {snapshot_id} "
+            f"(the data from before the restore is snapshot {backup['id']})")
+
+def set_storage_backend(backend):
+    """Copy all data from the current backend into another one and switch to it
+
+    The old backend's files are left in place as a backup. Returns a status message.
+    """
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend {backend!r}")
+    settings = load_storage_settings()
+    if settings["backend"] == backend:
+        return f"Already using {backend} storage"
+    with _profile().lock:
+        data = get_store().load_all()
+        new_store = create_store(backend)
+        try:
+            new_store.save_all(data)
+        finally:
+            new_store.close()
+    settings["backend"] = backend
+    save_storage_settings(settings)
+    documents = sum(len(docs) for docs in data.values())
+    return f"Migrated {documents} documents across {len(data)} tax years to {backend} storage"
+
+def reset_all_data():
+    """Delete all stored document data for every backend
+
+    The version file is kept so versions keep increasing across the reset.
+    """
+    profile = _profile()
+    # Closed before taking the lock, its compactor may be waiting for it
+    close_store()
+    removed = []
+    with _writing():
+        for path in (profile.data_file, profile.journal_file, profile.binary_file, profile.sqlite_file,
+                     Path(f"{profile.sqlite_file}-wal"), Path(f"{profile.sqlite_file}-shm")):
+            if path.exists():
+                os.remove(path)
+                removed.append(path)
+        for directory in (profile.shard_dir, profile.archive.directory):
+            if directory.exists():
+                shutil.rmtree(directory)
+                removed.append(directory)
+    return removed
+
+def _carried_forward(doc):
+    """Return the new-year copy of a document imported from an earlier year"""
+    return {
+        "name": doc.get("name"),
+        "website": doc.get("website", ""),
+        "expectedDate": doc.get("expectedDate", ""),
+        "actualDate": "",
+        "previousYearDate": doc.get("actualDate") or doc.get("expectedDate", ""),
+        "completed": False
+    }
+
+def import_documents(target_year, source_years, expected_version=None):
+    """Import documents missing from target_year out of each of source_years
+
+    Source years are read newest first, so a document found in several of
+    them takes its dates from the most recent one. Names already in the
+    target year (or imported from a newer source) are looked up in a set,
+    and the target year is written once at the end. Returns the number of
+    documents imported and the number found in the source years.
+    """
+    with _writing(target_year, expected_version) as written:
+        current_documents = [normalize_document(doc)
+                             for doc in _assign_ids(get_store().load_year(target_year))]
+        known_names = {doc.get("name") for doc in current_documents}
+        imported = []
+        found = 0
+        for source_year in sorted({int(year) for year in source_years}, reverse=True):
+            if source_year == int(target_year):
+                continue
+            source_documents = _profile().archive.load_year(source_year)
+            if source_documents is None:
+                source_documents = get_store().load_year(source_year)
+            found += len(source_documents)
+            for doc in source_documents:
+                name = doc.get("name")
+                if name not in known_names:
+                    known_names.add(name)
+                    imported.append(_carried_forward(doc))
+        if imported:
+            documents = [_prepare(doc) for doc in current_documents + imported]
+            get_store().save_year(target_year, documents)
+            written["documents"] = documents
+        else:
+            written["unchanged"] = True
+    return len(imported), found
+
+def bulk_import(year, lines, fmt="csv", expected_version=None, strict=False):
+    """Add the document rows of a CSV or NDJSON stream to a tax year in one write
+
+    lines is any iterable of text lines and is read one row at a time. Rows
+    that fail validation are skipped (with strict=True nothing is written if
+    any row is invalid), as are names the year already has or that appeared
+    earlier in the input. Returns a report dict with the counts, the first
+    MAX_REPORTED_ERRORS problems and the year's new version.
+    """
+    documents = []
+    names = set()
+    report = {"imported": 0, "duplicates": 0, "invalid": 0, "errors": [], "version": None}
+    # Validated before taking the lock, reading a slow upload can't hold up other writers
+    for line_number, row in read_rows(lines, fmt):
+        try:
+            if isinstance(row, Exception):
+                raise row
+            document = normalize_row(row)
+        except ValueError as e:
+            report["invalid"] += 1
+            if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                report["errors"].append(f"Line {line_number}: {e}")
+            continue
+        if document["name"] in names:
+            report["duplicates"] += 1
+            continue
+        names.add(document["name"])
+        documents.append(_prepare(document))
+    if report["invalid"] and strict:
+        return report
+    with _writing(year, expected_version) as written:
+        current = [_prepare(doc) for doc in get_store().load_year(year)]
+        existing = {doc.get("name") for doc in current}
+        added = [doc for doc in documents if doc["name"] not in existing]
+        report["duplicates"] += len(documents) - len(added)
+        if added:
+            get_store().save_year(year, current + added)
+            written["documents"] = current + added
+        report["imported"] = len(added)
+    report["version"] = written.get("version")
+    return report
+
+def bulk_import_file(year, path, fmt=None, strict=False):
+    """Bulk import a CSV or NDJSON file (format from the file name if not given)"""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        return bulk_import(year, f, fmt or detect_format(str(path)), strict=strict)
+
+def import_from_last_year(current_year, source_year=None, until_year=None):
+    """Import documents from the previous tax year
+
+    source_year picks another year to import from, and with until_year every
+    year from source_year through until_year is imported in one pass.
+    Raises ValueError if until_year is before source_year.
+    """
+    if source_year is None:
+        source_year = current_year - 1
+    if until_year is not None and until_year < source_year:
+        raise ValueError(f"The range {source_year}-{until_year} ends before it starts")
+    source_years = range(source_year, (until_year if until_year is not None else source_year) + 1)
+    if len(source_years) == 1:
+        description = f"tax year {source_year}"
+    else:
+        description = f"tax years {source_years[0]}-{source_years[-1]}"
+
+    count, found = import_documents(current_year, source_years)
+    if not found:
+        return 0, f"No documents found for {description}"
+    if count > 0:
+        return count, f"Imported {count} documents from {description}"
+    return 0, "No new documents to import"
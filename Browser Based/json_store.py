@@ -0,0 +1,386 @@
+import contextlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from offset_index import OffsetIndex
+from store_base import DocumentStore, position_of
+
+# Fold the journal into the snapshot once it grows past this size...
+JOURNAL_COMPACT_BYTES = 256 * 1024
+# ...or once it has been sitting unfolded for this many seconds
+COMPACT_INTERVAL = 30
+
+
+def file_signature(path):
+    """Return (mtime_ns, size, inode) for a file, or None if it doesn't exist"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def copy_data(data):
+    """Copy year -> documents data deep enough that callers can mutate it"""
+    return {year: [dict(doc) for doc in documents] for year, documents in data.items()}
+
+
+def _record_position(data, record, positions):
+    if "index" in record:
+        return record["index"]
+    if positions is not None:
+        if record["id"] not in positions:
+            raise KeyError(record["id"])
+        return positions[record["id"]]
+    return position_of(data.get(record["year"], []), record["id"])
+
+
+def apply_record(data, record, positions=None):
+    """Apply one journal record to data in place
+
+    positions is an optional {document id: position} index for the record's
+    year; without it insert, update and delete records scan the year for
+    their id. Records by id can be applied again to data that already has
+    them: compact() replaces the data file before it removes the journal,
+    so a crash in between replays the journal over a snapshot that holds
+    it, and an insert then replaces its document rather than adding it twice.
+    """
+    op = record["op"]
+    year = record.get("year")
+    if op == "year":
+        data[year] = record["documents"]
+    elif op == "years":
+        data.update(record["years"])
+    elif op == "delete_year":
+        data.pop(year, None)
+    elif op == "insert":
+        documents = data.setdefault(year, [])
+        doc_id = record["document"].get("id")
+        if not doc_id:
+            position = None
+        elif positions is not None:
+            position = positions.get(doc_id)
+        else:
+            position = next((i for i, doc in enumerate(documents) if doc.get("id") == doc_id), None)
+        if position is None:
+            documents.append(record["document"])
+        else:
+            documents[position] = record["document"]
+    elif op == "update":
+        data[year][_record_position(data, record, positions)] = record["document"]
+    elif op == "delete":
+        del data[year][_record_position(data, record, positions)]
+    else:
+        raise ValueError(f"Unknown journal record {op!r}")
+
+
+def write_json_atomic(path, data):
+    """Write JSON to a temporary file and move it over path
+
+    A crash mid-write leaves the previous file intact instead of a truncated one.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class JsonStore(DocumentStore):
+    """Stores every tax year in a single JSON file plus an append-only journal
+
+    Each write appends one small JSON record to the journal instead of
+    rewriting the data file. Reads replay the journal over the last snapshot,
+    and a background thread periodically folds the journal into a fresh
+    snapshot so replay stays short.
+
+    The parsed data is cached in memory and reused for as long as the mtime,
+    size and inode of both files are unchanged. Our own writes refresh the
+    cache in place; a write from another process changes the signature and
+    forces a reload on the next read.
+
+    When the cache is stale, reading a single year uses an offset index to
+    decode just that year's slice of the snapshot and replays only that
+    year's journal records.
+
+    lock is an optional cross-process lock (see file_lock.FileLock) that
+    compaction holds, so it can't drop records another process appends
+    while the snapshot is being written.
+    """
+
+    def __init__(self, path, journal_path=None, lock=None):
+        super().__init__()
+        self.path = Path(path)
+        self.journal_path = Path(journal_path) if journal_path else self.path.with_suffix('.journal')
+        self.index = OffsetIndex(self.path)
+        self._file_lock = lock if lock is not None else contextlib.nullcontext()
+        self._lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._cached_signature = None
+        self._cached_data = None
+        self._torn_journal_offset = None
+        self._compact_requested = threading.Event()
+        self._stop = threading.Event()
+        self._compactor = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.partial_reads = 0
+        self.compactions = 0
+
+    def _signature(self):
+        return (file_signature(self.path), file_signature(self.journal_path))
+
+    def _load_snapshot(self):
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            # Keep the damaged file around rather than letting the next save overwrite it
+            backup = self.path.with_name(f"{self.path.name}.corrupt-{int(time.time())}")
+            print(f"Error decoding {self.path}, moved it to {backup} and returning empty data")
+            os.replace(self.path, backup)
+            return {}
+
+    def _replay_journal(self, data, only_year=None):
+        """Apply complete journal records to data, return the record count
+
+        With only_year, records for other years are skipped and data only
+        needs to hold that year.
+        """
+        if only_year is None:
+            self._torn_journal_offset = None
+        if not self.journal_path.exists():
+            return 0
+        count = 0
+        offset = 0
+        with open(self.journal_path, 'rb') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError("incomplete record")
+                    record = json.loads(line)
+                except ValueError as e:
+                    # A crash mid-append leaves a partial last record, drop it
+                    if only_year is None:
+                        print(f"Ignoring journal from byte {offset} of {self.journal_path}: {e}")
+                        self._torn_journal_offset = offset
+                    break
+                if only_year is None or record.get("year") == only_year or only_year in record.get("years", ()):
+                    try:
+                        apply_record(data, record)
+                    except (ValueError, KeyError, IndexError) as e:
+                        print(f"Skipping journal record at byte {offset} of {self.journal_path}: {e!r}")
+                offset += len(line)
+                count += 1
+        return count
+
+    def _cached(self, signature):
+        """Return the cached data if it matches signature, counting the hit or miss"""
+        with self._lock:
+            if signature[0] is not None or signature[1] is not None:
+                if signature == self._cached_signature and self._cached_data is not None:
+                    self.cache_hits += 1
+                    return self._cached_data
+            self.cache_misses += 1
+            return None
+
+    def _read(self):
+        """Return the current data, from the cache when still valid
+
+        The returned dict is shared with the cache and must not be mutated.
+        """
+        signature = self._signature()
+        data = self._cached(signature)
+        if data is not None:
+            return data
+
+        data = self._load_snapshot()
+        self._replay_journal(data)
+
+        if signature[1] is not None and signature[1][1] >= JOURNAL_COMPACT_BYTES:
+            self._request_compaction()
+
+        # Only cache if neither file changed while we were reading them
+        if self._signature() == signature:
+            with self._lock:
+                self._cached_signature = signature
+                self._cached_data = data
+        return data
+
+    def _set_cache(self, data, signature):
+        with self._lock:
+            self._cached_signature = signature
+            self._cached_data = data
+
+    def _append(self, record):
+        """Append a journal record and apply it to the cached data"""
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+        with self._write_lock:
+            current = self._read()
+            data = dict(current)
+            year = record.get("year")
+            old_documents = current.get(year) if year is not None else None
+            positions = None
+            if old_documents is not None:
+                data[year] = list(old_documents)
+                if "id" in record or record["op"] == "insert":
+                    positions = self._id_positions(year, old_documents)
+            # Raises KeyError for an unknown id before anything is written
+            apply_record(data, record, positions)
+
+            before = self._signature()
+            with open(self.journal_path, 'ab') as f:
+                if self._torn_journal_offset is not None:
+                    f.truncate(self._torn_journal_offset)
+                    self._torn_journal_offset = None
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            after = self._signature()
+
+            # If another process appended at the same time our view is incomplete
+            journal_size = before[1][1] if before[1] else 0
+            if after[0] == before[0] and after[1][1] == journal_size + len(line):
+                self._set_cache(data, after)
+                # Updates keep every position and inserts append (or replace
+                # a document with the same id), so the id index stays valid;
+                # deletes let it rebuild on next use
+                if record["op"] == "update":
+                    self._carry_id_positions(year, old_documents, data[year])
+                elif record["op"] == "insert":
+                    appended = old_documents is None or len(data[year]) > len(old_documents)
+                    self._carry_id_positions(year, old_documents, data[year],
+                                             added=record["document"].get("id") if appended else None)
+            else:
+                self._set_cache(None, None)
+
+            if after[1][1] >= JOURNAL_COMPACT_BYTES:
+                self._request_compaction()
+            self._start_compactor()
+
+    def _request_compaction(self):
+        self._compact_requested.set()
+        self._start_compactor()
+
+    def _start_compactor(self):
+        if self._compactor is None:
+            self._compactor = threading.Thread(target=self._compact_loop, daemon=True)
+            self._compactor.start()
+
+    def _compact_loop(self):
+        while not self._stop.is_set():
+            self._compact_requested.wait(COMPACT_INTERVAL)
+            self._compact_requested.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.compact()
+            except OSError as e:
+                print(f"Journal compaction failed, will retry: {e}")
+
+    def compact(self):
+        """Fold the journal into a fresh snapshot of the data file"""
+        with self._file_lock, self._write_lock:
+            if not self.journal_path.exists():
+                return False
+            data = self._read()
+            self.index.write(data)
+            os.remove(self.journal_path)
+            self._torn_journal_offset = None
+            self._set_cache(data, self._signature())
+            self.compactions += 1
+            return True
+
+    def load_all(self):
+        """Load all document data from file"""
+        return copy_data(self._read())
+
+    def save_all(self, data):
+        """Replace all document data with a new snapshot"""
+        data = copy_data(data)
+        with self._write_lock:
+            self.index.write(data)
+            if self.journal_path.exists():
+                os.remove(self.journal_path)
+            self._torn_journal_offset = None
+            self._set_cache(data, self._signature())
+
+    def list_years(self):
+        return list(self._read())
+
+    def load_year(self, year):
+        year = str(year)
+        data = self._cached(self._signature())
+        if data is not None:
+            return [dict(doc) for doc in data.get(year, [])]
+        try:
+            documents = self.index.load_year(year)
+        except (ValueError, UnicodeDecodeError):
+            # Damaged snapshot, let the full load report it and set it aside
+            return [dict(doc) for doc in self._read().get(year, [])]
+        data = {year: documents} if documents is not None else {}
+        self._replay_journal(data, only_year=year)
+        with self._lock:
+            self.partial_reads += 1
+        return data.get(year, [])
+
+    def save_year(self, year, documents):
+        self._append({"op": "year", "year": str(year),
+                      "documents": [dict(doc) for doc in documents]})
+
+    def save_years(self, data):
+        """Replace several years' documents with one journal record, so all change or none"""
+        self._append({"op": "years", "years": {str(year): [dict(doc) for doc in documents]
+                                               for year, documents in data.items()}})
+
+    def delete_year(self, year):
+        if str(year) in self._read():
+            self._append({"op": "delete_year", "year": str(year)})
+
+    def get_document(self, year, doc_id):
+        documents = self._read().get(str(year), [])
+        position = self._id_positions(year, documents).get(doc_id)
+        return dict(documents[position]) if position is not None else None
+
+    def insert_document(self, year, document):
+        self._append({"op": "insert", "year": str(year), "document": dict(document)})
+
+    def update_document(self, year, doc_id, document):
+        self._append({"op": "update", "year": str(year), "id": doc_id,
+                      "document": dict(document)})
+
+    def delete_document(self, year, doc_id):
+        self._append({"op": "delete", "year": str(year), "id": doc_id})
+
+    def cache_stats(self):
+        """Return the cache hit and miss counters"""
+        with self._lock:
+            return {"hits": self.cache_hits, "misses": self.cache_misses,
+                    "partial_reads": self.partial_reads,
+                    "index_rebuilds": self.index.rebuilds,
+                    "compactions": self.compactions}
+
+    def read_files(self):
+        """Return the data with the journal replayed, without caching, compacting or writing it
+
+        For tools that read a store's files while the app may be using them.
+        """
+        data = self._load_snapshot()
+        self._replay_journal(data)
+        return data
+
+    def close(self):
+        """Stop the compactor and fold any outstanding journal records"""
+        self._stop.set()
+        self._compact_requested.set()
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+        self.compact()
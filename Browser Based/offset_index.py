@@ -0,0 +1,174 @@
+import json
+import mmap
+import os
+import re
+import threading
+from pathlib import Path
+
+INDEX_VERSION = 1
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_decoder = json.JSONDecoder()
+
+
+def dump_with_offsets(data):
+    """Serialize data exactly like json.dump(data, indent=2)
+
+    Also returns the byte range of each top-level value, so the caller can
+    write the file and its index in one pass. json.dumps escapes non-ASCII
+    characters, so character offsets are byte offsets.
+    """
+    if not data:
+        return "{}", {}
+    parts = ["{\n"]
+    offset = 2
+    spans = {}
+    for i, (key, value) in enumerate(data.items()):
+        prefix = f",\n  {json.dumps(key)}: " if i else f"  {json.dumps(key)}: "
+        body = json.dumps(value, indent=2).replace("\n", "\n  ")
+        offset += len(prefix)
+        spans[key] = (offset, offset + len(body))
+        offset += len(body)
+        parts.append(prefix)
+        parts.append(body)
+    parts.append("\n}")
+    return "".join(parts), spans
+
+
+def scan_offsets(text):
+    """Return the character range of each value in a top-level JSON object"""
+    idx = _WHITESPACE.match(text, 0).end()
+    if text[idx:idx + 1] != '{':
+        raise ValueError("Data file is not a JSON object")
+    idx = _WHITESPACE.match(text, idx + 1).end()
+    spans = {}
+    if text[idx:idx + 1] == '}':
+        return spans
+    while True:
+        if text[idx:idx + 1] != '"':
+            raise ValueError(f"Expected a key at offset {idx}")
+        key, idx = json.decoder.scanstring(text, idx + 1)
+        idx = _WHITESPACE.match(text, idx).end()
+        if text[idx:idx + 1] != ':':
+            raise ValueError(f"Expected ':' at offset {idx}")
+        idx = _WHITESPACE.match(text, idx + 1).end()
+        _, end = _decoder.raw_decode(text, idx)
+        spans[key] = (idx, end)
+        idx = _WHITESPACE.match(text, end).end()
+        if text[idx:idx + 1] == ',':
+            idx = _WHITESPACE.match(text, idx + 1).end()
+        elif text[idx:idx + 1] == '}':
+            return spans
+        else:
+            raise ValueError(f"Expected ',' or '}}' at offset {idx}")
+
+
+def _char_to_byte_spans(text, spans):
+    """Convert character ranges in text into UTF-8 byte ranges"""
+    if text.isascii():
+        return spans
+    byte_spans = {}
+    for key, (start, end) in spans.items():
+        byte_start = len(text[:start].encode('utf-8'))
+        byte_spans[key] = (byte_start, byte_start + len(text[start:end].encode('utf-8')))
+    return byte_spans
+
+
+class OffsetIndex:
+    """Sidecar index of where each year's array sits in the monolithic data file
+
+    The index records the data file's (mtime, size, inode) signature and is
+    rebuilt whenever the file no longer matches it. Reading a year maps the
+    file and decodes only that year's byte range.
+    """
+
+    def __init__(self, path, index_path=None):
+        self.path = Path(path)
+        self.index_path = Path(index_path) if index_path else self.path.with_name(self.path.name + '.idx')
+        self._signature = None
+        self._spans = {}
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+
+    @staticmethod
+    def _file_signature(path):
+        st = os.stat(path)
+        return [st.st_mtime_ns, st.st_size, st.st_ino]
+
+    def _save_index(self, signature, spans):
+        tmp_path = self.index_path.with_name(self.index_path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": INDEX_VERSION, "signature": signature,
+                       "years": {key: list(span) for key, span in spans.items()}}, f)
+        os.replace(tmp_path, self.index_path)
+        self._signature = signature
+        self._spans = spans
+
+    def _load_index(self, signature):
+        """Load the sidecar file if it matches signature, else return False"""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return False
+        if index.get("version") != INDEX_VERSION or index.get("signature") != signature:
+            return False
+        self._signature = signature
+        self._spans = {key: tuple(span) for key, span in index["years"].items()}
+        return True
+
+    def _rebuild(self, f, signature):
+        f.seek(0)
+        text = f.read().decode('utf-8')
+        spans = _char_to_byte_spans(text, scan_offsets(text))
+        self._save_index(signature, spans)
+        self.rebuilds += 1
+
+    def _spans_for(self, f):
+        """Return the spans for the open data file f, rebuilding them if stale"""
+        signature = self._file_signature(f.fileno())
+        with self._lock:
+            if signature != self._signature and not self._load_index(signature):
+                self._rebuild(f, signature)
+            return self._spans
+
+    def rebuild(self):
+        """Scan the data file for year offsets and rewrite the index"""
+        with open(self.path, 'rb') as f:
+            with self._lock:
+                self._rebuild(f, self._file_signature(f.fileno()))
+
+    def years(self):
+        """Return the keys of the data file without decoding any values"""
+        with open(self.path, 'rb') as f:
+            return list(self._spans_for(f))
+
+    def load_year(self, year):
+        """Decode only the given year from the data file
+
+        Returns None if the data file doesn't exist.
+        """
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return None
+        with f:
+            span = self._spans_for(f).get(str(year))
+            if span is None:
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return json.loads(mm[span[0]:span[1]])
+
+    def write(self, data):
+        """Atomically write data to the data file and record its offsets"""
+        text, spans = dump_with_offsets(data)
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        # Written as bytes, so no newline translation can move the recorded offsets
+        with open(tmp_path, 'wb') as f:
+            f.write(text.encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+            signature = self._file_signature(f.fileno())
+        os.replace(tmp_path, self.path)
+        with self._lock:
+            self._save_index(signature, spans)
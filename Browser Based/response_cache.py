@@ -0,0 +1,88 @@
+import gzip
+import threading
+from collections import OrderedDict
+
+# Bytes of encoded responses kept, across every profile and year
+MAX_CACHE_BYTES = 32 * 1024 * 1024
+# Bodies smaller than this aren't worth compressing
+MIN_GZIP_SIZE = 1024
+GZIP_LEVEL = 6
+
+
+class CachedBody:
+    """The encoded bytes of one response, plain and (if large enough) gzipped"""
+
+    __slots__ = ("version", "body", "gzipped")
+
+    def __init__(self, version, body):
+        self.version = version
+        self.body = body
+        self.gzipped = gzip.compress(body, GZIP_LEVEL) if len(body) >= MIN_GZIP_SIZE else None
+
+    @property
+    def size(self):
+        return len(self.body) + (len(self.gzipped) if self.gzipped is not None else 0)
+
+
+class ResponseCache:
+    """Encoded JSON responses by key, each valid for one data version
+
+    An entry is only returned for the data version it was encoded at, so a
+    write to the year (which always moves its version on) invalidates it,
+    and the stale entry is dropped on the next lookup. Once the entries
+    take more than max_bytes, the least recently used ones are dropped.
+    """
+
+    def __init__(self, max_bytes=MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def get(self, key, version):
+        """Return the CachedBody for key at version, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.version == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            if entry is not None:
+                self._drop(key)
+            self.misses += 1
+            return None
+
+    def put(self, key, version, body):
+        """Keep body (bytes) as the response for key at version and return its CachedBody"""
+        entry = CachedBody(version, body)
+        with self._lock:
+            self._drop(key)
+            # A body bigger than the whole cache is served but not kept
+            if entry.size > self.max_bytes:
+                return entry
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "hit_ratio": round(self.hits / lookups, 3) if lookups else None}
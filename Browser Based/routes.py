@@ -1,41 +1,406 @@
-from flask import render_template, request, jsonify, send_from_directory
+from flask import Response, render_template, request, jsonify, send_from_directory
 import datetime
+import functools
+import hashlib
+import io
+import json
 import os
 import sys
 import signal
 import subprocess
 import threading
 import time
-from data_manager import get_documents_for_year, save_documents_for_year, load_all_data
+from data_manager import (get_documents_for_year, save_documents_for_year, get_cache_stats,
+                          get_document, toggle_document, import_from_last_year,
+                          add_document, patch_document, delete_document, check_document_fields,
+                          get_data_version, get_write_stats, VersionConflict, ArchivedYearError,
+                          list_profiles, create_profile, get_active_profile, get_profile_stats,
+                          using_profile, ProfileNotFound, bulk_import, iter_years, STATUS_FILTERS,
+                          get_year_stats, get_all_stats, UPCOMING_DAYS, search_documents,
+                          get_previous_year_links, query_documents, apply_batch, BatchError)
+from bulk_import import FORMATS, detect_format
+from document_export import EXPORT_FORMATS, MIME_TYPES, export_chunks
+from response_cache import ResponseCache
 from pathlib import Path
 
 # Get user's Documents folder path
 USER_DOCS = Path.home() / "Documents" / "Tax Doc Helper"
 
+# Query parameters that ask for one page of documents instead of all of them
+PAGE_PARAMETERS = ('status', 'due_before', 'sort', 'limit', 'cursor')
+
 def register_routes(app):
     """Register all application routes"""
+    # Encoded GET /documents/<year> bodies, by profile and year
+    response_cache = ResponseCache()
     
     @app.route('/')
     def index():
         """Serve the main HTML page"""
         return render_template('tax_tracker.html')
 
-    @app.route('/api/documents/<int:year>', methods=['GET'])
+    def profile_route(rule, **options):
+        """Register an API route both as /api<rule> and /api/<profile><rule>
+
+        The plain route works on the active profile, the prefixed one on the
+        named profile.
+        """
+        def decorator(view):
+            app.add_url_rule('/api' + rule, view_func=view, **options)
+
+            @functools.wraps(view)
+            def profile_view(profile, **kwargs):
+                with using_profile(profile):
+                    return view(**kwargs)
+            app.add_url_rule('/api/<profile>' + rule, endpoint=view.__name__ + '_profile',
+                             view_func=profile_view, **options)
+            return view
+        return decorator
+
+    @app.errorhandler(ProfileNotFound)
+    def profile_not_found(error):
+        return jsonify({"error": str(error)}), 404
+
+    @app.errorhandler(ArchivedYearError)
+    def archived_year_error(error):
+        """Writes to an archived tax year are refused"""
+        return jsonify({"success": False, "archived": True, "error": str(error)}), 409
+
+    def conflict_response(conflict):
+        return jsonify({"success": False, "conflict": True, "error": str(conflict),
+                        "version": conflict.current_version}), 409
+
+    def expected_version():
+        """Return the X-Data-Version a write was based on, None if not sent"""
+        version = request.headers.get('X-Data-Version')
+        return int(version) if version and version.isdigit() else None
+
+    def accepts_gzip():
+        return bool(request.accept_encodings['gzip'])
+
+    def conditional_response(build, *versions, gzip_body=False):
+        """Return 304 if the client's If-None-Match has the ETag of versions, else build()
+
+        The ETag is the profile name and the data versions the body depends
+        on, so checking it costs a stat of the version file, not a read of
+        the data. The local client may keep responses but must revalidate
+        them on every use. With gzip_body=True build() may gzip the body for
+        clients that accept it: their ETag ends in "-gzip", so it never
+        matches the plain body, and every response, 304s included, has
+        Vary: Accept-Encoding.
+        """
+        etag = ":".join([get_active_profile(), *(str(version) for version in versions)])
+        if gzip_body and accepts_gzip():
+            etag += "-gzip"
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = build()
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        if gzip_body:
+            response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+    def encoded_documents(year, version):
+        """Return the documents of a year as a JSON response, encoded once per data version
+
+        The body is served gzipped to clients that accept it; pass
+        gzip_body=True to conditional_response() for it.
+        """
+        key = (get_active_profile(), year)
+        entry = response_cache.get(key, version)
+        if entry is None:
+            body = json.dumps(get_documents_for_year(year), separators=(',', ':')).encode('utf-8')
+            entry = response_cache.put(key, version, body)
+        if entry.gzipped is not None and accepts_gzip():
+            response = Response(entry.gzipped, mimetype='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = Response(entry.body, mimetype='application/json')
+        return response
+
+    def documents_page(years):
+        """Return the page of documents the query parameters ask for, see query_documents()"""
+        try:
+            page = query_documents(years, request.args.get('status', 'all'), request.args.get('due_before'),
+                                   request.args.get('sort', 'expectedDate'),
+                                   request.args.get('limit', 100), request.args.get('cursor'))
+        except ValueError as e:
+            response = jsonify({"error": str(e)})
+            response.status_code = 400
+            return response
+        return jsonify(page)
+
+    def query_key():
+        """Return a short digest of the query string, for ETags of responses that depend on it"""
+        return hashlib.sha1(request.query_string).hexdigest()[:16]
+
+    def wants_page():
+        return any(parameter in request.args for parameter in PAGE_PARAMETERS)
+
+    @profile_route('/documents/<int:year>', methods=['GET'])
     def get_documents_for_year_api(year):
-        """Get documents for a specific tax year"""
-        documents = get_documents_for_year(year)
-        return jsonify(documents)
+        """Get documents for a specific tax year
+
+        The year's data version is returned in the X-Data-Version header and
+        as part of the ETag; If-None-Match with a current ETag gets a 304.
 
-    @app.route('/api/documents/all', methods=['GET'])
+        With any of status=all|needed|completed, due_before=YYYY-MM-DD,
+        sort=expectedDate|name, limit or cursor, one page is returned as
+        {"documents": [...], "next_cursor": ...}; ask for the next page with
+        cursor=next_cursor.
+        """
+        # Read the version first, so it is never newer than the documents
+        version = get_data_version(year)
+        if wants_page():
+            response = conditional_response(lambda: documents_page([year]), year, version,
+                                            query_key())
+        else:
+            response = conditional_response(lambda: encoded_documents(year, version), year, version,
+                                            gzip_body=True)
+        response.headers['X-Data-Version'] = str(version)
+        return response
+
+    @profile_route('/documents/all', methods=['GET'])
     def get_all_documents():
-        """Get all documents for all years"""
-        return jsonify(load_all_data())
+        """Get all documents for all years, archived years included
+
+        The {year: documents} object is streamed one year at a time, unless
+        If-None-Match has the ETag of the current data version. The page
+        parameters of GET /documents/<year> return one page across every
+        year instead, ordered by the sort key, then year.
+        """
+        if wants_page():
+            return conditional_response(lambda: documents_page(None), "all", get_data_version(),
+                                        query_key())
+        return conditional_response(
+            lambda: Response(export_chunks(iter_years(), "json"), mimetype=MIME_TYPES["json"]),
+            "all", get_data_version())
+
+    @profile_route('/documents/export', methods=['GET'])
+    def export_documents_api():
+        """Stream documents as NDJSON (default) or CSV, one year at a time
 
-    @app.route('/api/documents/<int:year>', methods=['POST'])
+        Query parameters: format=ndjson|csv, from and to (tax years, both
+        inclusive) and status=all|needed|completed.
+        """
+        fmt = request.args.get('format', 'ndjson')
+        status = request.args.get('status', 'all')
+        if fmt not in EXPORT_FORMATS or status not in STATUS_FILTERS:
+            return jsonify({"error": f"format must be one of {', '.join(EXPORT_FORMATS)} "
+                                     f"and status one of {', '.join(STATUS_FILTERS)}"}), 400
+        years = iter_years(request.args.get('from', type=int), request.args.get('to', type=int), status)
+        response = Response(export_chunks(years, fmt), mimetype=MIME_TYPES[fmt])
+        response.headers['Content-Disposition'] = f'attachment; filename="tax_documents.{fmt}"'
+        return response
+
+    @profile_route('/documents/<int:year>', methods=['POST'])
     def save_documents_for_year_api(year):
-        """Save documents for a specific tax year"""
-        success = save_documents_for_year(year, request.json)
-        return jsonify({"success": success})
+        """Save documents for a specific tax year
+
+        If the X-Data-Version header is sent and the year has changed since
+        that version, nothing is saved and 409 is returned with the current
+        version.
+        """
+        try:
+            success = save_documents_for_year(year, request.json, expected_version())
+        except VersionConflict as conflict:
+            return conflict_response(conflict)
+        return jsonify({"success": success, "version": get_data_version(year)})
+
+    @profile_route('/documents/<int:year>/import-previous', methods=['POST'])
+    def import_previous_api(year):
+        """Import documents missing from a tax year out of earlier years
+
+        The optional JSON body picks the source: {"source_year": 2021} or a
+        range {"source_year": 2019, "until_year": 2022}. Defaults to year - 1.
+        """
+        options = request.get_json(silent=True) or {}
+        try:
+            source_year = options.get("source_year")
+            until_year = options.get("until_year")
+            source_year = int(source_year) if source_year is not None else None
+            until_year = int(until_year) if until_year is not None else None
+        except (TypeError, ValueError):
+            return jsonify({"error": "source_year and until_year must be years"}), 400
+        try:
+            count, message = import_from_last_year(year, source_year, until_year)
+        except ArchivedYearError:
+            # Answered with 409 by its error handler, like other writes to archived years
+            raise
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({"imported": count, "message": message})
+
+    @profile_route('/documents/<int:year>/bulk', methods=['POST'])
+    def bulk_import_api(year):
+        """Add the documents in a CSV or NDJSON request body in one write
+
+        The body is read as a stream, one row at a time. The format is taken
+        from ?format= or the Content-Type (text/csv or application/x-ndjson),
+        and with ?strict=1 nothing is written if any row is invalid.
+        """
+        fmt = request.args.get('format') or detect_format(request.mimetype)
+        if fmt not in FORMATS:
+            return jsonify({"error": f"format must be one of {', '.join(FORMATS)}"}), 400
+        strict = request.args.get('strict', '').lower() in ('1', 'true', 'yes')
+        lines = io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline='')
+        try:
+            report = bulk_import(year, lines, fmt, expected_version(), strict)
+        except VersionConflict as conflict:
+            return conflict_response(conflict)
+        except UnicodeDecodeError:
+            return jsonify({"error": "The file must be UTF-8 text"}), 400
+        return jsonify(report), 400 if strict and report["invalid"] else 200
+
+    @profile_route('/documents/<int:year>/items/<doc_id>', methods=['GET'])
+    def get_document_api(year, doc_id):
+        """Get a single document by id"""
+        document = get_document(year, doc_id)
+        if document is None:
+            return jsonify({"error": "Document not found"}), 404
+        return jsonify(document)
+
+    @profile_route('/documents/<int:year>/items', methods=['POST'])
+    def add_document_api(year):
+        """Add one document to a tax year, returns it with its new id"""
+        document = request.get_json(silent=True)
+        if not isinstance(document, dict):
+            return jsonify({"error": "The body must be a JSON object"}), 400
+        try:
+            check_document_fields(document)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        try:
+            document = add_document(year, document, expected_version())
+        except VersionConflict as conflict:
+            return conflict_response(conflict)
+        return jsonify({"document": document, "version": get_data_version(year)}), 201
+
+    @profile_route('/documents/<int:year>/items/<doc_id>', methods=['PATCH'])
+    def patch_document_api(year, doc_id):
+        """Change some fields of a document, the JSON body holds just the fields to change"""
+        changes = request.get_json(silent=True)
+        if not isinstance(changes, dict):
+            return jsonify({"error": "The body must be a JSON object of fields to change"}), 400
+        try:
+            check_document_fields(changes, partial=True)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        try:
+            document = patch_document(year, doc_id, changes, expected_version())
+        except KeyError:
+            return jsonify({"error": "Document not found"}), 404
+        except VersionConflict as conflict:
+            return conflict_response(conflict)
+        return jsonify({"document": document, "version": get_data_version(year)})
+
+    @profile_route('/documents/<int:year>/items/<doc_id>', methods=['DELETE'])
+    def delete_document_api(year, doc_id):
+        """Delete one document from a tax year"""
+        try:
+            delete_document(year, doc_id, expected_version())
+        except KeyError:
+            return jsonify({"error": "Document not found"}), 404
+        except VersionConflict as conflict:
+            return conflict_response(conflict)
+        return jsonify({"success": True, "version": get_data_version(year)})
+
+    @profile_route('/documents/<int:year>/items/<doc_id>/toggle', methods=['POST'])
+    def toggle_document_api(year, doc_id):
+        """Flip a document's completed status"""
+        try:
+            document = toggle_document(year, doc_id, expected_version())
+        except KeyError:
+            return jsonify({"error": "Document not found"}), 404
+        except VersionConflict as conflict:
+            return conflict_response(conflict)
+        return jsonify(document)
+
+    @profile_route('/batch', methods=['POST'])
+    def batch_api():
+        """Apply a list of add, put, update, toggle and delete operations across tax years, all or none
+
+        The body is {"operations": [...], "expected_versions": {year: version}}
+        or just the list; see data_manager.apply_batch() for the operations.
+        Returns a result per operation and each changed year's new version.
+        If any operation fails nothing is written, and 400 is returned with
+        the index of the failing operation.
+        """
+        body = request.get_json(silent=True)
+        if isinstance(body, list):
+            body = {"operations": body}
+        if not isinstance(body, dict) or not isinstance(body.get("operations"), list):
+            return jsonify({"error": "The body must be a list of operations"}), 400
+        expected_versions = body.get("expected_versions") or {}
+        if not isinstance(expected_versions, dict):
+            return jsonify({"error": "expected_versions must map years to versions"}), 400
+        try:
+            result = apply_batch(body["operations"], expected_versions)
+        except BatchError as error:
+            return jsonify({"success": False, "failed": error.index, "error": str(error),
+                            "results": error.results}), 400
+        except VersionConflict as conflict:
+            return conflict_response(conflict)
+        return jsonify(dict(result, success=True))
+
+    @profile_route('/documents/<int:year>/links', methods=['GET'])
+    def get_previous_year_links_api(year):
+        """Get the previous year's matching document for each document of a tax year
+
+        Returns {document id: {id, name, date, score}}; names only need to be
+        similar, so renamed documents are still matched. Conditional like
+        GET /documents/<year>, on the versions of both years.
+        """
+        return conditional_response(lambda: jsonify(get_previous_year_links(year)),
+                                    "links", year, get_data_version(year - 1), get_data_version(year))
+
+    @profile_route('/stats', methods=['GET'])
+    def get_all_stats_api():
+        """Get document counts for every tax year and in total
+
+        ?days=N sets the due-soon window (default 14 days).
+        """
+        return jsonify(get_all_stats(request.args.get('days', UPCOMING_DAYS, type=int)))
+
+    @profile_route('/stats/<int:year>', methods=['GET'])
+    def get_year_stats_api(year):
+        """Get the total, completed, needed, overdue and due-soon counts of a tax year"""
+        return jsonify(get_year_stats(year, request.args.get('days', UPCOMING_DAYS, type=int)))
+
+    @profile_route('/search', methods=['GET'])
+    def search_api():
+        """Search document names and websites in every tax year
+
+        ?q= holds the words to look for (prefixes and small typos match too),
+        ?limit= caps the number of results (default 50).
+        """
+        limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+        return jsonify(search_documents(request.args.get('q', ''), limit))
+
+    @profile_route('/metrics', methods=['GET'])
+    def get_metrics():
+        """Get storage and response cache counters, lock wait times, version conflicts and open profiles"""
+        return jsonify({"cache": get_cache_stats(), "writes": get_write_stats(),
+                        "profiles": get_profile_stats(), "responses": response_cache.stats()})
+
+    @app.route('/api/profiles', methods=['GET'])
+    def get_profiles():
+        """List the client profiles and the one plain /api routes work on"""
+        return jsonify({"profiles": list_profiles(), "active": get_active_profile()})
+
+    @app.route('/api/profiles', methods=['POST'])
+    def create_profile_api():
+        """Create a profile from {"name": "..."}"""
+        name = ((request.get_json(silent=True) or {}).get("name") or "").strip()
+        if name in list_profiles():
+            return jsonify({"error": f"Profile {name!r} already exists"}), 409
+        try:
+            create_profile(name)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({"name": name}), 201
 
     @app.route('/api/current-year', methods=['GET'])
     def get_current_tax_year():
@@ -0,0 +1,103 @@
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+
+def _write_atomic(path, blob):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class SnapshotStore:
+    """Point-in-time copies of the document data with one blob per tax year
+
+    Each year's documents are stored once as gzip-compressed JSON named by
+    the SHA-256 of the JSON, so a year that didn't change between snapshots
+    is shared by all of them. A snapshot itself is a small manifest mapping
+    each year to its blob.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.blob_dir = self.directory / 'blobs'
+        self.manifest_dir = self.directory / 'manifests'
+        self._lock = threading.Lock()
+        self.blobs_written = 0
+        self.blobs_reused = 0
+
+    def _blob_path(self, digest):
+        return self.blob_dir / digest[:2] / f"{digest}.json.gz"
+
+    def put_year(self, documents):
+        """Store a year's documents and return their content hash"""
+        raw = json.dumps(documents, separators=(',', ':')).encode('utf-8')
+        digest = hashlib.sha256(raw).hexdigest()
+        path = self._blob_path(digest)
+        written = not path.exists()
+        if written:
+            _write_atomic(path, gzip.compress(raw, compresslevel=6))
+        with self._lock:
+            if written:
+                self.blobs_written += 1
+            else:
+                self.blobs_reused += 1
+        return digest
+
+    def has_year(self, digest):
+        return self._blob_path(digest).exists()
+
+    def load_year(self, digest):
+        """Return the documents stored under a content hash"""
+        with open(self._blob_path(digest), 'rb') as f:
+            return json.loads(gzip.decompress(f.read()))
+
+    def write_snapshot(self, years, archived=(), versions=None, label=None):
+        """Record a snapshot of years ({year: content hash}) and return its manifest"""
+        self.manifest_dir.mkdir(parents=True, exist_ok=True)
+        created = datetime.datetime.now(datetime.timezone.utc)
+        snapshot_id = created.strftime('%Y%m%dT%H%M%S%fZ')
+        while (self.manifest_dir / f"{snapshot_id}.json").exists():
+            created += datetime.timedelta(microseconds=1)
+            snapshot_id = created.strftime('%Y%m%dT%H%M%S%fZ')
+        manifest = {"id": snapshot_id, "created": created.isoformat(timespec='seconds'),
+                    "label": label, "years": dict(years), "archived": sorted(archived, key=int),
+                    "versions": dict(versions or {})}
+        _write_atomic(self.manifest_dir / f"{snapshot_id}.json",
+                      json.dumps(manifest, indent=2).encode('utf-8'))
+        return manifest
+
+    def list_snapshots(self):
+        """Return the ids of all snapshots, oldest first"""
+        if not self.manifest_dir.exists():
+            return []
+        return sorted(name[:-len('.json')] for name in os.listdir(self.manifest_dir)
+                      if name.endswith('.json'))
+
+    def load_snapshot(self, snapshot_id):
+        """Return a snapshot's manifest, raises KeyError if there is no such snapshot"""
+        path = self.manifest_dir / f"{snapshot_id}.json"
+        if os.path.basename(snapshot_id) != snapshot_id or not path.exists():
+            raise KeyError(snapshot_id)
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def latest(self):
+        """Return the newest snapshot's manifest, or None"""
+        snapshots = self.list_snapshots()
+        return self.load_snapshot(snapshots[-1]) if snapshots else None
+
+    def stats(self):
+        """Return the snapshot count and how many year blobs were written or shared"""
+        blobs = sum(len(files) for _, _, files in os.walk(self.blob_dir)) if self.blob_dir.exists() else 0
+        with self._lock:
+            return {"snapshots": len(self.list_snapshots()), "blobs": blobs,
+                    "blobs_written": self.blobs_written, "blobs_reused": self.blobs_reused}
@@ -0,0 +1,114 @@
+def position_of(documents, doc_id):
+    """Return the position of the document with doc_id, scanning the list"""
+    for i, doc in enumerate(documents):
+        if doc.get("id") == doc_id:
+            return i
+    raise KeyError(doc_id)
+
+
+class DocumentStore:
+    """Base class for the storage engines behind data_manager
+
+    Engines must implement list_years, load_year and save_year. Documents
+    are addressed by their "id" key. The single-document operations below
+    fall back to rewriting the whole year, engines that can do better (e.g.
+    SQLite) override them. A missing id raises KeyError.
+    """
+
+    def __init__(self):
+        self._id_index = {}
+
+    def _id_positions(self, year, documents):
+        """Return {document id: position} for a cached year list
+
+        The mapping is built once per list object and reused until the
+        engine replaces that list, so id lookups are O(1).
+        """
+        entry = self._id_index.get(str(year))
+        if entry is None or entry[0] is not documents:
+            entry = (documents, {doc.get("id"): i for i, doc in enumerate(documents)})
+            self._id_index[str(year)] = entry
+        return entry[1]
+
+    def _carry_id_positions(self, year, old_documents, new_documents, added=None):
+        """Reuse the id index of old_documents for a copy with the same order
+
+        added is the id of a document appended at the end of new_documents.
+        """
+        entry = self._id_index.get(str(year))
+        if entry is None or entry[0] is not old_documents:
+            return
+        positions = entry[1]
+        if added is not None:
+            positions[added] = len(new_documents) - 1
+        self._id_index[str(year)] = (new_documents, positions)
+
+    def list_years(self):
+        """Return the stored tax years as strings"""
+        raise NotImplementedError
+
+    def load_year(self, year):
+        """Return the documents for a tax year (empty list if none)"""
+        raise NotImplementedError
+
+    def save_year(self, year, documents):
+        """Replace the documents for a tax year"""
+        raise NotImplementedError
+
+    def save_years(self, data):
+        """Replace the documents of every year in data (year -> documents) together
+
+        Engines that can write several years in one durable write (a single
+        journal record, transaction or file) override this so either all of
+        the years change or none do; this fallback saves them one by one.
+        """
+        for year, documents in data.items():
+            self.save_year(year, documents)
+
+    def load_all(self):
+        """Return a dict of year string -> documents for every year"""
+        return {year: self.load_year(year) for year in self.list_years()}
+
+    def save_all(self, data):
+        """Replace the whole data set with the given dict"""
+        for year in set(self.list_years()) - set(data):
+            self.delete_year(year)
+        for year, documents in data.items():
+            self.save_year(year, documents)
+
+    def delete_year(self, year):
+        """Remove a tax year and all of its documents"""
+        raise NotImplementedError
+
+    def get_document(self, year, doc_id):
+        """Return one document from a tax year, or None if there is no such id"""
+        documents = self.load_year(year)
+        try:
+            return documents[position_of(documents, doc_id)]
+        except KeyError:
+            return None
+
+    def insert_document(self, year, document):
+        """Append a document to a tax year"""
+        documents = self.load_year(year)
+        documents.append(document)
+        self.save_year(year, documents)
+
+    def update_document(self, year, doc_id, document):
+        """Replace the document with the given id in a tax year"""
+        documents = self.load_year(year)
+        documents[position_of(documents, doc_id)] = document
+        self.save_year(year, documents)
+
+    def delete_document(self, year, doc_id):
+        """Remove the document with the given id from a tax year"""
+        documents = self.load_year(year)
+        del documents[position_of(documents, doc_id)]
+        self.save_year(year, documents)
+
+    def cache_stats(self):
+        """Return cache counters for engines that keep an in-memory cache"""
+        return {}
+
+    def close(self):
+        """Release any resources held by the store"""
@@ -68,6 +68,38 @@ HTML_TEMPLATE = """<!DOCTYPE html>
             border: 1px solid #ddd;
         }
         
+        .view-selector input[type="search"] {
+            margin-left: auto;
+            padding: 8px;
+            width: 250px;
+            border-radius: 4px;
+            border: 1px solid #ddd;
+        }
+        
+        .search-results {
+            display: none;
+            max-height: 250px;
+            overflow-y: auto;
+            margin-bottom: 15px;
+            border: 1px solid #e0e0e0;
+            border-radius: 4px;
+        }
+        
+        .search-result {
+            padding: 8px 10px;
+            cursor: pointer;
+            border-bottom: 1px solid #f0f0f0;
+        }
+        
+        .search-result:hover {
+            background-color: #f5f5f5;
+        }
+        
+        .search-result .search-year {
+            font-weight: bold;
+            margin-right: 10px;
+        }
+        
         .document-list {
             max-height: 400px;
             overflow-y: auto;
@@ -156,6 +188,11 @@ HTML_TEMPLATE = """<!DOCTYPE html>
             z-index: 10;
         }
         
+        .show-more-btn {
+            display: block;
+            margin: 10px auto;
+        }
+        
         .section-header {
             background-color: #e0e0e0;
             padding: 10px;
@@ -290,6 +327,8 @@ HTML_TEMPLATE = """<!DOCTYPE html>
         
         <div class="data-management">
             <button id="importLastYearBtn">Import Last Year's Documents</button>
+            <label for="profileSelect">Profile:</label>
+            <select id="profileSelect"></select>
         </div>
         
         <div id="notification" class="notification"></div>
@@ -299,7 +338,7 @@ HTML_TEMPLATE = """<!DOCTYPE html>
             <input type="text" id="documentName" placeholder="Document Name" required>
             <input type="text" id="website" placeholder="Website URL (optional)">
             <input type="date" id="expectedDate" placeholder="Expected Date">
-            <button type="submit">Add Document</button>
+            <button type="submit" id="addDocumentButton">Add Document</button>
         </form>
         
         <div class="view-selector">
@@ -309,8 +348,11 @@ HTML_TEMPLATE = """<!DOCTYPE html>
                 <option value="needed">Needed Documents</option>
                 <option value="completed">Completed Documents</option>
             </select>
+            <input type="search" id="searchBox" placeholder="Search all tax years...">
         </div>
         
+        <div id="searchResults" class="search-results"></div>
+        
         <div id="documentListContainer" class="document-list">
             <div class="header-row">
                 <div class="checkbox-container"></div>
@@ -364,6 +406,18 @@ HTML_TEMPLATE = """<!DOCTYPE html>
             // Initialize with current tax year (previous calendar year)
             let currentTaxYear;
             let currentViewMode = 'all';
+            // Client profile whose documents are shown
+            let currentProfile = 'Default';
+            // Documents shown per request, more are loaded on demand
+            const PAGE_SIZE = 100;
+            // Today's date, set on each render
+            let todayIso = '';
+            // Pages of documents and their ETags as last sent by the server, by URL
+            const documentCache = new Map();
+            // Data version each year was last read at, by the year's URL, sent back with changes
+            const yearVersions = new Map();
+            // Id of the document loaded into the form by Edit, null when adding
+            let editingDocumentId = null;
             const notification = document.getElementById('notification');
             
             // Show notification
@@ -380,6 +434,31 @@ HTML_TEMPLATE = """<!DOCTYPE html>
             
             // API Functions
             
+            // URL of a profile's API endpoint, e.g. apiUrl('/documents/2024')
+            function apiUrl(path) {
+                return `/api/${encodeURIComponent(currentProfile)}${path}`;
+            }
+            
+            // Fill the profile selector and pick the server's active profile
+            async function loadProfiles() {
+                try {
+                    const response = await fetch('/api/profiles');
+                    const data = await response.json();
+                    const select = document.getElementById('profileSelect');
+                    select.innerHTML = '';
+                    data.profiles.forEach(name => {
+                        const option = document.createElement('option');
+                        option.value = name;
+                        option.textContent = name;
+                        select.appendChild(option);
+                    });
+                    currentProfile = data.active;
+                    select.value = currentProfile;
+                } catch (error) {
+                    console.error('Error loading profiles:', error);
+                }
+            }
+            
             // Get the current tax year from server
             async function fetchCurrentTaxYear() {
                 try {
@@ -396,119 +475,220 @@ HTML_TEMPLATE = """<!DOCTYPE html>
                 }
             }
             
-            // Get documents for a specific tax year
-            async function fetchDocumentsForYear(year) {
+            // Get one page of a tax year's needed or completed documents, by expected date
+            async function fetchDocumentsForYear(year, status, cursor) {
                 try {
-                    const response = await fetch(`/api/documents/${year}`);
-                    return await response.json();
+                    const params = new URLSearchParams({status: status, sort: 'expectedDate', limit: PAGE_SIZE});
+                    if (cursor) {
+                        params.set('cursor', cursor);
+                    }
+                    // The server answers 304 while the year is unchanged since we last read it
+                    const url = apiUrl(`/documents/${year}?${params}`);
+                    const cached = documentCache.get(url);
+                    const headers = cached ? {'If-None-Match': cached.etag} : {};
+                    const response = await fetch(url, {headers: headers, cache: 'no-store'});
+                    rememberVersion(year, response.headers.get('X-Data-Version'));
+                    let page;
+                    if (response.status === 304 && cached) {
+                        page = cached.page;
+                    } else {
+                        page = await response.json();
+                        if (!response.ok) {
+                            throw new Error(page.error);
+                        }
+                        const etag = response.headers.get('ETag');
+                        if (etag) {
+                            documentCache.set(url, {etag: etag, page: page});
+                        }
+                    }
+                    // Callers change the documents they get, the cached ones stay as sent
+                    return {documents: page.documents.map(doc => Object.assign({}, doc)), next_cursor: page.next_cursor};
                 } catch (error) {
                     console.error(`Error fetching documents for ${year}:`, error);
                     showNotification(`Error loading documents for ${year}`, false);
-                    return [];
+                    return {documents: [], next_cursor: null};
+                }
+            }
+            
+            // Keep the data version a year was read or written at
+            function rememberVersion(year, version) {
+                if (version !== null && version !== undefined) {
+                    yearVersions.set(apiUrl(`/documents/${year}`), String(version));
                 }
             }
             
-            // Save documents for a specific tax year
-            async function saveDocumentsForYear(year, documents) {
+            // Headers that make a change fail with 409 if the year changed since we read it
+            function versionHeaders(year) {
+                const version = yearVersions.get(apiUrl(`/documents/${year}`));
+                return version ? {'X-Data-Version': version} : {};
+            }
+            
+            // Tell the user their change wasn't saved because the year changed elsewhere
+            function showConflict() {
+                showNotification('These documents were changed elsewhere, reloaded them, please try again', false);
+            }
+            
+            // Fetch which of last year's documents each document of a year matches
+            async function fetchPreviousYearLinks(year) {
                 try {
-                    const response = await fetch(`/api/documents/${year}`, {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/json',
-                        },
-                        body: JSON.stringify(documents),
-                    });
+                    const response = await fetch(apiUrl(`/documents/${year}/links`));
+                    return response.ok ? await response.json() : {};
+                } catch (error) {
+                    console.error(`Error fetching previous year links for ${year}:`, error);
+                    return {};
+                }
+            }
+            
+            // Add, change or delete one document, returns the server's reply or null on failure
+            // Callers reload the documents afterwards, which also reads the year's new version
+            async function sendDocumentChange(method, path, body) {
+                const year = currentTaxYear;
+                try {
+                    // Adding can't overwrite anyone's change, so it is sent without the version
+                    const options = {method: method, headers: method === 'POST' ? {} : versionHeaders(year)};
+                    if (body !== undefined) {
+                        options.headers['Content-Type'] = 'application/json';
+                        options.body = JSON.stringify(body);
+                    }
+                    const response = await fetch(apiUrl(`/documents/${year}/items${path}`), options);
                     const result = await response.json();
-                    if (result.success) {
-                        showNotification(`Data for ${year} saved successfully`);
+                    if (response.status === 409 && result.conflict) {
+                        showConflict();
+                        return null;
                     }
-                    return documents;
+                    if (!response.ok) {
+                        showNotification(result.error || 'Error saving data', false);
+                        return null;
+                    }
+                    return result;
                 } catch (error) {
-                    console.error(`Error saving documents for ${year}:`, error);
+                    console.error('Error saving document:', error);
                     showNotification('Error saving data', false);
-                    return documents;
+                    return null;
                 }
             }
             
+            // Put the form back into adding new documents
+            function resetDocumentForm() {
+                editingDocumentId = null;
+                document.getElementById('addDocumentForm').reset();
+                document.getElementById('addDocumentButton').textContent = 'Add Document';
+            }
+            
             // Update the tax year display
             function updateTaxYearDisplay() {
                 document.getElementById('displayTaxYear').textContent = currentTaxYear;
                 document.getElementById('currentTaxYear').textContent = `Tax Year ${currentTaxYear}`;
+                // A document being edited belongs to the year that was shown
+                if (editingDocumentId) {
+                    resetDocumentForm();
+                }
             }
             
             // Data Management Functions
             
             // Import documents from previous year
             async function importLastYearDocuments() {
-                const prevYear = currentTaxYear - 1;
-                const prevYearDocuments = await fetchDocumentsForYear(prevYear);
-                
-                if (!prevYearDocuments || prevYearDocuments.length === 0) {
-                    showNotification(`No documents found for ${prevYear}`, false);
-                    return;
-                }
-                
-                // Get current year documents
-                let currentDocuments = await fetchDocumentsForYear(currentTaxYear);
-                const currentDocNames = currentDocuments.map(doc => doc.name);
-                
-                // Only add documents that don't already exist
-                let newDocsCount = 0;
-                
-                prevYearDocuments.forEach(doc => {
-                    if (!currentDocNames.includes(doc.name)) {
-                        newDocsCount++;
-                        currentDocuments.push({
-                            name: doc.name,
-                            website: doc.website,
-                            expectedDate: doc.expectedDate,
-                            actualDate: '',
-                            previousYearDate: doc.actualDate || doc.expectedDate,
-                            completed: false
-                        });
+                try {
+                    const response = await fetch(apiUrl(`/documents/${currentTaxYear}/import-previous`), {
+                        method: 'POST',
+                        headers: {
+                            'Content-Type': 'application/json',
+                        },
+                        body: JSON.stringify({}),
+                    });
+                    const result = await response.json();
+                    showNotification(result.message, result.imported > 0);
+                    if (result.imported > 0) {
+                        loadDocuments();
                     }
-                });
-                
-                if (newDocsCount > 0) {
-                    await saveDocumentsForYear(currentTaxYear, currentDocuments);
-                    showNotification(`Imported ${newDocsCount} documents from ${prevYear}`);
-                    loadDocuments();
-                } else {
-                    showNotification('No new documents to import');
+                } catch (error) {
+                    console.error('Error importing documents:', error);
+                    showNotification('Error importing documents', false);
                 }
             }
             
             // UI Functions
             
-            // Add a new document
+            // Add a new document, or save the one being edited
             async function addDocument(e) {
                 e.preventDefault();
                 
-                const documentName = document.getElementById('documentName').value;
-                const website = document.getElementById('website').value;
-                const expectedDate = document.getElementById('expectedDate').value;
-                
-                // Get existing documents for the current tax year
-                let documents = await fetchDocumentsForYear(currentTaxYear);
-                
-                // Add new document
-                documents.push({
-                    name: documentName,
-                    website: website,
-                    expectedDate: expectedDate,
-                    actualDate: '',
-                    previousYearDate: '',
-                    completed: false
-                });
+                const fields = {
+                    name: document.getElementById('documentName').value,
+                    website: document.getElementById('website').value,
+                    expectedDate: document.getElementById('expectedDate').value,
+                };
                 
-                // Save updated documents
-                await saveDocumentsForYear(currentTaxYear, documents);
+                // Only the one document is sent, not the whole year
+                let result;
+                if (editingDocumentId) {
+                    result = await sendDocumentChange('PATCH', `/${encodeURIComponent(editingDocumentId)}`, fields);
+                } else {
+                    result = await sendDocumentChange('POST', '', Object.assign(fields, {
+                        actualDate: '',
+                        previousYearDate: '',
+                        completed: false
+                    }));
+                }
+                if (result) {
+                    showNotification(editingDocumentId ? 'Document updated' : 'Document added');
+                }
                 
                 // Reset form and refresh the list
-                document.getElementById('addDocumentForm').reset();
+                resetDocumentForm();
                 loadDocuments();
             }
             
+            // Give documents without a previous year date the date of last year's matching document
+            async function fillPreviousYearDates(year, documents, links) {
+                const operations = [];
+                documents.forEach(doc => {
+                    // The matching document from the previous year, even if it was renamed
+                    const link = links[doc.id];
+                    if (!doc.previousYearDate && link && link.date) {
+                        doc.previousYearDate = link.date;
+                        operations.push({op: 'update', year: year, id: doc.id,
+                                         changes: {previousYearDate: link.date}});
+                    }
+                });
+                if (operations.length === 0) {
+                    return;
+                }
+                // One write for the page, based on the version the page was read at
+                const version = yearVersions.get(apiUrl(`/documents/${year}`));
+                try {
+                    const response = await fetch(apiUrl('/batch'), {
+                        method: 'POST',
+                        headers: {'Content-Type': 'application/json'},
+                        body: JSON.stringify({operations: operations,
+                                              expected_versions: version ? {[year]: Number(version)} : {}})
+                    });
+                    const result = await response.json();
+                    // After a conflict the dates are still shown, and saved on the next load
+                    if (response.ok) {
+                        rememberVersion(year, result.versions[year]);
+                    }
+                } catch (error) {
+                    console.error('Error saving previous year dates:', error);
+                }
+            }
+            
+            // Show a page of a section's documents, with a button for the next page if there is one
+            async function showDocumentPage(section, page, links) {
+                await fillPreviousYearDates(currentTaxYear, page.documents, links);
+                page.documents.forEach(doc => {
+                    createDocumentElement(doc, section.completed, section.container);
+                });
+                section.moreButton.style.display = page.next_cursor ? '' : 'none';
+                section.moreButton.onclick = async () => {
+                    section.moreButton.disabled = true;
+                    const next = await fetchDocumentsForYear(currentTaxYear, section.status, page.next_cursor);
+                    section.moreButton.disabled = false;
+                    await showDocumentPage(section, next, links);
+                };
+            }
+            
             // Load documents for the current tax year
             async function loadDocuments() {
                 const documentListContainer = document.getElementById('documentListContainer');
@@ -518,67 +698,48 @@ HTML_TEMPLATE = """<!DOCTYPE html>
                 documentListContainer.innerHTML = '';
                 documentListContainer.appendChild(headerRow);
                 
-                const documents = await fetchDocumentsForYear(currentTaxYear);
-                const prevYearDocuments = await fetchDocumentsForYear(currentTaxYear - 1);
-                
-                // Update previous year dates if available
-                let documentsUpdated = false;
-                documents.forEach((doc, index) => {
-                    // Look for matching document from previous year
-                    const prevYearDoc = prevYearDocuments.find(prevDoc => prevDoc.name === doc.name);
-                    
-                    // If current doc doesn't have previousYearDate but we found a match, add it
-                    if (!doc.previousYearDate && prevYearDoc && (prevYearDoc.actualDate || prevYearDoc.expectedDate)) {
-                        doc.previousYearDate = prevYearDoc.actualDate || prevYearDoc.expectedDate;
-                        // Save the updated document
-                        documents[index] = doc;
-                        documentsUpdated = true;
-                    }
-                });
-                
-                // Save any updates
-                if (documentsUpdated) {
-                    await saveDocumentsForYear(currentTaxYear, documents);
-                }
-                
-                // Filter documents based on view mode
-                let neededDocuments = [];
-                let completedDocuments = [];
+                // Today as YYYY-MM-DD in local time, for the overdue check
+                const now = new Date();
+                todayIso = [now.getFullYear(), String(now.getMonth() + 1).padStart(2, '0'),
+                            String(now.getDate()).padStart(2, '0')].join('-');
                 
+                // The server filters by status and sends a page at a time
+                const sections = [];
                 if (currentViewMode === 'all' || currentViewMode === 'needed') {
-                    neededDocuments = documents.filter(doc => !doc.completed);
+                    sections.push({status: 'needed', title: 'Needed Documents', completed: false});
                 }
-                
                 if (currentViewMode === 'all' || currentViewMode === 'completed') {
-                    completedDocuments = documents.filter(doc => doc.completed);
+                    sections.push({status: 'completed', title: 'Completed Documents', completed: true});
                 }
+                const year = currentTaxYear;
+                const [links, ...pages] = await Promise.all([fetchPreviousYearLinks(year)].concat(
+                    sections.map(section => fetchDocumentsForYear(year, section.status))));
                 
-                // Create the needed documents section if applicable
-                if (neededDocuments.length > 0 && (currentViewMode === 'all' || currentViewMode === 'needed')) {
-                    const neededHeader = document.createElement('div');
-                    neededHeader.className = 'section-header';
-                    neededHeader.textContent = 'Needed Documents';
-                    documentListContainer.appendChild(neededHeader);
+                let shown = 0;
+                for (const [i, section] of sections.entries()) {
+                    if (pages[i].documents.length === 0) {
+                        continue;
+                    }
+                    shown += pages[i].documents.length;
                     
-                    neededDocuments.forEach((doc, index) => {
-                        createDocumentElement(doc, documents.indexOf(doc), false);
-                    });
-                }
-                
-                // Create the completed documents section if applicable
-                if (completedDocuments.length > 0 && (currentViewMode === 'all' || currentViewMode === 'completed')) {
-                    const completedHeader = document.createElement('div');
-                    completedHeader.className = 'section-header';
-                    completedHeader.textContent = 'Completed Documents';
-                    documentListContainer.appendChild(completedHeader);
+                    const header = document.createElement('div');
+                    header.className = 'section-header';
+                    header.textContent = section.title;
+                    documentListContainer.appendChild(header);
                     
-                    completedDocuments.forEach((doc, index) => {
-                        createDocumentElement(doc, documents.indexOf(doc), true);
-                    });
+                    section.container = document.createElement('div');
+                    documentListContainer.appendChild(section.container);
+                    
+                    section.moreButton = document.createElement('button');
+                    section.moreButton.className = 'show-more-btn';
+                    section.moreButton.textContent = 'Show more';
+                    documentListContainer.appendChild(section.moreButton);
+                    
+                    await showDocumentPage(section, pages[i], links);
                 }
                 
                 // If no documents found, show a message
-                if (documents.length === 0) {
+                if (shown === 0) {
                     const noDocsMessage = document.createElement('div');
                     noDocsMessage.textContent = 'No documents found for this tax year.';
                     noDocsMessage.style.padding = '15px';
@@ -588,7 +749,7 @@ HTML_TEMPLATE = """<!DOCTYPE html>
             }
             
             // Create a document element
-            function createDocumentElement(doc, index, isCompletedSection) {
+            function createDocumentElement(doc, isCompletedSection, container) {
                 const documentRow = document.createElement('div');
                 documentRow.className = 'document-row';
                 if (doc.completed && !isCompletedSection) {
@@ -603,7 +764,7 @@ HTML_TEMPLATE = """<!DOCTYPE html>
                 checkbox.type = 'checkbox';
                 checkbox.className = 'checkbox';
                 checkbox.checked = doc.completed;
-                checkbox.dataset.index = index;
+                checkbox.dataset.id = doc.id;
                 checkbox.addEventListener('change', toggleDocumentStatus);
                 
                 checkboxContainer.appendChild(checkbox);
@@ -626,8 +787,8 @@ HTML_TEMPLATE = """<!DOCTYPE html>
                 const dateElement = document.createElement('div');
                 dateElement.className = 'document-date';
                 
-                // Check if the expected date has passed
-                const expectedDatePassed = doc.expectedDate && new Date(doc.expectedDate) < new Date();
+                // ISO dates compare as strings, no Date objects needed per row
+                const expectedDatePassed = doc.expectedDate && doc.expectedDate < todayIso;
                 
                 if (expectedDatePassed) {
                     dateElement.classList.add('date-passed');
@@ -650,13 +811,13 @@ HTML_TEMPLATE = """<!DOCTYPE html>
                 const editButton = document.createElement('button');
                 editButton.className = 'edit-btn';
                 editButton.textContent = 'Edit';
-                editButton.dataset.index = index;
+                editButton.dataset.id = doc.id;
                 editButton.addEventListener('click', editDocument);
                 
                 const deleteButton = document.createElement('button');
                 deleteButton.className = 'delete-btn';
                 deleteButton.textContent = 'Delete';
-                deleteButton.dataset.index = index;
+                deleteButton.dataset.id = doc.id;
                 deleteButton.addEventListener('click', deleteDocument);
                 
                 actionButtons.appendChild(editButton);
@@ -683,61 +844,111 @@ HTML_TEMPLATE = """<!DOCTYPE html>
                     }
                 });
                 
-                // Add to document list
-                document.getElementById('documentListContainer').appendChild(documentRow);
+                // Add to the section's list
+                container.appendChild(documentRow);
             }
             
             // Toggle document status (completed/needed)
             async function toggleDocumentStatus(e) {
-                const index = parseInt(e.target.dataset.index);
-                const documents = await fetchDocumentsForYear(currentTaxYear);
-                
-                // Toggle completion status
-                documents[index].completed = e.target.checked;
+                const id = e.target.dataset.id;
                 
-                // If completed, set actual date to today if not already set
-                if (e.target.checked && !documents[index].actualDate) {
-                    const today = new Date();
-                    const formattedDate = today.toISOString().split('T')[0];
-                    documents[index].actualDate = formattedDate;
+                // The server flips the status and sets the actual date if not already set
+                try {
+                    const response = await fetch(apiUrl(`/documents/${currentTaxYear}/items/${encodeURIComponent(id)}/toggle`), {
+                        method: 'POST',
+                        headers: versionHeaders(currentTaxYear)
+                    });
+                    if (!response.ok) {
+                        const result = await response.json();
+                        if (response.status === 409 && result.conflict) {
+                            showConflict();
+                        } else {
+                            showNotification(result.error || 'Error saving data', false);
+                        }
+                    }
+                } catch (error) {
+                    console.error('Error toggling document status:', error);
+                    showNotification('Error saving data', false);
                 }
                 
-                // Save updated documents
-                await saveDocumentsForYear(currentTaxYear, documents);
-                
                 // Refresh the list
                 loadDocuments();
             }
             
-            // Format date for display
-            function formatDate(dateString) {
+            // Search every tax year and list the matches
+            async function searchDocuments(query) {
+                const resultsElement = document.getElementById('searchResults');
+                if (!query.trim()) {
+                    resultsElement.style.display = 'none';
+                    return;
+                }
+                try {
+                    const response = await fetch(apiUrl(`/search?q=${encodeURIComponent(query)}`));
+                    const results = await response.json();
+                    resultsElement.innerHTML = '';
+                    if (results.length === 0) {
+                        resultsElement.textContent = 'No matching documents.';
+                    }
+                    results.forEach(result => {
+                        const row = document.createElement('div');
+                        row.className = 'search-result';
+                        const year = document.createElement('span');
+                        year.className = 'search-year';
+                        year.textContent = result.year;
+                        row.appendChild(year);
+                        row.appendChild(document.createTextNode(
+                            result.name + (result.website ? ` (${result.website})` : '') +
+                            (result.completed ? ' \u2713' : '')));
+                        row.addEventListener('click', () => {
+                            currentTaxYear = Number(result.year);
+                            updateTaxYearDisplay();
+                            loadDocuments();
+                            resultsElement.style.display = 'none';
+                        });
+                        resultsElement.appendChild(row);
+                    });
+                    resultsElement.style.display = 'block';
+                } catch (error) {
+                    console.error('Error searching documents:', error);
+                }
+            }
+            
+            // Format date for display, each (date, locale) is formatted once
+            const formattedDates = new Map();
+            function formatDate(dateString, locale = 'en-US') {
                 if (!dateString) return 'No date set';
-                const date = new Date(dateString);
-                return date.toLocaleDateString('en-US', {
-                    year: 'numeric',
-                    month: 'short',
-                    day: 'numeric'
-                });
+                const key = `${dateString}|${locale}`;
+                let formatted = formattedDates.get(key);
+                if (formatted === undefined) {
+                    // Built from its parts so the date isn't shifted by the time zone
+                    const [year, month, day] = dateString.split('-').map(Number);
+                    formatted = new Date(year, month - 1, day).toLocaleDateString(locale, {
+                        year: 'numeric',
+                        month: 'short',
+                        day: 'numeric'
+                    });
+                    formattedDates.set(key, formatted);
+                }
+                return formatted;
             }
             
             // Edit a document
             async function editDocument(e) {
                 e.stopPropagation(); // Prevent row click event
-                const index = e.target.dataset.index;
-                const documents = await fetchDocumentsForYear(currentTaxYear);
-                const doc = documents[index];
+                const id = e.target.dataset.id;
+                const response = await fetch(apiUrl(`/documents/${currentTaxYear}/items/${encodeURIComponent(id)}`));
+                if (!response.ok) {
+                    loadDocuments();
+                    return;
+                }
+                const doc = await response.json();
                 
-                // Populate form with document data
+                // Populate form with document data, saving it changes this document
+                editingDocumentId = id;
                 document.getElementById('documentName').value = doc.name;
                 document.getElementById('website').value = doc.website || '';
                 document.getElementById('expectedDate').value = doc.expectedDate || '';
-                
-                // Remove the document from the list
-                documents.splice(index, 1);
-                await saveDocumentsForYear(currentTaxYear, documents);
-                
-                // Refresh the list
-                loadDocuments();
+                document.getElementById('addDocumentButton').textContent = 'Save Changes';
                 
                 // Focus on the form
                 document.getElementById('documentName').focus();
@@ -747,12 +958,13 @@ HTML_TEMPLATE = """<!DOCTYPE html>
             async function deleteDocument(e) {
                 e.stopPropagation(); // Prevent row click event
                 if (confirm('Are you sure you want to delete this document?')) {
-                    const index = e.target.dataset.index;
-                    const documents = await fetchDocumentsForYear(currentTaxYear);
-                    
-                    // Remove the document from the list
-                    documents.splice(index, 1);
-                    await saveDocumentsForYear(currentTaxYear, documents);
+                    const id = e.target.dataset.id;
+                    if (await sendDocumentChange('DELETE', `/${encodeURIComponent(id)}`)) {
+                        showNotification('Document deleted');
+                    }
+                    if (id === editingDocumentId) {
+                        resetDocumentForm();
+                    }
                     
                     // Refresh the list
                     loadDocuments();
@@ -776,11 +988,25 @@ HTML_TEMPLATE = """<!DOCTYPE html>
                 loadDocuments();
             });
             document.getElementById('importLastYearBtn').addEventListener('click', importLastYearDocuments);
+            let searchTimer;
+            document.getElementById('searchBox').addEventListener('input', (e) => {
+                // Wait for a pause in typing before asking the server
+                clearTimeout(searchTimer);
+                searchTimer = setTimeout(() => searchDocuments(e.target.value), 200);
+            });
+            document.getElementById('profileSelect').addEventListener('change', (e) => {
+                currentProfile = e.target.value;
+                if (editingDocumentId) {
+                    resetDocumentForm();
+                }
+                loadDocuments();
+            });
             
             // Initialize the application
             async function initApp() {
                 // Get current tax year from server
                 currentTaxYear = await fetchCurrentTaxYear();
+                await loadProfiles();
                 updateTaxYearDisplay();
                 await loadDocuments();
             }
@@ -0,0 +1,185 @@
+import queue
+import threading
+import time
+
+from data_manager import (apply_batch, get_active_profile, using_profile, ArchivedYearError, BatchError,
+                          VersionConflict)
+
+# How long to wait for more changes before writing...
+SAVE_DELAY = 0.5
+# ...but never hold changes back for longer than this
+MAX_SAVE_DELAY = 3.0
+
+
+class BackgroundSaver:
+    """Collects document changes from the GUI and writes them on a worker thread
+
+    Changes made within SAVE_DELAY of each other are merged per tax year (of
+    the profile that was active when they were made) and each profile's
+    changes are written with one apply_batch call, so clicking through many
+    checkboxes, or changing many selected documents at once, costs a single
+    write. Several changes to the same document collapse into its latest
+    state. A year changed elsewhere since it was loaded, or whose changes
+    can't be written (it was archived, or a document is invalid), is left
+    out and reported, the other years are still written.
+
+    The worker never touches Tk. It reports progress as events on a queue
+    that the GUI polls with poll_events(): ("saving", count), then either
+    ("saved",) or a ("conflict", profile, year) or ("error", profile, year,
+    message) for each year that wasn't written.
+    """
+
+    def __init__(self, delay=SAVE_DELAY):
+        self.delay = delay
+        self.events = queue.Queue()
+        self._condition = threading.Condition()
+        # (profile, year) -> {doc_id: ("put", document) or ("delete", doc_id)}, in change order
+        self._pending = {}
+        self._versions = {}
+        self._change_count = 0
+        self._flush_requested = False
+        self._writing = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def set_version(self, year, version):
+        """Record the data version of a year the GUI has just loaded"""
+        with self._condition:
+            self._versions[(get_active_profile(), str(year))] = version
+
+    def put(self, year, document):
+        """Queue a new or changed document (a dict with an "id")"""
+        self._queue_change(year, document["id"], ("put", document))
+
+    def delete(self, year, doc_id):
+        """Queue the deletion of a document"""
+        self._queue_change(year, doc_id, ("delete", doc_id))
+
+    def _queue_change(self, year, doc_id, change):
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("BackgroundSaver is closed")
+            changes = self._pending.setdefault((get_active_profile(), str(year)), {})
+            # Re-insert so the document moves to the end of the change order
+            changes.pop(doc_id, None)
+            changes[doc_id] = change
+            self._change_count += 1
+            self._condition.notify_all()
+
+    def has_pending(self):
+        with self._condition:
+            return bool(self._pending) or self._writing
+
+    def flush(self, timeout=None):
+        """Write pending changes now and wait until they are on disk
+
+        Returns False if the timeout expired first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self._flush_requested = True
+            self._condition.notify_all()
+            while self._pending or self._writing:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def close(self):
+        """Flush pending changes and stop the worker thread"""
+        self.flush()
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._flush_requested = False
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                # Keep collecting until no change has arrived for a full delay
+                give_up = time.monotonic() + MAX_SAVE_DELAY
+                while not self._flush_requested and not self._closed:
+                    before = self._change_count
+                    self._condition.wait(min(self.delay, max(give_up - time.monotonic(), 0)))
+                    if self._change_count == before or time.monotonic() >= give_up:
+                        break
+                batch, self._pending = self._pending, {}
+                versions = dict(self._versions)
+                self._writing = True
+            self._write(batch, versions)
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+    @staticmethod
+    def _operation(year, change):
+        op, value = change
+        if op == "put":
+            return {"op": "put", "year": year, "document": value}
+        return {"op": "delete", "year": year, "id": value, "missing_ok": True}
+
+    def _write(self, batch, versions):
+        self.events.put(("saving", sum(len(changes) for changes in batch.values())))
+        by_profile = {}
+        for (profile, year), changes in batch.items():
+            by_profile.setdefault(profile, {})[year] = changes
+        failed = 0
+        for profile, years in by_profile.items():
+            failed += self._write_years(profile, years, versions)
+        if not failed:
+            self.events.put(("saved",))
+
+    def _write_years(self, profile, years, versions):
+        """Write the changes of some of a profile's years, returns how many years failed
+
+        A year that fails is reported and dropped and the rest are retried,
+        so one bad year never costs the changes to the others.
+        """
+        failed = 0
+        while years:
+            operations = [self._operation(year, change)
+                          for year, changes in years.items() for change in changes.values()]
+            try:
+                with using_profile(profile):
+                    result = apply_batch(operations, {year: versions.get((profile, year)) for year in years})
+            except VersionConflict as conflict:
+                self.events.put(("conflict", profile, str(conflict.year)))
+                years.pop(str(conflict.year))
+                failed += 1
+                continue
+            except Exception as e:
+                if isinstance(e, ArchivedYearError):
+                    year = str(e.year)
+                elif isinstance(e, BatchError) and e.index is not None:
+                    year = operations[e.index]["year"]
+                elif len(years) > 1:
+                    # Not tied to one year, find out which fail by writing each alone
+                    return failed + sum(self._write_years(profile, {year: changes}, versions)
+                                        for year, changes in years.items())
+                else:
+                    year = next(iter(years))
+                self.events.put(("error", profile, year, str(e)))
+                years.pop(year)
+                failed += 1
+                continue
+            with self._condition:
+                for year, version in result["versions"].items():
+                    self._versions[(profile, year)] = version
+            break
+        return failed
+
+    def poll_events(self):
+        """Return the events reported since the last call"""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
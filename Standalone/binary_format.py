@@ -0,0 +1,287 @@
+"""Compact binary file format for the document data
+
+Layout (all integers are little-endian unsigned 32-bit unless noted):
+
+    magic b'TDHB', u16 format version, u16 reserved
+    value table:   byte length, then a compact JSON array of every distinct
+                   key and scalar value in the file
+    nested values: count, then the table indexes whose entry is the JSON text
+                   of a list/dict value (decoded per document, never shared)
+    shapes:        count, then for each: key count followed by key indexes
+    years:         count, then for each: year key index, document count,
+                   block length in words, and the block itself
+
+Each document record in a year block is its shape index followed by one
+value index per key of that shape, so the shape index gives the record's
+length. Key names and repeated values such as websites and dates are stored
+once, and a reader can skip a year without decoding it.
+"""
+import json
+import os
+import struct
+import sys
+import threading
+from array import array
+from pathlib import Path
+
+from json_store import JsonStore, file_signature, copy_data
+from store_base import DocumentStore
+
+MAGIC = b'TDHB'
+FORMAT_VERSION = 1
+_HEADER = struct.Struct('<4sHH')
+_U32 = struct.Struct('<I')
+
+
+def _words(values):
+    words = array('I', values)
+    if sys.byteorder == 'big':
+        words.byteswap()
+    return words.tobytes()
+
+
+def encode(data):
+    """Encode a year -> documents dict into the binary format"""
+    table = []
+    table_index = {}
+    nested = []
+    shapes = []
+    shape_index = {}
+
+    def intern(value):
+        if isinstance(value, (list, dict)):
+            nested.append(len(table))
+            table.append(json.dumps(value, separators=(',', ':')))
+            return len(table) - 1
+        # bool is a subclass of int, keep True and 1 apart
+        key = (type(value), value)
+        index = table_index.get(key)
+        if index is None:
+            index = table_index[key] = len(table)
+            table.append(value)
+        return index
+
+    year_blocks = []
+    for year, documents in data.items():
+        block = []
+        for doc in documents:
+            keys = tuple(intern(key) for key in doc)
+            shape = shape_index.get(keys)
+            if shape is None:
+                shape = shape_index[keys] = len(shapes)
+                shapes.append(keys)
+            block.append(shape)
+            block.extend(intern(value) for value in doc.values())
+        year_blocks.append((intern(str(year)), len(documents), block))
+
+    table_bytes = json.dumps(table, separators=(',', ':')).encode('utf-8')
+    parts = [_HEADER.pack(MAGIC, FORMAT_VERSION, 0),
+             _U32.pack(len(table_bytes)), table_bytes,
+             _U32.pack(len(nested)), _words(nested),
+             _U32.pack(len(shapes))]
+    for keys in shapes:
+        parts.append(_words((len(keys),) + keys))
+    parts.append(_U32.pack(len(year_blocks)))
+    for year_key, count, block in year_blocks:
+        parts.append(_words((year_key, count, len(block))))
+        parts.append(_words(block))
+    return b''.join(parts)
+
+
+class _Reader:
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.offset = 0
+
+    def u32(self):
+        value, = _U32.unpack_from(self.buffer, self.offset)
+        self.offset += 4
+        return value
+
+    def words(self, count):
+        words = array('I')
+        words.frombytes(self.buffer[self.offset:self.offset + 4 * count])
+        if sys.byteorder == 'big':
+            words.byteswap()
+        self.offset += 4 * count
+        return words
+
+    def skip_words(self, count):
+        self.offset += 4 * count
+
+
+def decode(buffer, only_year=None):
+    """Decode the binary format back into a year -> documents dict
+
+    With only_year, every other year's block is skipped without decoding.
+    """
+    if len(buffer) < _HEADER.size:
+        raise ValueError("File too short for the binary data format")
+    magic, version, _ = _HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a binary tax document data file")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"Binary data format version {version} is newer than supported")
+
+    reader = _Reader(buffer)
+    reader.offset = _HEADER.size
+    table_length = reader.u32()
+    table = json.loads(bytes(buffer[reader.offset:reader.offset + table_length]))
+    reader.offset += table_length
+    nested = set(reader.words(reader.u32()))
+    shapes = []
+    for _ in range(reader.u32()):
+        shapes.append(tuple(table[i] for i in reader.words(reader.u32())))
+
+    lookup = table.__getitem__
+    data = {}
+    for _ in range(reader.u32()):
+        year = table[reader.u32()]
+        count = reader.u32()
+        length = reader.u32()
+        if only_year is not None and year != only_year:
+            reader.skip_words(length)
+            continue
+        block = reader.words(length)
+        documents = []
+        position = 0
+        for _ in range(count):
+            keys = shapes[block[position]]
+            end = position + 1 + len(keys)
+            values = block[position + 1:end]
+            if nested and not nested.isdisjoint(values):
+                doc = {key: json.loads(table[v]) if v in nested else table[v]
+                       for key, v in zip(keys, values)}
+            else:
+                doc = dict(zip(keys, map(lookup, values)))
+            documents.append(doc)
+            position = end
+        data[year] = documents
+    return data
+
+
+def write_binary_atomic(path, data):
+    """Encode data and move it over path in one step"""
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(encode(data))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class BinaryStore(DocumentStore):
+    """Stores every tax year in a single file using the compact binary format
+
+    Like JsonStore, the decoded data is cached while the file's signature is
+    unchanged, and a single year can be read without decoding the others.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._cached_signature = None
+        self._cached_data = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _cached(self, signature):
+        with self._lock:
+            if signature is not None and signature == self._cached_signature:
+                self.cache_hits += 1
+                return self._cached_data
+            self.cache_misses += 1
+            return None
+
+    def _read(self, only_year=None):
+        signature = file_signature(self.path)
+        data = self._cached(signature)
+        if data is not None:
+            return data
+        if signature is None:
+            return {}
+        with open(self.path, 'rb') as f:
+            data = decode(memoryview(f.read()), only_year)
+        if only_year is None and file_signature(self.path) == signature:
+            with self._lock:
+                self._cached_signature = signature
+                self._cached_data = data
+        return data
+
+    def _write(self, data):
+        write_binary_atomic(self.path, data)
+        with self._lock:
+            self._cached_signature = file_signature(self.path)
+            self._cached_data = data
+
+    def load_all(self):
+        return copy_data(self._read())
+
+    def save_all(self, data):
+        with self._write_lock:
+            self._write(copy_data(data))
+
+    def list_years(self):
+        return list(self._read())
+
+    def load_year(self, year):
+        return [dict(doc) for doc in self._read(str(year)).get(str(year), [])]
+
+    def save_year(self, year, documents):
+        with self._write_lock:
+            all_data = dict(self._read())
+            all_data[str(year)] = [dict(doc) for doc in documents]
+            self._write(all_data)
+
+    def save_years(self, data):
+        with self._write_lock:
+            all_data = dict(self._read())
+            for year, documents in data.items():
+                all_data[str(year)] = [dict(doc) for doc in documents]
+            self._write(all_data)
+
+    def delete_year(self, year):
+        with self._write_lock:
+            all_data = dict(self._read())
+            if all_data.pop(str(year), None) is not None:
+                self._write(all_data)
+
+    def cache_stats(self):
+        with self._lock:
+            return {"hits": self.cache_hits, "misses": self.cache_misses}
+
+
+def convert(source, destination):
+    """Convert between the JSON and binary data files, based on the source's contents
+
+    A JSON source is read with its journal (the .journal file next to it)
+    replayed, so writes not yet compacted into it are converted too, and a
+    JSON destination is written as a JsonStore snapshot without a journal.
+    """
+    with open(source, 'rb') as f:
+        is_binary = f.read(len(MAGIC)) == MAGIC
+    if is_binary:
+        with open(source, 'rb') as f:
+            data = decode(memoryview(f.read()))
+        JsonStore(destination).save_all(data)
+    else:
+        data = JsonStore(source).read_files()
+        write_binary_atomic(destination, data)
+    return sum(len(documents) for documents in data.values())
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Convert tax document data between JSON and the binary format')
+    parser.add_argument('source', help='JSON or binary data file to read')
+    parser.add_argument('destination', help='File to write in the other format')
+    args = parser.parse_args()
+    count = convert(args.source, args.destination)
+    print(f"Converted {count} documents from {args.source} to {args.destination}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Reading document rows from CSV or NDJSON files for bulk import
+
+Rows are read one at a time from any iterable of text lines (an open file,
+or a request body wrapped in a text reader), so the input is never held in
+memory as a whole. Column names are matched loosely, e.g. "Expected Date",
+"expected_date" and "expectedDate" are the same column, and dates are
+accepted in the common US and ISO spellings and stored as YYYY-MM-DD.
+"""
+import csv
+import datetime
+import json
+import re
+
+FORMATS = ("csv", "ndjson")
+
+# Errors kept for the report, the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+_COLUMNS = {
+    "name": "name", "document": "name", "documentname": "name",
+    "website": "website", "url": "website", "link": "website",
+    "expecteddate": "expectedDate", "expected": "expectedDate", "due": "expectedDate", "duedate": "expectedDate",
+    "actualdate": "actualDate", "actual": "actualDate", "received": "actualDate", "receiveddate": "actualDate",
+    "previousyeardate": "previousYearDate", "previous": "previousYearDate", "lastyeardate": "previousYearDate",
+    "completed": "completed", "done": "completed", "received?": "completed",
+}
+_DATE_KEYS = ("expectedDate", "actualDate", "previousYearDate")
+_DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%Y/%m/%d", "%m-%d-%Y",
+                 "%b %d %Y", "%B %d %Y", "%d %b %Y", "%d %B %Y", "%d-%b-%Y")
+_TRUE = {"1", "true", "yes", "y", "x", "done", "completed"}
+_FALSE = {"", "0", "false", "no", "n"}
+
+
+def detect_format(name):
+    """Guess the row format from a file name or content type, defaulting to csv"""
+    name = (name or "").lower()
+    if name.endswith((".ndjson", ".jsonl", ".json")) or "ndjson" in name or "jsonl" in name:
+        return "ndjson"
+    return "csv"
+
+
+def read_rows(lines, fmt="csv"):
+    """Yield (line number, row dict) for each row of a CSV or NDJSON stream
+
+    A line that isn't valid NDJSON is yielded with a ValueError in place of
+    the row, so one bad line doesn't end the import.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            if any(value and value.strip() for value in row.values() if isinstance(value, str)):
+                yield reader.line_num, row
+    elif fmt == "ndjson":
+        for line_number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, ValueError(f"not valid JSON ({e.msg})")
+                continue
+            if not isinstance(row, dict):
+                row = ValueError("expected a JSON object")
+            yield line_number, row
+    else:
+        raise ValueError(f"Unknown import format {fmt!r}, use one of {', '.join(FORMATS)}")
+
+
+def normalize_date(value):
+    """Return value as a YYYY-MM-DD string ("" if empty), raises ValueError if it isn't a date"""
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.strftime("%Y-%m-%d")
+    text = re.sub(r"[\s,]+", " ", str(value or "")).strip()
+    if not text:
+        return ""
+    # Timestamps such as 2024-01-31T00:00:00 keep just their date
+    text = text.split("T", 1)[0] if re.match(r"\d{4}-\d{2}-\d{2}T", text) else text
+    for date_format in _DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, date_format).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognized date {value!r}")
+
+
+def _completed(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value if value is not None else "").strip().lower()
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    raise ValueError(f"unrecognized completed value {value!r}")
+
+
+def normalize_row(row):
+    """Turn an imported row into a stored document dict, raises ValueError if invalid"""
+    document = {}
+    for column, value in row.items():
+        if column is None:
+            raise ValueError("more values than columns")
+        key = _COLUMNS.get(re.sub(r"[\s_-]+", "", column).lower())
+        if key is not None:
+            document[key] = value.strip() if isinstance(value, str) else value
+    if not document.get("name"):
+        raise ValueError("missing document name")
+    for key in _DATE_KEYS:
+        document[key] = normalize_date(document.get(key))
+    document["website"] = document.get("website") or ""
+    document["completed"] = _completed(document.get("completed"))
+    return document
+
+
+def describe_report(report):
+    """Return a one-paragraph summary of a bulk_import() report"""
+    parts = [f"Imported {report['imported']} documents"]
+    if report["duplicates"]:
+        parts.append(f"skipped {report['duplicates']} already listed")
+    if report["invalid"]:
+        parts.append(f"skipped {report['invalid']} invalid rows")
+    message = ", ".join(parts)
+    if report["errors"]:
+        message += "\n" + "\n".join(report["errors"])
+        if report["invalid"] > len(report["errors"]):
+            message += f"\n... and {report['invalid'] - len(report['errors'])} more"
+    return message
@@ -3,6 +3,8 @@ from tkinter import ttk
 from tkcalendar import DateEntry
 import datetime
 
+from document_model import Document, display_date
+
 class DocumentEditor:
     def __init__(self, parent, document=None, callback=None):
         """Initialize document editor dialog
@@ -10,10 +12,11 @@ class DocumentEditor:
         Args:
             parent: Parent window
             document: Document to edit (None for new document)
-            callback: Function to call with document data when saved
+            callback: Function to call with the saved Document
         """
         self.parent = parent
-        self.document = document or {}  # Empty dict for new document
+        self.is_new = document is None
+        self.document = document or Document()
         self.callback = callback
         
         self.dialog = tk.Toplevel(parent)
@@ -48,7 +51,7 @@ class DocumentEditor:
         ttk.Label(main_frame, text="Document Name:").grid(
             row=row, column=0, sticky=tk.W, padx=(0, 10), pady=5
         )
-        self.name_var = tk.StringVar(value=self.document.get("name", ""))
+        self.name_var = tk.StringVar(value=self.document.name)
         ttk.Entry(main_frame, textvariable=self.name_var).grid(
             row=row, column=1, sticky=tk.EW, pady=5
         )
@@ -59,7 +62,7 @@ class DocumentEditor:
         ttk.Label(main_frame, text="Website URL:").grid(
             row=row, column=0, sticky=tk.W, padx=(0, 10), pady=5
         )
-        self.website_var = tk.StringVar(value=self.document.get("website", ""))
+        self.website_var = tk.StringVar(value=self.document.website)
         ttk.Entry(main_frame, textvariable=self.website_var).grid(
             row=row, column=1, sticky=tk.EW, pady=5
         )
@@ -75,7 +78,7 @@ class DocumentEditor:
         
         # Date entry enabled checkbox
         self.use_date_var = tk.BooleanVar(
-            value=bool(self.document.get("expectedDate", ""))
+            value=bool(self.document.expected)
         )
         date_check = ttk.Checkbutton(
             date_frame, 
@@ -96,14 +99,10 @@ class DocumentEditor:
         )
         
         # Set date if it exists in document
-        if self.document.get("expectedDate"):
-            try:
-                self.expected_date.set_date(self.document.get("expectedDate"))
-                self.expected_date.pack(side=tk.LEFT)
-            except:
-                # Default to today if date format is invalid
-                self.expected_date.set_date(datetime.date.today())
-                self.expected_date.pack(side=tk.LEFT)
+        if self.document.expected:
+            # Default to today if date format is invalid
+            self.expected_date.set_date(self.document.expected_date or datetime.date.today())
+            self.expected_date.pack(side=tk.LEFT)
         else:
             # No date set
             self.expected_date.set_date(datetime.date.today())
@@ -114,12 +113,11 @@ class DocumentEditor:
         row += 1
         
         # Previous year date (display only if editing)
-        if self.document:
+        if not self.is_new:
             ttk.Label(main_frame, text="Previous Year:").grid(
                 row=row, column=0, sticky=tk.W, padx=(0, 10), pady=5
             )
-            prev_date = self.document.get("previousYearDate", "")
-            prev_date_str = self.format_date(prev_date) if prev_date else "None"
+            prev_date_str = self.format_date(self.document) or "None"
             ttk.Label(main_frame, text=prev_date_str).grid(
                 row=row, column=1, sticky=tk.W, pady=5
             )
@@ -127,11 +125,11 @@ class DocumentEditor:
             row += 1
         
         # Completed checkbox (only show if editing existing document)
-        if self.document:
+        if not self.is_new:
             ttk.Label(main_frame, text="Completed:").grid(
                 row=row, column=0, sticky=tk.W, padx=(0, 10), pady=5
             )
-            self.completed_var = tk.BooleanVar(value=self.document.get("completed", False))
+            self.completed_var = tk.BooleanVar(value=self.document.completed)
             ttk.Checkbutton(main_frame, variable=self.completed_var).grid(
                 row=row, column=1, sticky=tk.W, pady=5
             )
@@ -175,38 +173,30 @@ class DocumentEditor:
             self.show_error("Document name cannot be empty")
             return
         
-        # Get date as string (or empty string if not using)
+        # Get date (or empty string if not using)
         if self.use_date_var.get():
             try:
-                date_str = self.expected_date.get_date().isoformat()
+                expected = self.expected_date.get_date()
             except:
-                date_str = ""
+                expected = ""
         else:
-            date_str = ""
+            expected = ""
         
-        # Create document data
-        document = {
-            "name": name,
-            "website": self.website_var.get().strip(),
-            "expectedDate": date_str,
-        }
+        # Start from a copy so the id, previous year date and any unknown
+        # fields carry over unchanged
+        document = self.document.copy()
+        document.name = name
+        document.website = self.website_var.get().strip()
+        document.set_expected(expected)
         
         # Add completed field if it exists (editing mode)
         if hasattr(self, 'completed_var'):
-            document["completed"] = self.completed_var.get()
-            
             # If marked as completed and no actual date, set to today
-            if document["completed"] and not self.document.get("actualDate"):
-                document["actualDate"] = datetime.date.today().isoformat()
-            else:
-                document["actualDate"] = self.document.get("actualDate", "")
+            document.mark_completed(self.completed_var.get())
         else:
             # New document is not completed by default
-            document["completed"] = False
-            document["actualDate"] = ""
-        
-        # Previous year date remains unchanged if editing
-        document["previousYearDate"] = self.document.get("previousYearDate", "")
+            document.completed = False
+            document.set_actual("")
         
         # Call the callback with the document data
         if self.callback:
@@ -241,12 +231,8 @@ class DocumentEditor:
         
         self.dialog.geometry(f"+{x}+{y}")
     
-    def format_date(self, date_string):
-        """Format date for display"""
-        if not date_string:
-            return ""
-        try:
-            date = datetime.datetime.strptime(date_string, "%Y-%m-%d").date()
-            return date.strftime("%b %d, %Y")
-        except ValueError:
-            return date_string
\ No newline at end of file
+    def format_date(self, document):
+        """Format the previous year date for display"""
+        if document.previous_year_date is not None:
+            return display_date(document.previous_year_date)
+        return document.previous
\ No newline at end of file
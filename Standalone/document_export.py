@@ -0,0 +1,74 @@
+"""Writing documents out as NDJSON, CSV or a JSON object, a chunk at a time
+
+The functions here take an iterable of (year, documents) pairs, such as
+data_manager.iter_years(), and yield text chunks, so an export never holds
+more than one year of documents plus one chunk of output.
+"""
+import csv
+import io
+import json
+
+EXPORT_FORMATS = ("ndjson", "csv")
+MIME_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv", "json": "application/json"}
+COLUMNS = ("year", "id", "name", "website", "expectedDate", "actualDate", "previousYearDate", "completed")
+
+# Rows written per yielded chunk
+CHUNK_ROWS = 500
+
+
+def _ndjson_chunks(years):
+    lines = []
+    for year, documents in years:
+        for doc in documents:
+            lines.append(json.dumps(dict(doc, year=year), separators=(',', ':')))
+            if len(lines) >= CHUNK_ROWS:
+                yield "\n".join(lines) + "\n"
+                lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def _csv_value(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return "" if value is None else value
+
+
+def _csv_chunks(years):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(COLUMNS)
+    rows = 0
+    for year, documents in years:
+        for doc in documents:
+            row = dict(doc, year=year)
+            writer.writerow([_csv_value(row.get(column)) for column in COLUMNS])
+            rows += 1
+            if rows % CHUNK_ROWS == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _json_object_chunks(years):
+    yield "{"
+    separator = ""
+    for year, documents in years:
+        yield f"{separator}{json.dumps(str(year))}:{json.dumps(documents)}"
+        separator = ","
+    yield "}"
+
+
+def export_chunks(years, fmt="ndjson"):
+    """Yield the documents of years in fmt ("ndjson", "csv" or "json") as text chunks
+
+    "json" is a single {year: [documents]} object, the shape of load_all_data().
+    """
+    if fmt == "ndjson":
+        return _ndjson_chunks(years)
+    if fmt == "csv":
+        return _csv_chunks(years)
+    if fmt == "json":
+        return _json_object_chunks(years)
+    raise ValueError(f"Unknown export format {fmt!r}, use one of {', '.join(EXPORT_FORMATS)}")
@@ -0,0 +1,157 @@
+import difflib
+import re
+
+# Links below this similarity are not made
+LINK_THRESHOLD = 0.6
+# Issuer words with no word in common must be at least this alike character by
+# character ("WellsFargo", "Wells Fargo") for two names of the same form to match
+ISSUER_THRESHOLD = 0.85
+# Blocking keys shared by more documents than this are too common to narrow anything
+MAX_BLOCK_SIZE = 100
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset({"a", "an", "and", "co", "company", "corp", "corporation", "for", "from",
+                        "inc", "llc", "ltd", "of", "the"})
+
+
+def name_tokens(name):
+    """Return the significant, normalized words of a document name
+
+    Form numbers are joined to a short suffix or prefix next to them, so
+    "W-2", "W2" and "w 2" are all "w2" and "1099-INT" is "1099int".
+    Company suffixes and filler words are dropped.
+    """
+    words = _WORD.findall((name or "").lower())
+    tokens = []
+    i = 0
+    while i < len(words):
+        word = words[i]
+        following = words[i + 1] if i + 1 < len(words) else None
+        after = words[i + 2] if i + 2 < len(words) else ""
+        # "HSA 5498-SA" joins the number to its suffix, not to "HSA"
+        suffixed = after.isalpha() and len(after) <= 3 and after not in _STOPWORDS
+        if following is not None and (
+                (word.isalpha() and len(word) <= 3 and following.isdigit() and not suffixed)
+                or (word.isdigit() and following.isalpha() and len(following) <= 3)):
+            tokens.append(word + following)
+            i += 2
+            continue
+        if word not in _STOPWORDS:
+            tokens.append(word)
+        i += 1
+    return tokens
+
+
+def _is_form(token):
+    return any(c.isdigit() for c in token)
+
+
+def _word_similarity(words, other_words):
+    shared = 2 * len(words & other_words) / (len(words) + len(other_words))
+    if shared >= 1.0:
+        return 1.0
+    text = difflib.SequenceMatcher(None, " ".join(sorted(words)), " ".join(sorted(other_words))).ratio()
+    return max(shared, text)
+
+
+def similarity(tokens, other_tokens):
+    """Return how alike two names are, from 0 to 1, given their name_tokens()
+
+    Names with different form numbers never match (a W-2 isn't a 1099).
+    The same form number counts for half, the other words (the issuer)
+    for the rest. Two names of the same form whose issuers share no word
+    and are not near-identical spellings of each other score 0, so two
+    1099-INTs from different banks stay apart. Words are compared by the
+    share they have in common or, if closer, character by character.
+    """
+    forms = {token for token in tokens if _is_form(token)}
+    other_forms = {token for token in other_tokens if _is_form(token)}
+    words = set(tokens) - forms
+    other_words = set(other_tokens) - other_forms
+    if forms and other_forms:
+        if forms.isdisjoint(other_forms):
+            return 0.0
+        if not words or not other_words:
+            # Just "W-2" against "W-2 Acme": likely, but weaker than a full match
+            return 0.8 if words == other_words or not (words and other_words) else 0.5
+        if words.isdisjoint(other_words) and _word_similarity(words, other_words) < ISSUER_THRESHOLD:
+            return 0.0
+        return 0.5 + 0.5 * _word_similarity(words, other_words)
+    words, other_words = set(tokens), set(other_tokens)
+    if not words or not other_words:
+        return 0.0
+    return _word_similarity(words, other_words)
+
+
+class DocumentLinker:
+    """Finds the document a renamed document corresponds to among known ones
+
+    Documents are filed under blocking keys (their form numbers and other
+    significant words), so a lookup only scores the few documents that
+    share a key with it instead of every known document. Keys shared by
+    more than MAX_BLOCK_SIZE documents are skipped; a document with only
+    such keys just finds names with the same words.
+    """
+
+    def __init__(self, documents=()):
+        self._documents = []
+        self._tokens = []
+        self._blocks = {}
+        # sorted tokens -> positions of the documents with exactly those words
+        self._names = {}
+        for doc in documents:
+            self.add(doc)
+
+    def add(self, doc):
+        """Make a document available for linking"""
+        position = len(self._documents)
+        tokens = name_tokens(doc.get("name"))
+        self._documents.append(doc)
+        self._tokens.append(tokens)
+        self._names.setdefault(tuple(sorted(set(tokens))), []).append(position)
+        for key in self._keys(tokens):
+            self._blocks.setdefault(key, []).append(position)
+
+    @staticmethod
+    def _keys(tokens):
+        return {token for token in tokens if len(token) >= 3 or _is_form(token)}
+
+    def candidates(self, doc, threshold=LINK_THRESHOLD):
+        """Return [(score, known document)] for the documents doc may be, best first"""
+        tokens = name_tokens(doc.get("name"))
+        positions = set(self._names.get(tuple(sorted(set(tokens))), ()))
+        for key in self._keys(tokens):
+            block = self._blocks.get(key, ())
+            if len(block) <= MAX_BLOCK_SIZE:
+                positions.update(block)
+        scored = []
+        for position in positions:
+            score = similarity(tokens, self._tokens[position])
+            if score >= threshold:
+                scored.append((score, self._documents[position]))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored
+
+    def find(self, doc, threshold=LINK_THRESHOLD):
+        """Return (score, known document) for the best match of doc, or None"""
+        candidates = self.candidates(doc, threshold)
+        return candidates[0] if candidates else None
+
+    def link(self, documents, threshold=LINK_THRESHOLD):
+        """Pair each of documents with at most one known document and vice versa
+
+        Returns {document id: (score, known document)}, taking the most
+        similar pairs first.
+        """
+        pairs = []
+        for doc in documents:
+            for score, known in self.candidates(doc, threshold):
+                pairs.append((score, doc.get("id"), known))
+        pairs.sort(key=lambda pair: pair[0], reverse=True)
+        links = {}
+        taken = set()
+        for score, doc_id, known in pairs:
+            if doc_id not in links and known.get("id") not in taken:
+                links[doc_id] = (score, known)
+                taken.add(known.get("id"))
+        return links
@@ -0,0 +1,224 @@
+import datetime
+import functools
+import locale
+import uuid
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Stored key, ISO string attribute and parsed date attribute for each date
+DATE_FIELDS = (
+    ("expectedDate", "expected", "expected_date"),
+    ("actualDate", "actual", "actual_date"),
+    ("previousYearDate", "previous", "previous_year_date"),
+)
+
+# Documents due within this many days count as upcoming
+UPCOMING_DAYS = 14
+DISPLAY_FORMAT = "%b %d, %Y"
+
+KNOWN_KEYS = frozenset({"id", "name", "website", "completed", "Completed"}
+                       | {stored for stored, _, _ in DATE_FIELDS})
+
+
+def new_document_id():
+    """Return a new unique document id"""
+    return uuid.uuid4().hex
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_iso(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD string, returning None if empty or invalid
+
+    Results are cached, the same few dates repeat across most documents.
+    """
+    if not value or not isinstance(value, str):
+        return None
+    return _parse_iso(value)
+
+
+@functools.lru_cache(maxsize=4096)
+def _display_date(date, locale_name):
+    return date.strftime(DISPLAY_FORMAT)
+
+
+def display_date(date, locale_name=None):
+    """Return a date as shown to the user, e.g. "Jan 31, 2024"
+
+    Strings are memoized per (date, locale); locale_name defaults to the
+    current LC_TIME setting, which decides the month names.
+    """
+    if locale_name is None:
+        locale_name = locale.setlocale(locale.LC_TIME)
+    return _display_date(date, locale_name)
+
+
+def due_flags(documents, today=None, upcoming_days=UPCOMING_DAYS):
+    """Return (overdue, upcoming) lists of booleans for a year of Documents
+
+    A needed document is overdue once its expected date has passed, and
+    upcoming if it is due today or within upcoming_days. The whole list is
+    compared in one pass over date ordinals, vectorized when NumPy is
+    installed.
+    """
+    today = (today or datetime.date.today()).toordinal()
+    # Completed and undated documents get an ordinal that is never flagged
+    never = 0
+    ordinals = [doc.expected_ordinal if not doc.completed and doc.expected_ordinal is not None else never
+                for doc in documents]
+    if numpy is not None:
+        due = numpy.array(ordinals, dtype=numpy.int64)
+        dated = due != never
+        overdue = dated & (due < today)
+        upcoming = dated & (due >= today) & (due <= today + upcoming_days)
+        return overdue.tolist(), upcoming.tolist()
+    overdue = [never != ordinal < today for ordinal in ordinals]
+    upcoming = [today <= ordinal <= today + upcoming_days for ordinal in ordinals]
+    return overdue, upcoming
+
+
+def normalize_document(doc):
+    """Return doc with the completed flag under its canonical "completed" key
+
+    Older Standalone versions saved it as "Completed". If a document has
+    both keys, "Completed" wins: those versions added documents with
+    "completed": False and their toggle then wrote "Completed" next to it,
+    so "completed" is the stale one. Returns the same dict when nothing
+    needs to change.
+    """
+    if "Completed" not in doc:
+        return doc
+    doc = dict(doc)
+    doc["completed"] = doc.pop("Completed")
+    return doc
+
+
+def check_document_fields(fields, partial=False):
+    """Raise ValueError unless the known fields of a document have the right types
+
+    The name must be a non-empty string, the website a string, each date a
+    YYYY-MM-DD string or "" and completed true or false. With partial=True
+    (a dict of changes) fields that are missing aren't checked, otherwise
+    the name is required. Keys this module doesn't know are left alone.
+    """
+    name = fields.get("name")
+    if ("name" in fields or not partial) and not (isinstance(name, str) and name.strip()):
+        raise ValueError("A document needs a name")
+    if not isinstance(fields.get("website", ""), str):
+        raise ValueError("website must be a string")
+    for stored, _, _ in DATE_FIELDS:
+        value = fields.get(stored, "")
+        if not isinstance(value, str):
+            raise ValueError(f"{stored} must be a date (YYYY-MM-DD) or empty")
+        # fromisoformat() also takes forms like 20240131, stored dates never use them
+        date = parse_date(value)
+        if value and (date is None or date.isoformat() != value):
+            raise ValueError(f"{stored} must be a date (YYYY-MM-DD) or empty")
+    for key in ("completed", "Completed"):
+        if not isinstance(fields.get(key, False), bool):
+            raise ValueError(f"{key} must be true or false")
+
+
+class Document:
+    """A tax document with parsed dates, used in place of the stored dict
+
+    The ISO date strings are kept as loaded (expected, actual, previous) next
+    to their parsed datetime.date values, so converting back to the stored
+    form never re-formats dates. Keys this class doesn't know about are kept
+    in extra and written back unchanged.
+    """
+
+    __slots__ = ("id", "name", "website", "completed",
+                 "expected", "actual", "previous",
+                 "expected_date", "actual_date", "previous_year_date",
+                 "expected_ordinal", "extra")
+
+    def __init__(self, name="", website="", expected="", actual="", previous="",
+                 completed=False, id=None, extra=None):
+        self.id = id or new_document_id()
+        self.name = name
+        self.website = website
+        self.completed = bool(completed)
+        self.extra = extra
+        self.set_expected(expected)
+        self.set_actual(actual)
+        self.set_previous(previous)
+
+    def set_expected(self, value):
+        """Set the expected date from an ISO string or datetime.date"""
+        self.expected, self.expected_date = self._date_pair(value)
+        # Kept as an ordinal too, for comparing whole years at once in due_flags()
+        self.expected_ordinal = self.expected_date.toordinal() if self.expected_date is not None else None
+
+    def set_actual(self, value):
+        """Set the date the document was received"""
+        self.actual, self.actual_date = self._date_pair(value)
+
+    def set_previous(self, value):
+        """Set last year's date for this document"""
+        self.previous, self.previous_year_date = self._date_pair(value)
+
+    @staticmethod
+    def _date_pair(value):
+        if isinstance(value, datetime.date):
+            return value.isoformat(), value
+        value = value or ""
+        return value, parse_date(value)
+
+    @classmethod
+    def from_dict(cls, doc):
+        """Build a Document from its stored dict form"""
+        doc = normalize_document(doc)
+        extra = {key: value for key, value in doc.items() if key not in KNOWN_KEYS} or None
+        return cls(
+            name=doc.get("name", ""),
+            website=doc.get("website", ""),
+            expected=doc.get("expectedDate", ""),
+            actual=doc.get("actualDate", ""),
+            previous=doc.get("previousYearDate", ""),
+            completed=doc.get("completed", False),
+            id=doc.get("id"),
+            extra=extra,
+        )
+
+    def to_dict(self):
+        """Return the stored dict form of this document"""
+        doc = {
+            "id": self.id,
+            "name": self.name,
+            "website": self.website,
+            "expectedDate": self.expected,
+            "actualDate": self.actual,
+            "previousYearDate": self.previous,
+            "completed": self.completed,
+        }
+        if self.extra:
+            doc.update(self.extra)
+        return doc
+
+    def copy(self):
+        """Return an independent copy with the same id"""
+        clone = Document.__new__(Document)
+        for slot in Document.__slots__:
+            setattr(clone, slot, getattr(self, slot))
+        if self.extra:
+            clone.extra = dict(self.extra)
+        return clone
+
+    def mark_completed(self, completed=True, today=None):
+        """Set the completed flag, recording today as the actual date if none is set"""
+        self.completed = completed
+        if completed and not self.actual:
+            self.set_actual(today or datetime.date.today())
+
+    def __repr__(self):
+        return f"Document(id={self.id!r}, name={self.name!r}, completed={self.completed!r})"
@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+
+if os.name == 'nt':
+    import msvcrt
+
+    def _lock_file(f):
+        f.seek(0)
+        while True:
+            try:
+                # LK_LOCK itself only retries for about ten seconds
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+
+    def _unlock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class FileLock:
+    """Advisory exclusive lock on a file, shared by every process that uses it
+
+    Threads of one process queue on an in-process lock first, and the lock
+    is reentrant for the thread holding it, so nested write paths only take
+    the file lock once. Time spent waiting is counted for get_stats().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+        self._stats_lock = threading.Lock()
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def acquire(self):
+        start = time.perf_counter()
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                self._file = open(self.path, 'a+b')
+                _lock_file(self._file)
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._thread_lock.release()
+                raise
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.acquisitions += 1
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+                # Anything over a millisecond means someone else held the lock
+                if waited > 0.001:
+                    self.contended += 1
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            try:
+                _unlock_file(self._file)
+            finally:
+                self._file.close()
+                self._file = None
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def get_stats(self):
+        """Return the acquisition count and lock wait times in milliseconds"""
+        with self._stats_lock:
+            return {"acquisitions": self.acquisitions,
+                    "contended": self.contended,
+                    "wait_ms_total": round(self.wait_seconds * 1000, 3),
+                    "wait_ms_max": round(self.max_wait_seconds * 1000, 3)}
@@ -1,28 +1,124 @@
 #!/usr/bin/env python3
 import tkinter as tk
 import argparse
+import json
 import sys
 import os
-from pathlib import Path
 
 # Import the GUI application
 from tax_tracker_gui import TaxDocumentTracker
+from data_manager import (reset_all_data, set_storage_backend, archive_year, unarchive_year,
+                          create_profile, set_active_profile, list_profiles,
+                          create_snapshot, list_snapshots, restore_snapshot, bulk_import_file,
+                          iter_years, apply_batch, VersionConflict,
+                          STORAGE_BACKENDS, STATUS_FILTERS)
+from bulk_import import FORMATS, describe_report
+from document_export import EXPORT_FORMATS, export_chunks
 
 def main():
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='Tax Document Tracker')
     parser.add_argument('-d', '--debug', action='store_true', help='Run in debug mode with additional logging')
     parser.add_argument('--reset', action='store_true', help='Reset all data (use with caution)')
+    parser.add_argument('--profile', metavar='NAME',
+                        help='Open the named client profile, creating it if needed')
+    parser.add_argument('--snapshot', action='store_true',
+                        help='Save a snapshot of the document data (unchanged years are shared with earlier snapshots)')
+    parser.add_argument('--list-snapshots', action='store_true', help='List the saved snapshots')
+    parser.add_argument('--restore-snapshot', metavar='ID', help='Restore the document data from a snapshot')
+    parser.add_argument('--storage', choices=STORAGE_BACKENDS, help='Switch storage backend, migrating existing data')
+    parser.add_argument('--archive', type=int, action='append', metavar='YEAR',
+                        help='Move a closed tax year into compressed read-only storage (repeatable)')
+    parser.add_argument('--unarchive', type=int, action='append', metavar='YEAR',
+                        help='Move an archived tax year back into regular storage (repeatable)')
+    subcommands = parser.add_subparsers(dest='command')
+    import_parser = subcommands.add_parser('import', help='Bulk import documents from a CSV or NDJSON file and exit')
+    import_parser.add_argument('year', type=int, help='Tax year to add the documents to')
+    import_parser.add_argument('file', help='CSV or NDJSON file with one document per row')
+    import_parser.add_argument('--format', choices=FORMATS, help='File format (default: from the file name)')
+    import_parser.add_argument('--strict', action='store_true', help='Import nothing if any row is invalid')
+    export_parser = subcommands.add_parser('export', help='Write documents out as NDJSON or CSV and exit')
+    export_parser.add_argument('--format', choices=EXPORT_FORMATS, default='ndjson', help='Output format (default: ndjson)')
+    export_parser.add_argument('--from', dest='first_year', type=int, metavar='YEAR', help='First tax year to export')
+    export_parser.add_argument('--to', dest='last_year', type=int, metavar='YEAR', help='Last tax year to export')
+    export_parser.add_argument('--status', choices=STATUS_FILTERS, default='all', help='Which documents to export')
+    export_parser.add_argument('-o', '--output', metavar='FILE', help='File to write (default: standard output)')
+    batch_parser = subcommands.add_parser('batch', help='Apply a JSON list of document operations, all or none, and exit')
+    batch_parser.add_argument('file', help='JSON file with the operations, or - for standard input')
     args = parser.parse_args()
     
+    # Select the client profile before anything else touches the data
+    if args.profile:
+        if args.profile not in list_profiles():
+            create_profile(args.profile)
+            print(f"Created profile {args.profile}")
+        set_active_profile(args.profile)
+    
+    # Bulk import and export run on their own, without starting the app
+    if args.command == 'import':
+        try:
+            report = bulk_import_file(args.year, args.file, args.format, args.strict)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        print(describe_report(report))
+        return
+    if args.command == 'export':
+        chunks = export_chunks(iter_years(args.first_year, args.last_year, args.status), args.format)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8', newline='') as f:
+                f.writelines(chunks)
+        else:
+            sys.stdout.writelines(chunks)
+        return
+    if args.command == 'batch':
+        try:
+            if args.file == '-':
+                body = json.load(sys.stdin)
+            else:
+                with open(args.file, 'r', encoding='utf-8') as f:
+                    body = json.load(f)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        if isinstance(body, list):
+            body = {"operations": body}
+        if not isinstance(body, dict):
+            parser.error("the batch file must hold a list of operations")
+        try:
+            result = apply_batch(body.get("operations", []), body.get("expected_versions"))
+        except (ValueError, VersionConflict) as e:
+            sys.exit(f"Nothing was changed: {e}")
+        print(json.dumps(result, indent=2))
+        return
+    
+    # Handle snapshots
+    if args.snapshot:
+        print(f"Saved snapshot {create_snapshot()['id']}")
+    if args.list_snapshots:
+        for manifest in list_snapshots():
+            print(f"{manifest['id']}  {manifest['created']}  {len(manifest['years'])} tax years"
+                  + (f"  ({manifest['label']})" if manifest['label'] else ""))
+    if args.restore_snapshot:
+        try:
+            print(restore_snapshot(args.restore_snapshot))
+        except KeyError:
+            parser.error(f"no snapshot {args.restore_snapshot}")
+    
     # Handle reset functionality
     if args.reset:
-        data_file = Path.home() / "Documents" / "Tax Doc Helper" / 'tax_documents_data.json'
-        if data_file.exists():
-            import os
-            os.remove(data_file)
+        print(f"Saved snapshot {create_snapshot(label='Before reset')['id']}")
+        for data_file in reset_all_data():
             print(f"Data file {data_file} has been reset.")
     
+    # Handle storage migration
+    if args.storage:
+        print(set_storage_backend(args.storage))
+    
+    # Handle archiving
+    for year in args.archive or []:
+        print(archive_year(year))
+    for year in args.unarchive or []:
+        print(unarchive_year(year))
+    
     # Configure debug mode
     if args.debug:
         import logging
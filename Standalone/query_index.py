@@ -0,0 +1,114 @@
+import base64
+import binascii
+import bisect
+import json
+import threading
+
+from document_model import normalize_document
+
+SORT_KEYS = ("expectedDate", "name")
+# Documents without a date sort after every date
+_NO_DATE = "~"
+
+
+def sort_value(doc, sort):
+    """Return the value documents are ordered by for a sort key"""
+    if sort == "name":
+        return (doc.get("name") or "").casefold()
+    return doc.get(sort) or _NO_DATE
+
+
+def encode_cursor(sort, value, year, doc_id):
+    """Return the opaque cursor of the page that starts after a document"""
+    text = json.dumps([sort, value, int(year), doc_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, sort):
+    """Return (value, year, id) from a cursor of encode_cursor(), raises ValueError if invalid"""
+    try:
+        text = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        cursor_sort, value, year, doc_id = json.loads(text)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise ValueError("Invalid cursor") from None
+    if cursor_sort != sort or not isinstance(value, str) or not isinstance(year, int):
+        raise ValueError("The cursor belongs to a query with another sort order")
+    return value, year, doc_id
+
+
+class YearIndex:
+    """The documents of one tax year in order of each sort key, by status
+
+    Each (sort key, completed) pair keeps a sorted list of (value, id), so a
+    page of needed or completed documents, optionally due before a date,
+    starts with a binary search and reads only the documents it returns.
+    data_manager keeps it current as documents change.
+    """
+
+    def __init__(self, documents=()):
+        self._lock = threading.Lock()
+        self._documents = {}
+        self._orders = {(sort, completed): [] for sort in SORT_KEYS for completed in (False, True)}
+        for doc in documents:
+            self._add(doc)
+
+    def _add(self, doc):
+        doc = normalize_document(doc)
+        doc_id = doc.get("id")
+        self._documents[doc_id] = doc
+        for sort in SORT_KEYS:
+            bisect.insort(self._orders[(sort, bool(doc.get("completed")))], (sort_value(doc, sort), doc_id))
+
+    def _remove(self, doc_id):
+        doc = self._documents.pop(doc_id, None)
+        if doc is None:
+            return
+        for sort in SORT_KEYS:
+            order = self._orders[(sort, bool(doc.get("completed")))]
+            entry = (sort_value(doc, sort), doc_id)
+            position = bisect.bisect_left(order, entry)
+            if position < len(order) and order[position] == entry:
+                del order[position]
+
+    def apply(self, old, new):
+        """Index a change to one document: added (old None), removed (new None) or replaced"""
+        with self._lock:
+            if old is not None:
+                self._remove(old.get("id"))
+            if new is not None:
+                self._add(new)
+
+    def page(self, year, sort, completed, count, after=None, due_before=None):
+        """Return up to count [(value, year, id, document)] in order, for a merge across years
+
+        after is the (value, year, id) of the last document of the previous
+        page; due_before (YYYY-MM-DD) keeps only documents expected before it.
+        """
+        year = int(year)
+        with self._lock:
+            order = self._orders[(sort, completed)]
+            if after is None:
+                start = 0
+            elif year > after[1]:
+                start = bisect.bisect_left(order, (after[0],))
+            elif year < after[1]:
+                # Past every entry with the cursor's value
+                start = bisect.bisect_left(order, (after[0] + "\0",))
+            else:
+                start = bisect.bisect_right(order, (after[0], after[2]))
+            end = len(order)
+            if due_before is not None and sort == "expectedDate":
+                end = bisect.bisect_left(order, (due_before,))
+            results = []
+            for position in range(start, end):
+                value, doc_id = order[position]
+                doc = self._documents[doc_id]
+                if due_before is not None and not ("" < (doc.get("expectedDate") or "") < due_before):
+                    continue
+                results.append((value, year, doc_id, doc))
+                if len(results) >= count:
+                    break
+            return results
+
+    def __len__(self):
+        return len(self._documents)
@@ -0,0 +1,227 @@
+import bisect
+import heapq
+import itertools
+import re
+import threading
+from collections import Counter
+from operator import itemgetter
+
+from document_model import normalize_document
+
+# Query tokens shorter than this only match whole tokens
+MIN_PREFIX_LENGTH = 2
+# Query tokens shorter than this are never matched fuzzily
+MIN_FUZZY_LENGTH = 4
+# Words this long may be two typos away from a token, shorter ones one
+LONG_WORD_LENGTH = 8
+
+_EXACT, _PREFIX, _FUZZY = 3, 2, 1
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Return the search tokens of a name or website
+
+    Words are lowercased and split on anything that isn't a letter or
+    digit. A number next to a word is also kept joined to it, so "1099-INT"
+    is found by "1099int" as well as by "1099" and "int".
+    """
+    text = (text or "").lower()
+    text = re.sub(r"^[a-z]+://", "", text)
+    text = re.sub(r"^www\.", "", text)
+    words = _WORD.findall(text)
+    tokens = set(words)
+    for first, second in zip(words, words[1:]):
+        if first.isdigit() != second.isdigit():
+            tokens.add(first + second)
+    return tokens
+
+
+def _edit_distance(a, b, limit):
+    """Return the number of single-letter edits or swaps between a and b, capped at limit + 1"""
+    previous_row = None
+    row = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous_row, row = previous_row, row, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            row[j] = min(previous_row[j] + 1, row[j - 1] + 1,
+                         previous_row[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                row[j] = min(row[j], before[j - 2] + 1)
+        if min(row) > limit:
+            return limit + 1
+    return row[-1]
+
+
+def _trigrams(token):
+    padded = f"^{token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """Inverted index over document names and websites for all tax years
+
+    Each token maps to the documents containing it. The vocabulary is kept
+    sorted for prefix matches, and each token's trigrams map back to the
+    token for fuzzy matches, so a query only touches the postings of the
+    tokens it matches. The index records the data version it has for each
+    year; data_manager keeps it current on writes and reindexes a year
+    whose version has moved on.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # (year, id) -> (name, website, completed, tokens)
+        self._documents = {}
+        # year -> ids indexed for it
+        self._year_ids = {}
+        self._postings = {}
+        self._vocabulary = []
+        self._trigram_tokens = {}
+        # year -> data version the index holds for it
+        self.versions = {}
+        self.searches = 0
+
+    def _add(self, year, doc):
+        doc = normalize_document(doc)
+        key = (str(year), doc.get("id"))
+        tokens = tokenize(doc.get("name")) | tokenize(doc.get("website"))
+        self._documents[key] = (doc.get("name", ""), doc.get("website", ""),
+                                bool(doc.get("completed")), tokens)
+        self._year_ids.setdefault(key[0], set()).add(key[1])
+        for token in tokens:
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = set()
+                bisect.insort(self._vocabulary, token)
+                for trigram in _trigrams(token):
+                    self._trigram_tokens.setdefault(trigram, set()).add(token)
+            posting.add(key)
+
+    def _remove(self, year, doc_id):
+        key = (str(year), doc_id)
+        entry = self._documents.pop(key, None)
+        if entry is None:
+            return
+        self._year_ids[key[0]].discard(doc_id)
+        for token in entry[3]:
+            posting = self._postings[token]
+            posting.discard(key)
+            if not posting:
+                del self._postings[token]
+                del self._vocabulary[bisect.bisect_left(self._vocabulary, token)]
+                for trigram in _trigrams(token):
+                    tokens = self._trigram_tokens[trigram]
+                    tokens.discard(token)
+                    if not tokens:
+                        del self._trigram_tokens[trigram]
+
+    def apply(self, year, old, new):
+        """Index a change to one document: added (old None), removed (new None) or replaced"""
+        with self._lock:
+            if old is not None:
+                self._remove(year, old.get("id"))
+            if new is not None:
+                self._add(year, new)
+
+    def replace_year(self, year, documents):
+        """Index a year's documents in place of what was indexed for it"""
+        with self._lock:
+            self.remove_year(year)
+            for doc in documents:
+                self._add(year, doc)
+
+    def remove_year(self, year):
+        with self._lock:
+            for doc_id in list(self._year_ids.get(str(year), ())):
+                self._remove(year, doc_id)
+            self._year_ids.pop(str(year), None)
+            self.versions.pop(str(year), None)
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            self._year_ids.clear()
+            self._postings.clear()
+            self._vocabulary.clear()
+            self._trigram_tokens.clear()
+            self.versions.clear()
+
+    def _matching_tokens(self, term):
+        """Return {token: score} for the tokens of the vocabulary that match a query word
+
+        Misspellings are only looked for when nothing matches exactly or as
+        a prefix, and never for words with digits (1098 isn't a typo of 1099).
+        """
+        matched = {term: _EXACT} if term in self._postings else {}
+        if len(term) >= MIN_PREFIX_LENGTH:
+            position = bisect.bisect_left(self._vocabulary, term)
+            while position < len(self._vocabulary) and self._vocabulary[position].startswith(term):
+                matched.setdefault(self._vocabulary[position], _PREFIX)
+                position += 1
+        if not matched and len(term) >= MIN_FUZZY_LENGTH and term.isalpha():
+            distance = 1 if len(term) < LONG_WORD_LENGTH else 2
+            term_trigrams = _trigrams(term)
+            # One edit changes at most four trigrams (a swap of two letters)
+            needed = max(1, len(term_trigrams) - 4 * distance)
+            shared = Counter()
+            for trigram in term_trigrams:
+                shared.update(self._trigram_tokens.get(trigram, ()))
+            for token, count in shared.items():
+                if (count >= needed and abs(len(token) - len(term)) <= distance
+                        and _edit_distance(term, token, distance) <= distance):
+                    matched[token] = _FUZZY
+        return matched
+
+    def _word_levels(self, word):
+        """Return [(score, documents)] for a query word, best score first, each document once"""
+        by_score = {}
+        for token, score in self._matching_tokens(word).items():
+            by_score.setdefault(score, set()).update(self._postings[token])
+        levels = []
+        seen = set()
+        for score in sorted(by_score, reverse=True):
+            keys = by_score[score] - seen
+            seen |= keys
+            levels.append((score, keys))
+        return levels
+
+    def search(self, query, limit=50):
+        """Return up to limit documents matching every word of query, best first
+
+        A word matches a token exactly, as a prefix, or with a typo or two
+        (one for words under LONG_WORD_LENGTH letters); ties go to the newest
+        year. Each result is a dict with year, id, name, website, completed
+        and score.
+        """
+        words = set(_WORD.findall((query or "").lower()))
+        if not words:
+            return []
+        with self._lock:
+            self.searches += 1
+            levels = [self._word_levels(word) for word in words]
+            if not all(levels):
+                return []
+            # Every combination of per-word match levels is a set intersection,
+            # so documents are grouped by total score without scoring each one
+            tiers = {}
+            for combination in itertools.product(*levels):
+                sets = sorted((keys for _, keys in combination), key=len)
+                keys = sets[0].intersection(*sets[1:])
+                if keys:
+                    tiers.setdefault(sum(score for score, _ in combination), []).append(keys)
+            results = []
+            for score in sorted(tiers, reverse=True):
+                tier = set().union(*tiers[score])
+                for year, doc_id in heapq.nlargest(limit - len(results), tier, key=itemgetter(0)):
+                    name, website, completed, _ = self._documents[(year, doc_id)]
+                    results.append({"year": year, "id": doc_id, "name": name, "website": website,
+                                    "completed": completed, "score": score})
+                if len(results) >= limit:
+                    break
+            return results
+
+    def stats(self):
+        with self._lock:
+            return {"documents": len(self._documents), "tokens": len(self._postings),
+                    "years": len(self.versions), "searches": self.searches}
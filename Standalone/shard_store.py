@@ -0,0 +1,202 @@
+import json
+import os
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+
+from json_store import JsonStore, file_signature, write_json_atomic
+from store_base import DocumentStore
+
+MANIFEST_VERSION = 1
+
+
+class LazyYearData(Mapping):
+    """Read-only year -> documents mapping that opens each shard on first access"""
+
+    def __init__(self, store, years):
+        self._store = store
+        self._years = list(years)
+        self._loaded = {}
+
+    def __getitem__(self, year):
+        year = str(year)
+        if year not in self._years:
+            raise KeyError(year)
+        if year not in self._loaded:
+            self._loaded[year] = self._store.load_year(year)
+        return self._loaded[year]
+
+    def __iter__(self):
+        return iter(self._years)
+
+    def __len__(self):
+        return len(self._years)
+
+
+class ShardStore(DocumentStore):
+    """Stores each tax year in its own JSON file plus a manifest of years
+
+    Reading a year opens only that year's shard, and a write rewrites only
+    the shards it changes. Writes are not locked here: data_manager holds
+    the profile's lock around every write, so writes to different years
+    still run one at a time (see data_manager._writing). If no
+    manifest exists yet, the monolithic data file (and its journal) is split
+    into shards the first time the store is used; the old file is kept.
+    """
+
+    def __init__(self, directory, legacy_path=None, legacy_journal_path=None):
+        super().__init__()
+        self.directory = Path(directory)
+        self.manifest_path = self.directory / 'manifest.json'
+        self.legacy_path = legacy_path
+        self.legacy_journal_path = legacy_journal_path
+        self._manifest_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._shard_cache = {}
+        self._manifest_cache = (None, [])
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._migrated = False
+
+    def shard_path(self, year):
+        return self.directory / f"{int(year)}.json"
+
+    def _ensure_layout(self):
+        """Create the shard directory, migrating the monolithic file if needed"""
+        if self._migrated:
+            return
+        with self._manifest_lock:
+            if not self._migrated:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                if not self.manifest_path.exists():
+                    self._migrate_legacy()
+                self._migrated = True
+
+    def _migrate_legacy(self):
+        data = {}
+        if self.legacy_path and Path(self.legacy_path).exists():
+            legacy = JsonStore(self.legacy_path, self.legacy_journal_path)
+            data = legacy.load_all()
+            print(f"Splitting {self.legacy_path} into {len(data)} year files in {self.directory}")
+        for year, documents in data.items():
+            write_json_atomic(self.shard_path(year), documents)
+        self._write_manifest(list(data))
+
+    def _write_manifest(self, years):
+        years = sorted(set(years), key=int)
+        write_json_atomic(self.manifest_path, {"version": MANIFEST_VERSION, "years": years})
+        self._manifest_cache = (file_signature(self.manifest_path), years)
+
+    def list_years(self):
+        self._ensure_layout()
+        signature = file_signature(self.manifest_path)
+        cached_signature, years = self._manifest_cache
+        if signature != cached_signature:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                years = json.load(f).get("years", [])
+            self._manifest_cache = (signature, years)
+        return list(years)
+
+    def _add_to_manifest(self, year):
+        if str(year) in self.list_years():
+            return
+        with self._manifest_lock:
+            years = self.list_years()
+            if str(year) not in years:
+                self._write_manifest(years + [str(year)])
+
+    def _read_shard(self, year):
+        """Return a shard's documents, shared with the cache (do not mutate)"""
+        path = self.shard_path(year)
+        signature = file_signature(path)
+        with self._cache_lock:
+            cached = self._shard_cache.get(str(year))
+            if signature is not None and cached and cached[0] == signature:
+                self.cache_hits += 1
+                return cached[1]
+            self.cache_misses += 1
+        if signature is None:
+            return []
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                documents = json.load(f)
+        except json.JSONDecodeError:
+            print(f"Error decoding {path}, returning empty data")
+            return []
+        if file_signature(path) == signature:
+            with self._cache_lock:
+                self._shard_cache[str(year)] = (signature, documents)
+        return documents
+
+    def _write_shard(self, year, documents):
+        path = self.shard_path(year)
+        write_json_atomic(path, documents)
+        with self._cache_lock:
+            self._shard_cache[str(year)] = (file_signature(path), documents)
+
+    def load_all(self):
+        """Return a mapping of every year whose shards load on first access"""
+        return LazyYearData(self, self.list_years())
+
+    def load_year(self, year):
+        self._ensure_layout()
+        return [dict(doc) for doc in self._read_shard(year)]
+
+    def save_year(self, year, documents):
+        self._ensure_layout()
+        self._write_shard(year, [dict(doc) for doc in documents])
+        self._add_to_manifest(year)
+
+    def delete_year(self, year):
+        self._ensure_layout()
+        with self._manifest_lock:
+            years = self.list_years()
+            if str(year) in years:
+                years.remove(str(year))
+                self._write_manifest(years)
+        if self.shard_path(year).exists():
+            os.remove(self.shard_path(year))
+        with self._cache_lock:
+            self._shard_cache.pop(str(year), None)
+
+    def _modify_shard(self, year, change):
+        """Apply change(documents, positions) to a copy of a shard and write it
+
+        positions is the id index of the shard as it was before the change.
+        The caller holds the data lock, so nothing writes the shard meanwhile.
+        """
+        self._ensure_layout()
+        current = self._read_shard(year)
+        documents = list(current)
+        change(documents, self._id_positions(year, current))
+        self._write_shard(year, documents)
+        self._add_to_manifest(year)
+
+    def get_document(self, year, doc_id):
+        self._ensure_layout()
+        documents = self._read_shard(year)
+        position = self._id_positions(year, documents).get(doc_id)
+        return dict(documents[position]) if position is not None else None
+
+    def insert_document(self, year, document):
+        def change(documents, positions):
+            documents.append(dict(document))
+        self._modify_shard(year, change)
+
+    def update_document(self, year, doc_id, document):
+        def change(documents, positions):
+            if doc_id not in positions:
+                raise KeyError(doc_id)
+            documents[positions[doc_id]] = dict(document)
+        self._modify_shard(year, change)
+
+    def delete_document(self, year, doc_id):
+        def change(documents, positions):
+            if doc_id not in positions:
+                raise KeyError(doc_id)
+            del documents[positions[doc_id]]
+        self._modify_shard(year, change)
+
+    def cache_stats(self):
+        with self._cache_lock:
+            return {"hits": self.cache_hits, "misses": self.cache_misses}
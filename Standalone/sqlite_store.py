@@ -0,0 +1,226 @@
+import difflib
+import json
+import sqlite3
+import threading
+
+from store_base import DocumentStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS years (
+    year INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS documents (
+    row_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    year INTEGER NOT NULL REFERENCES years (year) ON DELETE CASCADE,
+    position REAL NOT NULL,
+    data TEXT NOT NULL,
+    doc_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_documents_year_position
+    ON documents (year, position);
+"""
+
+# Created after the doc_id column migration, older databases lack the column
+ID_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_documents_year_doc_id
+    ON documents (year, doc_id);
+"""
+
+
+def _encode(document):
+    """Serialize a document for the data column"""
+    return json.dumps(document, separators=(',', ':'))
+
+
+def _spread(lower, upper, count):
+    """Return count positions strictly between lower and upper (either may be None)
+
+    Returns None when the gap is too small to fit them, in which case the
+    caller renumbers the whole year.
+    """
+    if lower is None and upper is None:
+        return [float(i) for i in range(count)]
+    if upper is None:
+        return [lower + i + 1 for i in range(count)]
+    if lower is None:
+        return [upper - count + i for i in range(count)]
+    step = (upper - lower) / (count + 1)
+    positions = [lower + step * (i + 1) for i in range(count)]
+    if any(p <= lower or p >= upper for p in positions) or len(set(positions)) != count:
+        return None
+    return positions
+
+
+class SQLiteStore(DocumentStore):
+    """Stores documents as one row each in a SQLite database
+
+    Rows are ordered within a year by a sparse position column, so inserting,
+    updating or deleting a single document only touches that document's row.
+    Each row also carries the document's id in an indexed column, which is
+    how single documents are looked up.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        self._migrate_doc_ids()
+        self._conn.executescript(ID_INDEX)
+
+    def _migrate_doc_ids(self):
+        """Add the doc_id column to databases created before it existed"""
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(documents)")]
+        if "doc_id" in columns:
+            return
+        with self._conn as conn:
+            conn.execute("ALTER TABLE documents ADD COLUMN doc_id TEXT")
+            rows = conn.execute("SELECT row_id, data FROM documents").fetchall()
+            conn.executemany(
+                "UPDATE documents SET doc_id = ? WHERE row_id = ?",
+                [(json.loads(data).get("id"), row_id) for row_id, data in rows]
+            )
+
+    def list_years(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT year FROM years ORDER BY year").fetchall()
+        return [str(row[0]) for row in rows]
+
+    def load_all(self):
+        data = {year: [] for year in self.list_years()}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT year, data FROM documents ORDER BY year, position"
+            ).fetchall()
+        for year, doc in rows:
+            data.setdefault(str(year), []).append(json.loads(doc))
+        return data
+
+    def load_year(self, year):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM documents WHERE year = ? ORDER BY position",
+                (int(year),)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def save_year(self, year, documents):
+        """Replace a year's documents, writing only the rows that changed"""
+        self.save_years({year: documents})
+
+    def save_years(self, data):
+        """Replace several years' documents in one transaction"""
+        with self._lock, self._conn as conn:
+            for year, documents in data.items():
+                self._save_year_rows(conn, int(year), documents)
+
+    def _save_year_rows(self, conn, year, documents):
+        encoded = [_encode(doc) for doc in documents]
+        ids = [doc.get("id") for doc in documents]
+        conn.execute("INSERT OR IGNORE INTO years (year) VALUES (?)", (year,))
+        rows = conn.execute(
+            "SELECT row_id, position, data FROM documents WHERE year = ? ORDER BY position",
+            (year,)
+        ).fetchall()
+        if not self._apply_diff(conn, year, rows, encoded, ids):
+            self._rewrite_year(conn, year, encoded, ids)
+
+    def _apply_diff(self, conn, year, rows, encoded, ids):
+        """Turn the difference between stored rows and encoded into row writes
+
+        Returns False (without writing) if new positions cannot be allocated.
+        """
+        matcher = difflib.SequenceMatcher(None, [row[2] for row in rows], encoded, autojunk=False)
+        updates, deletes, inserts = [], [], []
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                continue
+            old_rows = rows[i1:i2]
+            new_docs = list(zip(encoded[j1:j2], ids[j1:j2]))
+            common = min(len(old_rows), len(new_docs))
+            for row, (doc, doc_id) in zip(old_rows[:common], new_docs[:common]):
+                updates.append((doc, doc_id, row[0]))
+            deletes.extend((row[0],) for row in old_rows[common:])
+            extra = new_docs[common:]
+            if extra:
+                last_kept = i1 + common - 1
+                lower = rows[last_kept][1] if last_kept >= 0 else None
+                upper = rows[i2][1] if i2 < len(rows) else None
+                positions = _spread(lower, upper, len(extra))
+                if positions is None:
+                    return False
+                inserts.extend((year, pos, doc, doc_id)
+                               for pos, (doc, doc_id) in zip(positions, extra))
+
+        conn.executemany("UPDATE documents SET data = ?, doc_id = ? WHERE row_id = ?", updates)
+        conn.executemany("DELETE FROM documents WHERE row_id = ?", deletes)
+        conn.executemany(
+            "INSERT INTO documents (year, position, data, doc_id) VALUES (?, ?, ?, ?)", inserts
+        )
+        return True
+
+    def _rewrite_year(self, conn, year, encoded, ids):
+        conn.execute("DELETE FROM documents WHERE year = ?", (year,))
+        conn.executemany(
+            "INSERT INTO documents (year, position, data, doc_id) VALUES (?, ?, ?, ?)",
+            [(year, float(i), doc, doc_id) for i, (doc, doc_id) in enumerate(zip(encoded, ids))]
+        )
+
+    def save_all(self, data):
+        with self._lock, self._conn as conn:
+            conn.execute("DELETE FROM documents")
+            conn.execute("DELETE FROM years")
+            for year, documents in data.items():
+                conn.execute("INSERT INTO years (year) VALUES (?)", (int(year),))
+                self._rewrite_year(conn, int(year), [_encode(doc) for doc in documents],
+                                   [doc.get("id") for doc in documents])
+
+    def delete_year(self, year):
+        with self._lock, self._conn as conn:
+            conn.execute("DELETE FROM years WHERE year = ?", (int(year),))
+
+    def _row_for(self, conn, year, doc_id):
+        row = conn.execute(
+            "SELECT row_id FROM documents WHERE year = ? AND doc_id = ?",
+            (int(year), doc_id)
+        ).fetchone()
+        if row is None:
+            raise KeyError(doc_id)
+        return row[0]
+
+    def get_document(self, year, doc_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM documents WHERE year = ? AND doc_id = ?",
+                (int(year), doc_id)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def insert_document(self, year, document):
+        year = int(year)
+        with self._lock, self._conn as conn:
+            conn.execute("INSERT OR IGNORE INTO years (year) VALUES (?)", (year,))
+            conn.execute(
+                "INSERT INTO documents (year, position, data, doc_id) "
+                "SELECT ?, COALESCE(MAX(position), -1) + 1, ?, ? FROM documents WHERE year = ?",
+                (year, _encode(document), document.get("id"), year)
+            )
+
+    def update_document(self, year, doc_id, document):
+        with self._lock, self._conn as conn:
+            row_id = self._row_for(conn, year, doc_id)
+            conn.execute("UPDATE documents SET data = ?, doc_id = ? WHERE row_id = ?",
+                         (_encode(document), document.get("id", doc_id), row_id))
+
+    def delete_document(self, year, doc_id):
+        with self._lock, self._conn as conn:
+            row_id = self._row_for(conn, year, doc_id)
+            conn.execute("DELETE FROM documents WHERE row_id = ?", (row_id,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
@@ -1,5 +1,6 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
+from tkinter import ttk, messagebox, filedialog, simpledialog
+import atexit
 import datetime
 import json
 import os
@@ -11,9 +12,14 @@ from tkcalendar import DateEntry  # You'll need to install this: pip install tkc
 # Import custom modules
 from data_manager import (
     load_all_data, save_all_data, 
-    get_documents_for_year, save_documents_for_year,
-    import_from_last_year, USER_DOCS
+    get_document_models_for_year,
+    import_from_last_year, get_data_version, list_archived_years, bulk_import_file, get_year_stats,
+    search_documents, get_previous_year_links, USER_DOCS,
+    list_profiles, create_profile, set_active_profile, get_active_profile, ArchivedYearError
 )
+from background_saver import BackgroundSaver
+from document_model import display_date, due_flags, parse_date
+from bulk_import import describe_report
 from document_editor import DocumentEditor
 from theme_manager import ThemeCustomizer, load_theme, apply_theme, save_theme
 from toggle_switch import ToggleSwitch
@@ -29,7 +35,15 @@ class TaxDocumentTracker:
         self.current_tax_year = self.get_current_tax_year()
         self.current_view_mode = tk.StringVar(value="All")
         self.documents = []
+        self.documents_by_id = {}
+        self.previous_year_links = {}
         self.status_message = tk.StringVar()
+        self.save_state = tk.StringVar()
+        
+        # Document changes are written by a background thread
+        self.saver = BackgroundSaver()
+        atexit.register(self.saver.close)
+        self.root.protocol("WM_DELETE_WINDOW", self.quit_app)
         
         # Load the theme data first
         print("Loading theme in __init__")
@@ -68,6 +82,7 @@ class TaxDocumentTracker:
         
         # Load documents for current year
         self.load_documents()
+        self.poll_saver()
         
         # Bind keyboard shortcuts
         self.bind_shortcuts()
@@ -216,6 +231,68 @@ class TaxDocumentTracker:
             pady=2
         )
         import_btn.pack(side=tk.LEFT)
+        
+        # Client profile selector, each profile has its own documents
+        self.current_profile = tk.StringVar(value=get_active_profile())
+        self.profile_dropdown = tk.OptionMenu(data_frame, self.current_profile, *list_profiles())
+        self.profile_dropdown.configure(
+            background=self.theme_data.get("entry_bg"),
+            foreground=self.theme_data.get("entry_fg"),
+            activebackground=self.theme_data.get("hover"),
+            activeforeground=self.theme_data.get("foreground"),
+            highlightthickness=1,
+            highlightbackground=self.theme_data.get("entry_bg"),
+            highlightcolor=self.theme_data.get("accent")
+        )
+        self.profile_dropdown["menu"].configure(
+            background=self.theme_data.get("entry_bg"),
+            foreground=self.theme_data.get("entry_fg"),
+            activebackground=self.theme_data.get("selected"),
+            activeforeground=self.theme_data.get("selected_fg")
+        )
+        self.profile_dropdown.pack(side=tk.RIGHT)
+        
+        profile_label = ttk.Label(data_frame, text="Profile:")
+        profile_label.pack(side=tk.RIGHT, padx=(0, 10))
+        self.apply_theme_to_widget(profile_label, "frame")
+        
+        self.current_profile.trace_add("write", lambda *args: self.switch_profile())
+
+    def refresh_profile_menu(self):
+        """Rebuild the profile selector's list of profiles"""
+        menu = self.profile_dropdown["menu"]
+        menu.delete(0, "end")
+        for name in list_profiles():
+            menu.add_command(label=name, command=tk._setit(self.current_profile, name))
+
+    def switch_profile(self):
+        """Show the documents of the profile picked in the selector"""
+        name = self.current_profile.get()
+        if name == get_active_profile():
+            return
+        # Changes queued for the old profile are written to it first
+        self.saver.flush()
+        set_active_profile(name)
+        self.update_year_display()
+        self.load_documents()
+        self.set_status(f"Switched to profile '{name}'")
+
+    def new_profile(self):
+        """Ask for a name and create a new, empty profile"""
+        name = simpledialog.askstring("New Profile", "Name for the new client profile:", parent=self.root)
+        if not name:
+            return
+        name = name.strip()
+        if name in list_profiles():
+            messagebox.showinfo("New Profile", f"Profile '{name}' already exists")
+        else:
+            try:
+                create_profile(name)
+            except ValueError as e:
+                messagebox.showerror("New Profile", str(e))
+                return
+            self.refresh_profile_menu()
+        self.current_profile.set(name)
 
     def create_add_document_button(self):
         """Create button to add new documents"""
@@ -277,6 +354,26 @@ class TaxDocumentTracker:
         
         # Trace variable changes
         self.current_view_mode.trace_add("write", lambda *args: self.load_documents())
+        
+        # Search box for every tax year, Enter shows the matches
+        self.search_query = tk.StringVar()
+        self.search_entry = tk.Entry(
+            view_frame,
+            textvariable=self.search_query,
+            width=30,
+            background=self.theme_data.get("entry_bg"),
+            foreground=self.theme_data.get("entry_fg"),
+            insertbackground=self.theme_data.get("entry_fg"),
+            highlightthickness=1,
+            highlightbackground=self.theme_data.get("entry_bg"),
+            highlightcolor=self.theme_data.get("accent")
+        )
+        self.search_entry.pack(side=tk.RIGHT)
+        self.search_entry.bind("<Return>", lambda e: self.show_search_results())
+        
+        search_label = ttk.Label(view_frame, text="Search:")
+        search_label.pack(side=tk.RIGHT, padx=(0, 10))
+        self.apply_theme_to_widget(search_label, "frame")
 
     def create_document_list(self):
         """Create the document list area"""
@@ -291,7 +388,7 @@ class TaxDocumentTracker:
         
         # Create Treeview widget - use "tree headings" to show both tree and column headers
         columns = ("name", "expected_date", "previous_date", "website")
-        self.tree = ttk.Treeview(list_container, columns=columns, show="tree headings", selectmode="browse")
+        self.tree = ttk.Treeview(list_container, columns=columns, show="tree headings", selectmode="extended")
         
         # Define headings
         self.tree.heading("#0", text="Status")  # Tree column as Status
@@ -395,6 +492,18 @@ class TaxDocumentTracker:
         )
         status_label.pack(side=tk.LEFT, fill=tk.X)
         
+        # Shows "Saving..." while the background saver writes
+        save_state_label = tk.Label(
+            status_frame,
+            textvariable=self.save_state,
+            anchor=tk.E,
+            background=self.theme_data.get("background"),
+            foreground=self.theme_data.get("foreground"),
+            padx=5,
+            pady=2
+        )
+        save_state_label.pack(side=tk.RIGHT)
+        
         # Initial status message
         self.set_status(f"Ready - Documents folder: {USER_DOCS}")
 
@@ -423,10 +532,14 @@ class TaxDocumentTracker:
         menu_bar.add_cascade(label="File", menu=file_menu)
         file_menu.add_command(label="Add New Document", command=self.open_add_document_dialog, accelerator="Ctrl+N")
         file_menu.add_command(label="Import from Last Year", command=self.import_last_year_documents)
+        file_menu.add_command(label="Import from Other Years...", command=self.import_other_years_documents)
+        file_menu.add_command(label="Import Documents from File...", command=self.import_documents_from_file)
+        file_menu.add_separator()
+        file_menu.add_command(label="New Profile...", command=self.new_profile)
         file_menu.add_separator()
         file_menu.add_command(label="Refresh", command=self.load_documents, accelerator="F5")
         file_menu.add_separator()
-        file_menu.add_command(label="Exit", command=self.root.quit)
+        file_menu.add_command(label="Exit", command=self.quit_app)
         
         # Edit menu
         edit_menu = tk.Menu(
@@ -439,9 +552,13 @@ class TaxDocumentTracker:
         )
         menu_bar.add_cascade(label="Edit", menu=edit_menu)
         edit_menu.add_command(label="Edit Selected Document", command=self.edit_selected_document)
-        edit_menu.add_command(label="Delete Selected Document", command=self.delete_selected_document, accelerator="Delete")
+        edit_menu.add_command(label="Delete Selected Documents", command=self.delete_selected_document, accelerator="Delete")
         edit_menu.add_separator()
         edit_menu.add_command(label="Toggle Document Status", command=self.toggle_selected_document)
+        edit_menu.add_command(label="Mark Selected as Completed",
+                              command=lambda: self.set_selected_completed(True))
+        edit_menu.add_command(label="Mark Selected as Needed",
+                              command=lambda: self.set_selected_completed(False))
         
         # View menu
         view_menu = tk.Menu(
@@ -507,27 +624,60 @@ class TaxDocumentTracker:
         if not self.tree.parent(item):
             return
             
-        # Get document index
+        # Get document id
         tags = self.tree.item(item, "tags")
         if tags:
             tag = tags[0]
-            if tag.startswith("index:"):
-                index = int(tag.split(":")[1])
-                self.edit_document(index)
+            if tag.startswith("id:"):
+                doc_id = tag.split(":", 1)[1]
+                self.edit_document(doc_id)
+    
+    def selected_document_ids(self):
+        """Return the ids of the selected documents, section headers left out"""
+        doc_ids = []
+        for item in self.tree.selection():
+            tags = self.tree.item(item, "tags")
+            if self.tree.parent(item) and tags and tags[0].startswith("id:"):
+                doc_ids.append(tags[0].split(":", 1)[1])
+        return doc_ids
     
     def toggle_selected_document(self):
-        """Toggle the status of the selected document"""
-        selection = self.tree.selection()
-        if not selection:
-            return
-            
-        item = selection[0]
-        
-        # Ignore section headers
-        if not self.tree.parent(item):
+        """Toggle the status of the selected document, or mark several selected ones"""
+        doc_ids = self.selected_document_ids()
+        if len(doc_ids) == 1:
+            self.toggle_document_status(self.tree.selection()[0])
+        elif doc_ids:
+            # Mark them all completed, unless they all are already
+            self.set_selected_completed(not all(self.documents_by_id[doc_id].completed for doc_id in doc_ids))
+    
+    def year_is_writable(self):
+        """Return True if the current tax year can be changed, else say why and return False
+
+        Archived years are read-only, so changes to them are refused here
+        rather than shown and then lost when the background write fails.
+        """
+        if str(self.current_tax_year) not in list_archived_years():
+            return True
+        messagebox.showinfo("Archived Year", str(ArchivedYearError(self.current_tax_year)))
+        return False
+    
+    def set_selected_completed(self, completed):
+        """Mark every selected document completed or needed
+
+        The changes reach the saver together, so they are written as one batch.
+        """
+        if not self.year_is_writable():
             return
-            
-        self.toggle_document_status(item)
+        doc_ids = [doc_id for doc_id in self.selected_document_ids()
+                   if self.documents_by_id[doc_id].completed != completed]
+        for doc_id in doc_ids:
+            doc = self.documents_by_id[doc_id]
+            doc.mark_completed(completed)
+            self.saver.put(self.current_tax_year, doc.to_dict())
+        if doc_ids:
+            self.display_documents()
+        state = "completed" if completed else "not completed"
+        self.set_status(f"Marked {len(doc_ids)} document{'s' if len(doc_ids) != 1 else ''} as {state}")
     
     def open_theme_customizer(self):
         """Open theme customizer dialog"""
@@ -601,6 +751,7 @@ Created by pacmanninja998.
         Ctrl+N: Add new document
         Delete: Delete selected document
         F5: Refresh document list
+        Ctrl+F: Search all tax years
         Double-click: Open website (if available) or toggle status
         Right-click: Show context menu
         """
@@ -664,6 +815,54 @@ Created by pacmanninja998.
         dialog.focus_set()
         dialog.wait_window()
     
+    def show_search_results(self):
+        """List the documents in any tax year matching the search box"""
+        query = self.search_query.get().strip()
+        if not query:
+            return
+        # Searches what is saved, so queued changes go out first
+        self.saver.flush()
+        results = search_documents(query)
+        if not results:
+            self.set_status(f"No documents match '{query}'")
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"Search: {query}")
+        dialog.geometry("600x300")
+        dialog.transient(self.root)
+        dialog.configure(background=self.theme_data.get("background"))
+        
+        results_tree = ttk.Treeview(dialog, columns=("year", "name", "website", "status"), show="headings")
+        for column, heading, width in (("year", "Tax Year", 70), ("name", "Document", 250),
+                                       ("website", "Website", 180), ("status", "Status", 90)):
+            results_tree.heading(column, text=heading)
+            results_tree.column(column, width=width)
+        for result in results:
+            results_tree.insert("", "end", iid=f"{result['year']}:{result['id']}", values=(
+                result["year"], result["name"], result["website"],
+                "✓ Completed" if result["completed"] else "Pending"
+            ))
+        results_tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        def go_to_result(event):
+            selected = results_tree.focus()
+            if not selected:
+                return
+            year, doc_id = selected.split(":", 1)
+            dialog.destroy()
+            self.current_tax_year = int(year)
+            self.update_year_display()
+            self.load_documents()
+            for item in self.tree.tag_has(f"id:{doc_id}"):
+                self.tree.selection_set(item)
+                self.tree.see(item)
+        
+        results_tree.bind("<Double-1>", go_to_result)
+        results_tree.bind("<Return>", go_to_result)
+        self.set_status(f"{len(results)} documents match '{query}', double-click one to open its tax year")
+        self.center_dialog(dialog)
+    
     def center_dialog(self, dialog):
         """Center dialog on parent window"""
         dialog.update_idletasks()
@@ -683,12 +882,25 @@ Created by pacmanninja998.
 
     def load_documents(self):
         """Load documents for current tax year and update the display"""
+        # Make sure the file has our own changes before reading it back
+        self.saver.flush()
+        
+        # Load documents
+        # Read the version first, so it is never newer than the documents
+        version = get_data_version(self.current_tax_year)
+        self.documents = get_document_models_for_year(self.current_tax_year)
+        self.documents_by_id = {doc.id: doc for doc in self.documents}
+        self.saver.set_version(self.current_tax_year, version)
+        # Last year's matching documents, for documents without a previous year date
+        self.previous_year_links = get_previous_year_links(self.current_tax_year)
+        
+        self.display_documents()
+    
+    def display_documents(self):
+        """Show the loaded documents in the tree"""
         # Clear existing items
         for item in self.tree.get_children():
             self.tree.delete(item)
-            
-        # Load documents
-        self.documents = get_documents_for_year(self.current_tax_year)
                        
         # Filter documents based on view mode
         view_mode = self.current_view_mode.get()
@@ -697,13 +909,13 @@ Created by pacmanninja998.
         completed_documents = []
         
         if view_mode == "All" or view_mode == "Needed":
-            needed_documents = [doc for doc in self.documents if not doc.get("Completed", False)]
+            needed_documents = [doc for doc in self.documents if not doc.completed]
         
         if view_mode == "All" or view_mode == "Completed":
-            completed_documents = [doc for doc in self.documents if doc.get("Completed", False)]
+            completed_documents = [doc for doc in self.documents if doc.completed]
         
-        # Current date for date checking
-        current_date = datetime.date.today()
+        # Overdue flags for the whole list in one pass
+        overdue, _ = due_flags(needed_documents)
         
         # Create document sections with collapsible categories
         if needed_documents:
@@ -711,15 +923,7 @@ Created by pacmanninja998.
             needed_header = self.tree.insert("", "end", text="Needed Documents", 
                                            open=True, tags=("section",))
             
-            for doc in needed_documents:
-                # Check if expected date has passed
-                date_passed = False
-                if doc.get("expectedDate"):
-                    try:
-                        expected_date = datetime.datetime.strptime(doc.get("expectedDate"), "%Y-%m-%d").date()
-                        date_passed = expected_date < current_date
-                    except (ValueError, TypeError):
-                        date_passed = False
+            for doc, date_passed in zip(needed_documents, overdue):
                 
                 # Insert the treeview item with "□  Pending" in status column
                 item_id = self.tree.insert(
@@ -727,12 +931,12 @@ Created by pacmanninja998.
                     "end", 
                     text="□  Pending",  # Status in tree column
                     values=(
-                        doc.get("name", ""),
-                        self.format_date(doc.get("expectedDate", "")),
-                        self.format_date(doc.get("previousYearDate", "")),
-                        doc.get("website", "")
+                        doc.name,
+                        self.format_date(doc.expected_date, doc.expected),
+                        self.format_previous_date(doc),
+                        doc.website
                     ),
-                    tags=(f"index:{self.documents.index(doc)}", "date_passed" if date_passed else "")
+                    tags=(f"id:{doc.id}", "date_passed" if date_passed else "")
                 )
                 
                 # Update column widths based on content
@@ -750,28 +954,36 @@ Created by pacmanninja998.
                     "end", 
                     text="✓ Completed",  # Status in tree column
                     values=(
-                        doc.get("name", ""),
-                        self.format_date(doc.get("expectedDate", "")),
-                        self.format_date(doc.get("previousYearDate", "")),
-                        doc.get("website", "")
+                        doc.name,
+                        self.format_date(doc.expected_date, doc.expected),
+                        self.format_previous_date(doc),
+                        doc.website
                     ),
-                    tags=(f"index:{self.documents.index(doc)}", "Completed")
+                    tags=(f"id:{doc.id}", "Completed")
                 )
                 
                 # Update column widths based on content
                 self.adjust_column_widths(doc)
         
-        # Show message if no documents found
-        if not self.documents:
-            self.set_status(f"No documents found for tax year {self.current_tax_year}")
-        else:
-            total = len(self.documents)
-            completed = len(completed_documents)
-            self.set_status(f"Loaded {total} documents ({completed} completed) for tax year {self.current_tax_year}")
+        # Counts come from the data layer, which keeps them current
+        self.show_year_summary()
             
         # Apply tag colors
         self.apply_tag_colors()
 
+    def show_year_summary(self):
+        """Show the current tax year's document counts in the status bar"""
+        stats = get_year_stats(self.current_tax_year)
+        if not stats["total"]:
+            self.set_status(f"No documents found for tax year {self.current_tax_year}")
+            return
+        summary = f"{stats['total']} documents ({stats['completed']} completed"
+        if stats["overdue"]:
+            summary += f", {stats['overdue']} overdue"
+        if stats["due_soon"]:
+            summary += f", {stats['due_soon']} due within {stats['due_soon_days']} days"
+        self.set_status(f"{summary}) for tax year {self.current_tax_year}")
+
     def adjust_column_widths(self, doc):
         """Adjust column widths based on content"""
         # Status column (tree column #0)
@@ -781,13 +993,13 @@ Created by pacmanninja998.
             self.tree.column("#0", width=status_width)
             
         # Name column
-        name_width = len(doc.get("name", "")) * 7  # Approximate width based on text length
+        name_width = len(doc.name) * 7  # Approximate width based on text length
         current_width = self.tree.column("name", "width")
         if name_width > current_width:
             self.tree.column("name", width=name_width)
         
         # Website column
-        website = doc.get("website", "")
+        website = doc.website
         if website:
             website_width = len(website) * 7  # Approximate width based on text length
             current_width = self.tree.column("website", "width")
@@ -816,16 +1028,16 @@ Created by pacmanninja998.
         if not values:
             return
             
-        # Get document index
+        # Get document id
         tags = self.tree.item(item, "tags")
         if not tags:
             return
             
         tag = tags[0]
-        if not tag.startswith("index:"):
+        if not tag.startswith("id:"):
             return
             
-        index = int(tag.split(":")[1])
+        doc_id = tag.split(":", 1)[1]
         
         # Determine which column was clicked
         region = self.tree.identify_region(event.x, event.y)
@@ -836,7 +1048,7 @@ Created by pacmanninja998.
             self.toggle_document_status(item)
         # If last column (website) was clicked and has a value, open website 
         elif col == "#4" and values[3]:  # Website is now at index 3
-            self.open_website(index)
+            self.open_website(doc_id)
         # Otherwise, toggle status as default action
         else:
             self.toggle_document_status(item)
@@ -870,8 +1082,10 @@ Created by pacmanninja998.
             section_menu.tk_popup(event.x_root, event.y_root)
             return
             
-        # Regular item context menu
-        self.tree.selection_set(item)
+        # Regular item context menu, keeping a selection the item is part of
+        if item not in self.tree.selection():
+            self.tree.selection_set(item)
+        doc_ids = self.selected_document_ids()
         
         # Create context menu
         context_menu = tk.Menu(
@@ -883,16 +1097,27 @@ Created by pacmanninja998.
             activeforeground=self.theme_data.get("foreground")
         )
         
-        # Get document index
+        if len(doc_ids) > 1:
+            context_menu.add_command(label=f"Mark {len(doc_ids)} as Completed",
+                                     command=lambda: self.set_selected_completed(True))
+            context_menu.add_command(label=f"Mark {len(doc_ids)} as Needed",
+                                     command=lambda: self.set_selected_completed(False))
+            context_menu.add_separator()
+            context_menu.add_command(label=f"Delete {len(doc_ids)} Documents",
+                                     command=lambda: self.delete_documents(doc_ids))
+            context_menu.tk_popup(event.x_root, event.y_root)
+            return
+        
+        # Get document id
         tags = self.tree.item(item, "tags")
         if tags:
             tag = tags[0]
-            if tag.startswith("index:"):
-                index = int(tag.split(":")[1])
+            if tag.startswith("id:"):
+                doc_id = tag.split(":", 1)[1]
                 
                 # Add menu items
-                context_menu.add_command(label="Edit", command=lambda: self.edit_document(index))
-                context_menu.add_command(label="Delete", command=lambda: self.delete_document(index))
+                context_menu.add_command(label="Edit", command=lambda: self.edit_document(doc_id))
+                context_menu.add_command(label="Delete", command=lambda: self.delete_document(doc_id))
                 context_menu.add_separator()
                 context_menu.add_command(
                     label="Toggle Status", 
@@ -900,11 +1125,11 @@ Created by pacmanninja998.
                 )
                 
                 # If the document has a website, add open website option
-                if self.documents[index].get("website"):
+                if self.documents_by_id[doc_id].website:
                     context_menu.add_separator()
                     context_menu.add_command(
                         label="Open Website", 
-                        command=lambda: self.open_website(index)
+                        command=lambda: self.open_website(doc_id)
                     )
                 
                 # Display the context menu
@@ -912,84 +1137,120 @@ Created by pacmanninja998.
 
     def toggle_document_status(self, item):
         """Toggle the completed status of a document"""
-        # Get document index
+        # Get document id
         tags = self.tree.item(item, "tags")
         if not tags:
             return
             
         tag = tags[0]
-        if not tag.startswith("index:"):
+        if not tag.startswith("id:"):
             return
             
-        index = int(tag.split(":")[1])
+        doc_id = tag.split(":", 1)[1]
+        if not self.year_is_writable():
+            return
         
-        # Toggle status
-        was_completed = self.documents[index].get("Completed", False)
-        self.documents[index]["Completed"] = not was_completed
+        # Toggle status, setting actual date to today if not already set
+        doc = self.documents_by_id[doc_id]
+        doc.mark_completed(not doc.completed)
+        self.saver.put(self.current_tax_year, doc.to_dict())
         
-        # If completed, set actual date to today if not already set
-        if self.documents[index]["Completed"] and not self.documents[index].get("actualDate"):
-            today = datetime.date.today().isoformat()
-            self.documents[index]["actualDate"] = today
-            
-            # Update status message
-            doc_name = self.documents[index].get("name", "Document")
+        # Redraw to ensure proper section placement
+        self.display_documents()
+        
+        # Update status message
+        doc_name = doc.name or "Document"
+        if doc.completed:
             self.set_status(f"Marked '{doc_name}' as completed")
         else:
-            # Update status message
-            doc_name = self.documents[index].get("name", "Document")
             self.set_status(f"Marked '{doc_name}' as not completed")
-        
-        # Update the display for this item
-        if self.documents[index]["Completed"]:
-            self.tree.item(item, text="✓ Completed")
-        else:
-            self.tree.item(item, text="□  Pending")
-            
-        # Save and reload to ensure proper section placement
-        save_documents_for_year(self.current_tax_year, self.documents)
-        self.load_documents()
 
-    def edit_document(self, index):
+    def edit_document(self, doc_id):
         """Open dialog to edit a document"""
-        doc = self.documents[index]
+        if not self.year_is_writable():
+            return
+        doc = self.documents_by_id[doc_id]
         
         def save_callback(updated_doc):
-            # Update document at specified index
-            self.documents[index] = updated_doc
-            
-            # Save and reload
-            save_documents_for_year(self.current_tax_year, self.documents)
-            self.load_documents()
-            self.set_status(f"Document '{updated_doc['name']}' updated")
+            # Replace the document and queue it for saving
+            self.documents = [updated_doc if d.id == doc_id else d for d in self.documents]
+            self.documents_by_id[doc_id] = updated_doc
+            self.saver.put(self.current_tax_year, updated_doc.to_dict())
+            self.display_documents()
+            self.set_status(f"Document '{updated_doc.name}' updated")
         
         # Open document editor dialog
         DocumentEditor(self.root, doc, save_callback)
     
     def open_add_document_dialog(self):
         """Open dialog to add a new document"""
+        if not self.year_is_writable():
+            return
         def save_callback(new_doc):
-            # Add document to list
+            # Add document to list and queue it for saving
             self.documents.append(new_doc)
-            
-            # Save and reload
-            save_documents_for_year(self.current_tax_year, self.documents)
-            self.load_documents()
-            self.set_status(f"Document '{new_doc['name']}' added")
+            self.documents_by_id[new_doc.id] = new_doc
+            self.saver.put(self.current_tax_year, new_doc.to_dict())
+            self.display_documents()
+            self.set_status(f"Document '{new_doc.name}' added")
         
         # Open document editor dialog (with no document)
         DocumentEditor(self.root, None, save_callback)
 
-    def delete_document(self, index):
+    def delete_document(self, doc_id):
         """Delete a document after confirmation"""
-        doc = self.documents[index]
-        if messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete '{doc.get('name')}'?"):
-            doc_name = doc.get('name', 'Document')
-            del self.documents[index]
-            save_documents_for_year(self.current_tax_year, self.documents)
-            self.load_documents()
+        if not self.year_is_writable():
+            return
+        doc = self.documents_by_id[doc_id]
+        if messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete '{doc.name}'?"):
+            doc_name = doc.name or 'Document'
+            self.documents = [d for d in self.documents if d.id != doc_id]
+            del self.documents_by_id[doc_id]
+            self.saver.delete(self.current_tax_year, doc_id)
+            self.display_documents()
             self.set_status(f"Deleted document '{doc_name}'")
     
+    def poll_saver(self):
+        """Show the background saver's progress and problems, then check again shortly"""
+        for event in self.saver.poll_events():
+            kind = event[0]
+            if kind == "saving":
+                self.save_state.set("Saving…")
+            elif kind == "saved":
+                if not self.saver.has_pending():
+                    self.save_state.set("All changes saved")
+                    self.show_year_summary()
+            elif kind == "conflict":
+                _, profile, year = event
+                messagebox.showwarning(
+                    "Documents Changed",
+                    f"The documents for tax year {year} ({profile}) were changed by another program, "
+                    "so your latest changes to them were not saved. They have been reloaded."
+                )
+                self.save_state.set("Some changes were not saved")
+                if profile == get_active_profile() and year == str(self.current_tax_year):
+                    self.load_documents()
+            elif kind == "error":
+                _, profile, year, message = event
+                messagebox.showerror(
+                    "Save Failed",
+                    f"Could not save tax year {year} ({profile}): {message}\n\n"
+                    "Your changes to that year were not saved and have been undone."
+                )
+                self.save_state.set("Some changes were not saved")
+                # Show what is actually stored rather than the changes that were lost
+                if profile == get_active_profile() and year == str(self.current_tax_year):
+                    self.load_documents()
+        self.root.after(100, self.poll_saver)
+    
+    def quit_app(self):
+        """Write any pending changes and quit"""
+        if self.saver.has_pending():
+            self.save_state.set("Saving…")
+            self.root.update_idletasks()
+        self.saver.close()
+        self.root.quit()
+    
     def go_to_previous_year(self):
         """Navigate to previous tax year"""
         self.current_tax_year -= 1
@@ -1005,11 +1266,19 @@ Created by pacmanninja998.
     def update_year_display(self):
         """Update the year display in the UI"""
         self.year_banner.config(text=f"Tax Year: {self.current_tax_year} (Due {self.current_tax_year + 1})")
-        self.current_year_label.config(text=f"Tax Year {self.current_tax_year}")
+        label = f"Tax Year {self.current_tax_year}"
+        if str(self.current_tax_year) in list_archived_years():
+            label += " (archived, read-only)"
+        self.current_year_label.config(text=label)
     
-    def import_last_year_documents(self):
+    def import_last_year_documents(self, source_year=None, until_year=None):
         """Import documents from previous year"""
-        count, message = import_from_last_year(self.current_tax_year)
+        self.saver.flush()
+        try:
+            count, message = import_from_last_year(self.current_tax_year, source_year, until_year)
+        except ValueError as e:
+            messagebox.showerror("Import", str(e))
+            return
         
         if count > 0:
             messagebox.showinfo("Import", message)
@@ -1018,16 +1287,59 @@ Created by pacmanninja998.
         else:
             messagebox.showinfo("Import", message)
     
-    def open_website(self, index):
+    def import_other_years_documents(self):
+        """Ask for a tax year or range of years (e.g. 2019-2022) and import from it"""
+        answer = simpledialog.askstring(
+            "Import",
+            "Import documents from tax year (e.g. 2021, or 2019-2022 for a range):",
+            parent=self.root
+        )
+        if not answer:
+            return
+        try:
+            first, _, last = answer.partition("-")
+            source_year = int(first)
+            until_year = int(last) if last.strip() else None
+        except ValueError:
+            messagebox.showerror("Import", f"'{answer}' is not a tax year or range of years")
+            return
+        self.import_last_year_documents(source_year, until_year)
+    
+    def import_documents_from_file(self):
+        """Add the documents listed in a CSV or NDJSON file to the current tax year"""
+        path = filedialog.askopenfilename(
+            title="Import Documents",
+            filetypes=[("CSV or NDJSON files", "*.csv *.ndjson *.jsonl"), ("All files", "*.*")],
+            parent=self.root
+        )
+        if not path:
+            return
+        self.saver.flush()
+        self.root.config(cursor="watch")
+        self.root.update_idletasks()
+        try:
+            report = bulk_import_file(self.current_tax_year, path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Import", f"Could not import {os.path.basename(path)}: {e}")
+            return
+        finally:
+            self.root.config(cursor="")
+        message = describe_report(report)
+        if report["imported"]:
+            self.load_documents()
+        messagebox.showinfo("Import", message)
+        self.set_status(message.split("\n", 1)[0])
+    
+    def open_website(self, doc_id):
         """Open document website in browser"""
-        website = self.documents[index].get("website", "")
+        website = self.documents_by_id[doc_id].website
         if website:
             if not website.startswith(("http://", "https://")):
                 website = "https://" + website
             webbrowser.open(website)
             self.set_status(f"Opening website: {website}")
         else:
-            doc_name = self.documents[index].get("name", "Document")
+            doc_name = self.documents_by_id[doc_id].name or "Document"
             self.set_status(f"No website defined for '{doc_name}'")
     
     def set_status(self, message):
@@ -1044,36 +1356,45 @@ Created by pacmanninja998.
         
         # F5 to refresh
         self.root.bind("<F5>", lambda e: self.load_documents())
+        
+        # Ctrl+F to search
+        self.root.bind("<Control-f>", lambda e: self.search_entry.focus_set())
     
     def delete_selected_document(self, event=None):
-        """Delete the selected document"""
-        selection = self.tree.selection()
-        if not selection:
+        """Delete the selected documents"""
+        doc_ids = self.selected_document_ids()
+        if len(doc_ids) == 1:
+            self.delete_document(doc_ids[0])
+        elif doc_ids:
+            self.delete_documents(doc_ids)
+    
+    def delete_documents(self, doc_ids):
+        """Delete several documents after one confirmation, written as one batch"""
+        if not self.year_is_writable():
             return
-            
-        item = selection[0]
-        
-        # Ignore section headers
-        if not self.tree.parent(item):
+        if not messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete {len(doc_ids)} documents?"):
             return
-            
-        # Get document index
-        tags = self.tree.item(item, "tags")
-        if tags:
-            tag = tags[0]
-            if tag.startswith("index:"):
-                index = int(tag.split(":")[1])
-                self.delete_document(index)
+        deleted = set(doc_ids)
+        self.documents = [d for d in self.documents if d.id not in deleted]
+        for doc_id in doc_ids:
+            del self.documents_by_id[doc_id]
+            self.saver.delete(self.current_tax_year, doc_id)
+        self.display_documents()
+        self.set_status(f"Deleted {len(doc_ids)} documents")
     
-    def format_date(self, date_string):
-        """Format date for display"""
-        if not date_string:
-            return "No date set"
-        try:
-            date = datetime.datetime.strptime(date_string, "%Y-%m-%d").date()
-            return date.strftime("%b %d, %Y")
-        except ValueError:
-            return date_string
+    def format_date(self, date, date_string=""):
+        """Format a parsed date for display, falling back to the stored string"""
+        if date is not None:
+            return display_date(date)
+        return date_string or "No date set"
+    
+    def format_previous_date(self, doc):
+        """Format a document's previous year date, or its linked document's date from last year"""
+        if doc.previous_year_date is None and not doc.previous:
+            link = self.previous_year_links.get(doc.id)
+            if link and link.get("date"):
+                return self.format_date(parse_date(link["date"]), link["date"])
+        return self.format_date(doc.previous_year_date, doc.previous)
     
     def configure_basic_styles(self):
         """Configure basic ttk styles based on theme data"""
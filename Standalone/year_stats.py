@@ -0,0 +1,70 @@
+import bisect
+import datetime
+import threading
+
+from document_model import UPCOMING_DAYS, normalize_document, parse_date
+
+
+class YearStats:
+    """Document counts for one tax year, updated as documents change
+
+    The expected dates of needed documents are kept as sorted ordinals, so
+    the overdue and due-soon counts for any day are two binary searches
+    rather than a pass over the year.
+    """
+
+    def __init__(self, documents=()):
+        self._lock = threading.Lock()
+        self.total = 0
+        self.completed = 0
+        self._due = []
+        for doc in documents:
+            self._add(doc)
+
+    @staticmethod
+    def _key(doc):
+        doc = normalize_document(doc)
+        date = parse_date(doc.get("expectedDate"))
+        return bool(doc.get("completed")), date.toordinal() if date is not None else None
+
+    def _add(self, doc):
+        completed, ordinal = self._key(doc)
+        self.total += 1
+        if completed:
+            self.completed += 1
+        elif ordinal is not None:
+            bisect.insort(self._due, ordinal)
+
+    def add(self, doc):
+        """Count a document added to the year"""
+        with self._lock:
+            self._add(doc)
+
+    def remove(self, doc):
+        """Stop counting a document that left the year"""
+        completed, ordinal = self._key(doc)
+        with self._lock:
+            self.total -= 1
+            if completed:
+                self.completed -= 1
+            elif ordinal is not None:
+                position = bisect.bisect_left(self._due, ordinal)
+                if position < len(self._due) and self._due[position] == ordinal:
+                    del self._due[position]
+
+    def apply(self, old, new):
+        """Count a change to one document: added (old None), removed (new None) or replaced"""
+        if old is not None:
+            self.remove(old)
+        if new is not None:
+            self.add(new)
+
+    def summary(self, today=None, upcoming_days=UPCOMING_DAYS):
+        """Return the counts, overdue and due within upcoming_days as of today"""
+        today = (today or datetime.date.today()).toordinal()
+        with self._lock:
+            passed = bisect.bisect_left(self._due, today)
+            due_soon = bisect.bisect_right(self._due, today + upcoming_days) - passed
+            return {"total": self.total, "completed": self.completed,
+                    "needed": self.total - self.completed,
+                    "overdue": passed, "due_soon": due_soon, "due_soon_days": upcoming_days}
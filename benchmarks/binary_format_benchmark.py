@@ -0,0 +1,54 @@
+"""Compare the binary data format against the indented JSON file
+
+Run from the repository root:  python benchmarks/binary_format_benchmark.py
+"""
+import json
+import os
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "Standalone"))
+
+import binary_format
+from offset_index_benchmark import make_data
+
+REPEAT = 10
+
+
+def main():
+    print(f"{'years':>5} {'format':>7} {'KiB':>8} {'load ms':>8} {'save ms':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for years in (1, 10, 50):
+            data = make_data(years)
+            json_path = Path(tmp) / "data.json"
+            binary_path = Path(tmp) / "data.tdb"
+
+            def save_json():
+                with open(json_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=2)
+
+            def load_json():
+                with open(json_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+
+            def save_binary():
+                with open(binary_path, 'wb') as f:
+                    f.write(binary_format.encode(data))
+
+            def load_binary():
+                with open(binary_path, 'rb') as f:
+                    return binary_format.decode(memoryview(f.read()))
+
+            for name, save, load, path in (("json", save_json, load_json, json_path),
+                                           ("binary", save_binary, load_binary, binary_path)):
+                save_ms = min(timeit.repeat(save, number=1, repeat=REPEAT)) * 1000
+                assert load() == data
+                load_ms = min(timeit.repeat(load, number=1, repeat=REPEAT)) * 1000
+                size = os.path.getsize(path) / 1024
+                print(f"{years:>5} {name:>7} {size:>8.0f} {load_ms:>8.2f} {save_ms:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
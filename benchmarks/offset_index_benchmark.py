@@ -0,0 +1,59 @@
+"""Compare decoding one year through the offset index against a full json.load
+
+Run from the repository root:  python benchmarks/offset_index_benchmark.py
+"""
+import json
+import os
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "Standalone"))
+
+from offset_index import OffsetIndex
+
+DOCS_PER_YEAR = 400
+REPEAT = 20
+
+
+def make_data(years):
+    return {
+        str(2000 + y): [
+            {
+                "name": f"Form 1099-INT #{i} from Bank {i % 37}",
+                "website": f"https://bank{i % 37}.example.com/tax-documents",
+                "expectedDate": f"{2001 + y}-02-{i % 28 + 1:02d}",
+                "actualDate": "",
+                "previousYearDate": f"{2000 + y}-02-{i % 28 + 1:02d}",
+                "completed": i % 3 == 0,
+            }
+            for i in range(DOCS_PER_YEAR)
+        ]
+        for y in range(years)
+    }
+
+
+def main():
+    print(f"{'years':>5} {'file KiB':>9} {'json.load ms':>13} {'index ms':>9} {'rebuild ms':>11} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for years in (1, 10, 50):
+            path = Path(tmp) / f"data_{years}.json"
+            index = OffsetIndex(path)
+            index.write(make_data(years))
+            target = str(2000 + years - 1)
+
+            def full_parse():
+                with open(path, 'r', encoding='utf-8') as f:
+                    return json.load(f)[target]
+
+            assert full_parse() == index.load_year(target)
+            full = min(timeit.repeat(full_parse, number=1, repeat=REPEAT)) * 1000
+            sliced = min(timeit.repeat(lambda: index.load_year(target), number=1, repeat=REPEAT)) * 1000
+            rebuild = min(timeit.repeat(index.rebuild, number=1, repeat=5)) * 1000
+            size = os.path.getsize(path) / 1024
+            print(f"{years:>5} {size:>9.0f} {full:>13.2f} {sliced:>9.2f} {rebuild:>11.2f} {full / sliced:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()